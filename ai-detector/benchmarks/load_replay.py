@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""記録済みリクエストをローカルの uvicorn に再送する負荷試験ツール。
+
+`training/browser/data/*/*.jsonl` の各行の ``request`` フィールドを /detect へ送り、
+スループット・p50/p95/p99 レイテンシ・エラー率・サーバープロセスの CPU / RSS を集計する。
+Cloud Run のインスタンスサイズ（CPU / メモリ / 同時実行数）を決める前の容量見積もりに使う。
+
+負荷のかけ方は 2 通り:
+
+- ``--rps N``: 到着レートを固定するオープンループ（応答が遅れても送信間隔は変えない）
+- ``--concurrency N``: N 本のワーカーが応答を待って次を送るクローズドループ
+
+実行例:
+    # 別ターミナルで起動済みのサーバーへ 20 RPS を 60 秒
+    uv run python benchmarks/load_replay.py --rps 20 --duration 60 --server-pid <uvicorn の PID>
+
+    # サーバーをこのスクリプトから起動し、同時実行 8 で 2,000 リクエスト
+    uv run python benchmarks/load_replay.py --spawn --workers 1 --concurrency 8 --requests 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_DATA_GLOB = str(BASE_DIR / "training" / "browser" / "data" / "*" / "*.jsonl")
+DEFAULT_URL = "http://127.0.0.1:8000"
+RESOURCE_SAMPLE_INTERVAL = 0.5
+
+
+def load_requests(patterns: List[str]) -> List[Dict[str, Any]]:
+    """JSONL から ``request`` フィールドを読み出す（欠損・壊れた行は読み飛ばす）。"""
+    payloads: List[Dict[str, Any]] = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    request = record.get("request")
+                    if isinstance(request, dict):
+                        payloads.append(request)
+    return payloads
+
+
+class ResourceSampler:
+    """/proc から対象プロセス（と子プロセス）の CPU 使用率と RSS を定期取得する。
+
+    uvicorn を ``--workers`` 付きで起動した場合は親 PID を渡せば子ワーカーも合算する。
+    /proc が無い環境（macOS など）では何も記録しない。
+    """
+
+    def __init__(self, pid: int, interval: float = RESOURCE_SAMPLE_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self.cpu_percent: List[float] = []
+        self.rss_bytes: List[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    @property
+    def available(self) -> bool:
+        return Path(f"/proc/{self.pid}/stat").exists()
+
+    def _pids(self) -> List[int]:
+        pids = [self.pid]
+        index = 0
+        while index < len(pids):
+            children = Path(f"/proc/{pids[index]}/task/{pids[index]}/children")
+            try:
+                pids.extend(int(child) for child in children.read_text().split())
+            except OSError:
+                pass
+            index += 1
+        return pids
+
+    def _read(self) -> Optional[tuple[float, int]]:
+        cpu_seconds = 0.0
+        rss = 0
+        found = False
+        for pid in self._pids():
+            try:
+                stat = Path(f"/proc/{pid}/stat").read_text()
+                statm = Path(f"/proc/{pid}/statm").read_text().split()
+            except OSError:
+                continue
+            # comm にスペースが入る場合があるので最後の ')' 以降を分割する
+            fields = stat.rsplit(")", 1)[1].split()
+            cpu_seconds += (int(fields[11]) + int(fields[12])) / self._clock_ticks
+            rss += int(statm[1]) * self._page_size
+            found = True
+        return (cpu_seconds, rss) if found else None
+
+    def _run(self) -> None:
+        previous = self._read()
+        previous_time = time.monotonic()
+        while not self._stop.wait(self.interval):
+            current = self._read()
+            now = time.monotonic()
+            if current is None:
+                break
+            if previous is not None:
+                self.cpu_percent.append((current[0] - previous[0]) / (now - previous_time) * 100.0)
+            self.rss_bytes.append(current[1])
+            previous, previous_time = current, now
+
+    def start(self) -> None:
+        if self.available:
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def summary(self) -> Optional[Dict[str, float]]:
+        if not self.cpu_percent and not self.rss_bytes:
+            return None
+        mib = 1024 * 1024
+        return {
+            "cpu_percent_mean": round(statistics.fmean(self.cpu_percent), 1) if self.cpu_percent else 0.0,
+            "cpu_percent_max": round(max(self.cpu_percent), 1) if self.cpu_percent else 0.0,
+            "rss_mib_mean": round(statistics.fmean(self.rss_bytes) / mib, 1) if self.rss_bytes else 0.0,
+            "rss_mib_max": round(max(self.rss_bytes) / mib, 1) if self.rss_bytes else 0.0,
+            "samples": len(self.rss_bytes),
+        }
+
+
+@dataclass
+class LoadResult:
+    """1 回の負荷試験の集計対象。"""
+
+    latencies: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    errors: Counter = field(default_factory=Counter)
+    sent: int = 0
+    started: float = 0.0
+    finished: float = 0.0
+
+
+class ReplayRunner:
+    """記録済みリクエストを順番に（末尾で先頭に戻って）送り続ける。"""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        payloads: List[Dict[str, Any]],
+        *,
+        path: str = "/detect",
+        keep_ids: bool = False,
+    ):
+        self.client = client
+        self.payloads = payloads
+        self.path = path
+        self.keep_ids = keep_ids
+        self.result = LoadResult()
+        self._index = 0
+
+    def _next_payload(self) -> Dict[str, Any]:
+        payload = self.payloads[self._index % len(self.payloads)]
+        self._index += 1
+        if self.keep_ids:
+            return payload
+        # 同一 session_id / request_id の再送でキャッシュや冪等性ストアに当たらないよう振り直す
+        # （新しい session_id にはサーバー側の集計状態が無いので、差分スナップショット指定も外す）
+        suffix = uuid.uuid4().hex[:12]
+        payload = {key: value for key, value in payload.items() if key not in ("snapshot_seq", "delta")}
+        return {**payload, "session_id": f"{payload.get('session_id', 'replay')}-{suffix}", "request_id": str(uuid.uuid4())}
+
+    async def send_one(self) -> None:
+        payload = self._next_payload()
+        self.result.sent += 1
+        start = time.perf_counter()
+        try:
+            response = await self.client.post(self.path, json=payload)
+        except httpx.HTTPError as exc:
+            self.result.errors[type(exc).__name__] += 1
+            return
+        self.result.latencies.append(time.perf_counter() - start)
+        self.result.statuses[response.status_code] += 1
+
+    async def run_rate(self, rps: float, *, duration: Optional[float], total: Optional[int], max_in_flight: int) -> None:
+        """一定レートで送信する（オープンループ）。同時送信数が上限を超える分は送信を遅らせる。"""
+        interval = 1.0 / rps
+        limiter = asyncio.Semaphore(max_in_flight)
+        tasks: set[asyncio.Task] = set()
+
+        async def guarded() -> None:
+            try:
+                await self.send_one()
+            finally:
+                limiter.release()
+
+        loop = asyncio.get_running_loop()
+        self.result.started = loop.time()
+        next_at = self.result.started
+        count = 0
+        while not self._done(count, total, duration, loop.time()):
+            await limiter.acquire()
+            task = asyncio.create_task(guarded())
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            count += 1
+            next_at += interval
+            delay = next_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if tasks:
+            await asyncio.gather(*tasks)
+        self.result.finished = loop.time()
+
+    async def run_concurrency(self, concurrency: int, *, duration: Optional[float], total: Optional[int]) -> None:
+        """N 本のワーカーで応答を待ちながら送信する（クローズドループ）。"""
+        loop = asyncio.get_running_loop()
+        self.result.started = loop.time()
+        claimed = 0
+
+        async def worker() -> None:
+            nonlocal claimed
+            while not self._done(claimed, total, duration, loop.time()):
+                claimed += 1
+                await self.send_one()
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        self.result.finished = loop.time()
+
+    def _done(self, count: int, total: Optional[int], duration: Optional[float], now: float) -> bool:
+        if total is not None and count >= total:
+            return True
+        return duration is not None and now - self.result.started >= duration
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarize(result: LoadResult) -> Dict[str, Any]:
+    elapsed = max(result.finished - result.started, 1e-9)
+    ordered = sorted(result.latencies)
+    ok = sum(count for status, count in result.statuses.items() if 200 <= status < 300)
+    failed = result.sent - ok
+    return {
+        "sent": result.sent,
+        "ok": ok,
+        "error_rate": round(failed / result.sent, 4) if result.sent else 0.0,
+        "statuses": {str(status): count for status, count in sorted(result.statuses.items())},
+        "transport_errors": dict(result.errors),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(ok / elapsed, 2),
+        "latency_ms": {
+            "mean": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+            "p50": round(percentile(ordered, 0.50) * 1000, 3),
+            "p95": round(percentile(ordered, 0.95) * 1000, 3),
+            "p99": round(percentile(ordered, 0.99) * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        },
+    }
+
+
+def spawn_server(port: int, workers: int) -> subprocess.Popen:
+    """uvicorn を子プロセスで起動する。"""
+    command = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "api.app:app",
+        "--app-dir",
+        str(BASE_DIR / "src"),
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+        "--workers",
+        str(workers),
+        "--log-level",
+        "warning",
+        "--no-access-log",
+    ]
+    return subprocess.Popen(command, cwd=BASE_DIR)
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            response = await client.get("/health")
+            if response.status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"サーバーが {timeout:.0f} 秒以内に起動しませんでした")
+        await asyncio.sleep(0.2)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="記録済みリクエストを /detect へ再送する負荷試験ツール")
+    parser.add_argument("--url", default=DEFAULT_URL, help="送信先のベース URL（--spawn 時は無視）")
+    parser.add_argument("--path", default="/detect")
+    parser.add_argument("--data-glob", nargs="+", default=[DEFAULT_DATA_GLOB], help="再送する JSONL の glob")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--rps", type=float, help="目標到着レート（リクエスト/秒）")
+    mode.add_argument("--concurrency", type=int, help="同時実行数（クローズドループ）")
+    parser.add_argument("--duration", type=float, help="計測秒数")
+    parser.add_argument("--requests", type=int, help="送信リクエスト数")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="--rps 時の同時送信数の上限")
+    parser.add_argument("--timeout", type=float, default=30.0, help="1 リクエストのタイムアウト秒数")
+    parser.add_argument("--warmup", type=int, default=10, help="計測前に送るリクエスト数")
+    parser.add_argument("--keep-ids", action="store_true", help="session_id / request_id を記録のまま送る")
+    parser.add_argument("--server-pid", type=int, help="CPU / RSS を計測するサーバーの PID")
+    parser.add_argument("--spawn", action="store_true", help="uvicorn をこのスクリプトから起動する")
+    parser.add_argument("--port", type=int, default=8765, help="--spawn 時のポート")
+    parser.add_argument("--workers", type=int, default=1, help="--spawn 時の uvicorn ワーカー数")
+    parser.add_argument("--output", type=Path, help="結果 JSON の出力先（省略時は stdout）")
+    args = parser.parse_args()
+    if args.duration is None and args.requests is None:
+        args.duration = 30.0
+    return args
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    payloads = load_requests(args.data_glob)
+    if not payloads:
+        raise SystemExit(f"再送するリクエストが見つかりません: {args.data_glob}")
+
+    server: Optional[subprocess.Popen] = None
+    base_url = args.url
+    server_pid = args.server_pid
+    if args.spawn:
+        server = spawn_server(args.port, args.workers)
+        base_url = f"http://127.0.0.1:{args.port}"
+        server_pid = server.pid
+
+    limits = httpx.Limits(max_connections=max(args.concurrency or args.max_in_flight, 1))
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            if server is not None:
+                await wait_until_ready(client, timeout=60.0)
+
+            warmup = ReplayRunner(client, payloads, path=args.path, keep_ids=args.keep_ids)
+            for _ in range(args.warmup):
+                await warmup.send_one()
+
+            sampler = ResourceSampler(server_pid) if server_pid else None
+            if sampler is not None:
+                sampler.start()
+            runner = ReplayRunner(client, payloads, path=args.path, keep_ids=args.keep_ids)
+            try:
+                if args.rps:
+                    await runner.run_rate(
+                        args.rps, duration=args.duration, total=args.requests, max_in_flight=args.max_in_flight
+                    )
+                else:
+                    await runner.run_concurrency(args.concurrency, duration=args.duration, total=args.requests)
+            finally:
+                if sampler is not None:
+                    sampler.stop()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    return {
+        "config": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "url": base_url + args.path,
+            "mode": "rate" if args.rps else "concurrency",
+            "target_rps": args.rps,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "requests": args.requests,
+            "replayed_records": len(payloads),
+            "spawned_workers": args.workers if args.spawn else None,
+            "cpu_count": os.cpu_count(),
+        },
+        "results": summarize(runner.result),
+        "server": sampler.summary() if sampler is not None else None,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    report = asyncio.run(run(args))
+    results = report["results"]
+    latency = results["latency_ms"]
+    print(
+        f"sent={results['sent']} ok={results['ok']} error_rate={results['error_rate']:.2%} "
+        f"throughput={results['throughput_rps']:.1f} rps "
+        f"p50={latency['p50']:.1f}ms p95={latency['p95']:.1f}ms p99={latency['p99']:.1f}ms",
+        file=sys.stderr,
+    )
+    server = report["server"]
+    if server:
+        print(
+            f"server cpu={server['cpu_percent_mean']:.0f}% (max {server['cpu_percent_max']:.0f}%) "
+            f"rss={server['rss_mib_max']:.0f}MiB",
+            file=sys.stderr,
+        )
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text + "\n", encoding="utf-8")
+        print(f"結果を保存しました: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
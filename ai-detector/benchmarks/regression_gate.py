@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""性能回帰ゲート。
+
+`benchmarks/baseline.json` に記録したケース（シナリオ x ペイロードサイズ x バッチサイズ）を
+再計測し、シナリオごとの許容幅を超えて遅くなっていれば非ゼロで終了する。
+
+- 各ケースの直前に固定の CPU 負荷（キャリブレーション）を計測し、その所要時間で正規化してから
+  比較するため、ベースラインを記録したマシンと速度の異なるマシンや、クロックが変動する共有環境でも
+  概ね比較できる（``--no-normalize`` で無効化）
+- ベースラインにはモデルファイルのハッシュも記録し、成果物が変わった場合は結果と併せて表示する
+- ``--update`` で現在の計測値をベースラインとして書き戻す（ケースと許容幅は維持）
+- ローカル生成のモデル（cluster_isolation_models.pkl など）が無いケースは計測せず skipped と表示する
+
+終了コード: 0=回帰なし / 1=回帰あり / 2=ベースラインが無い・読めない
+
+実行例:
+    uv run python benchmarks/regression_gate.py
+    uv run python benchmarks/regression_gate.py --scenarios extractor detection_service
+    uv run python benchmarks/regression_gate.py --update
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from run_benchmarks import environment_info
+from scenarios import SCENARIO_NAMES, BenchmarkContext, TimingConfig, quiet_logging, run_case
+
+import config  # noqa: E402  (scenarios が src を sys.path に追加する)
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_METRIC = "p50_ms"
+DEFAULT_TOLERANCES: Dict[str, float] = {
+    "default": 0.30,
+    # TestClient 経由は HTTP 層・スレッド切り替えが入りぶれやすい
+    "detect_endpoint": 0.40,
+}
+DEFAULT_CASES: List[Dict[str, Any]] = [
+    {"scenario": "extractor", "mouse_movements": 100, "behavior_sequence": 100, "batch_size": 1},
+    {"scenario": "extractor", "mouse_movements": 5000, "behavior_sequence": 1000, "batch_size": 1},
+    {"scenario": "detection_service", "mouse_movements": 100, "behavior_sequence": 100, "batch_size": 1},
+    {"scenario": "detection_service", "mouse_movements": 5000, "behavior_sequence": 1000, "batch_size": 1},
+    {"scenario": "cluster_detector", "mouse_movements": None, "behavior_sequence": None, "batch_size": 1},
+    {"scenario": "detect_endpoint", "mouse_movements": 100, "behavior_sequence": 100, "batch_size": 1},
+    {"scenario": "detect_endpoint", "mouse_movements": 5000, "behavior_sequence": 1000, "batch_size": 1},
+]
+# リポジトリで管理しているモデル成果物。cluster_isolation_models.pkl は
+# training/cluster/create_models.py でローカル生成するもの（未コミット）なので記録しない
+MODEL_ARTIFACTS = (
+    "models/browser/lightgbm_model.pkl",
+    "models/browser/lightgbm_metadata.json",
+    "models/persona/kmeans_model.pkl",
+    "models/persona/model_metadata.json",
+    "models/persona/category_projection.json",
+)
+CALIBRATION_ROUNDS_PER_RUN = 2
+CASE_FIELDS = ("scenario", "mouse_movements", "behavior_sequence", "batch_size")
+
+
+def calibrate(rounds: int) -> List[float]:
+    """マシン速度の目安となる固定処理（Python ループ + numpy）の所要ミリ秒（rounds 回分）。"""
+    rng = np.random.default_rng(0)
+    matrix = rng.random((200, 200))
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        total = 0.0
+        for i in range(100_000):
+            total += (i % 7) * 0.5
+        for _ in range(10):
+            matrix = np.tanh(matrix @ matrix.T / 200.0)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+def artifact_hashes() -> Dict[str, str]:
+    """推論で読み込むモデル成果物の SHA-256（先頭 16 桁）。存在しないものは含めない。"""
+    hashes: Dict[str, str] = {}
+    for relative in MODEL_ARTIFACTS:
+        path = config.BASE_DIR / relative
+        if not path.exists():
+            continue
+        digest = hashlib.sha256()
+        with path.open("rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                digest.update(chunk)
+        hashes[relative] = digest.hexdigest()[:16]
+    return hashes
+
+
+def case_key(case: Dict[str, Any]) -> str:
+    return (
+        f"{case['scenario']}[mouse={case['mouse_movements']},seq={case['behavior_sequence']},"
+        f"batch={case['batch_size']}]"
+    )
+
+
+def measure_case(ctx: BenchmarkContext, case: Dict[str, Any], timing: TimingConfig, repeat: int) -> Dict[str, Any]:
+    """1 ケースを repeat 回計測し、指標ごとに最も速い値を採る（ノイズ対策）。
+
+    各回の直前と最後にキャリブレーションを挟み、その中央値を ``calibration_ms`` として記録する。
+    """
+    calibration: List[float] = []
+    runs = []
+    for _ in range(repeat):
+        calibration.extend(calibrate(CALIBRATION_ROUNDS_PER_RUN))
+        runs.append(
+            run_case(
+                ctx,
+                case["scenario"],
+                mouse_movements=case["mouse_movements"],
+                sequence_events=case["behavior_sequence"],
+                batch_size=case["batch_size"],
+                timing=timing,
+            )
+        )
+    calibration.extend(calibrate(CALIBRATION_ROUNDS_PER_RUN))
+
+    best = dict(runs[0])
+    for key in ("mean_ms", "p50_ms", "p95_ms", "min_ms", "per_item_ms"):
+        best[key] = min(run[key] for run in runs)
+    best["calibration_ms"] = statistics.median(calibration)
+    print(
+        f"  {case_key(case):<60} p50={best['p50_ms']:.3f}ms mean={best['mean_ms']:.3f}ms "
+        f"calibration={best['calibration_ms']:.2f}ms",
+        file=sys.stderr,
+    )
+    return best
+
+
+def measure_cases(
+    ctx: BenchmarkContext, cases: List[Dict[str, Any]], timing: TimingConfig, repeat: int
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """計測できたケース・その結果・モデルが無く計測できなかったケースを返す。"""
+    measured, results, skipped = [], [], []
+    for case in cases:
+        try:
+            results.append(measure_case(ctx, case, timing, repeat))
+        except FileNotFoundError as exc:
+            print(f"  {case_key(case):<60} skipped: {exc}", file=sys.stderr)
+            skipped.append(case)
+            continue
+        measured.append(case)
+    return measured, results, skipped
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: List[Dict[str, Any]],
+    *,
+    metric: str,
+    normalize: bool,
+    tolerance_override: Optional[float],
+) -> List[Dict[str, Any]]:
+    """ケースごとの比較結果。``status`` は ok / regression / improved / new（計測できなかったケースは呼び出し側で skipped を追加する）。
+
+    normalize が真ならベースライン値をキャリブレーション比（今回 / 記録時）で補正した値を期待値とする。
+    """
+    tolerances = {**DEFAULT_TOLERANCES, **baseline.get("tolerances", {})}
+    by_key = {case_key(case): case for case in baseline.get("cases", [])}
+    rows = []
+    for result in current:
+        key = case_key(result)
+        tolerance = (
+            tolerance_override
+            if tolerance_override is not None
+            else tolerances.get(result["scenario"], tolerances["default"])
+        )
+        reference = by_key.get(key)
+        row: Dict[str, Any] = {"case": key, "current": result[metric], "tolerance": tolerance}
+        if reference is None or metric not in reference:
+            row.update(status="new", expected=None, ratio=None)
+        else:
+            scale = 1.0
+            if normalize and reference.get("calibration_ms"):
+                scale = result["calibration_ms"] / reference["calibration_ms"]
+            expected = reference[metric] * scale
+            ratio = result[metric] / expected if expected else float("inf")
+            if ratio > 1.0 + tolerance:
+                status = "regression"
+            elif ratio < 1.0 / (1.0 + tolerance):
+                status = "improved"
+            else:
+                status = "ok"
+            row.update(status=status, expected=expected, ratio=ratio, scale=scale)
+        rows.append(row)
+    return rows
+
+
+def load_baseline(path: Path) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    with path.open("r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def write_baseline(
+    path: Path,
+    previous: Optional[Dict[str, Any]],
+    results: List[Dict[str, Any]],
+    artifacts: Dict[str, str],
+    skipped: List[Dict[str, Any]],
+) -> None:
+    """計測値でベースラインを更新する。今回計測しなかったケースは前回の値を残す。
+
+    モデルが無く計測できなかったケースは、別のモデルで計測した前回値を残さずケースの定義だけを書く。
+    """
+    measured = {case_key(result): result for result in results}
+    missing = {case_key(case) for case in skipped}
+    cases = []
+    for case in (previous or {}).get("cases", DEFAULT_CASES):
+        key = case_key(case)
+        if key in measured:
+            cases.append(_baseline_entry(measured.pop(key)))
+        elif key in missing:
+            cases.append({name: case[name] for name in CASE_FIELDS})
+        else:
+            cases.append(case)
+    cases.extend(_baseline_entry(result) for result in measured.values())
+    baseline = {
+        "environment": environment_info(),
+        "tolerances": (previous or {}).get("tolerances", DEFAULT_TOLERANCES),
+        "model_artifacts": artifacts,
+        "cases": cases,
+    }
+    path.write_text(json.dumps(baseline, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+
+
+def _baseline_entry(result: Dict[str, Any]) -> Dict[str, Any]:
+    entry = {key: result[key] for key in CASE_FIELDS}
+    entry.update(
+        {key: round(result[key], 4) for key in ("mean_ms", "p50_ms", "p95_ms", "per_item_ms", "calibration_ms")}
+    )
+    return entry
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ベースラインと比較する性能回帰ゲート")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIO_NAMES, help="比較するシナリオ（既定は全ケース）")
+    parser.add_argument("--metric", choices=["p50_ms", "mean_ms", "p95_ms"], default=DEFAULT_METRIC)
+    parser.add_argument("--tolerance", type=float, help="全シナリオ共通の許容幅（例: 0.2 = 20%% 遅くなるまで許容）")
+    parser.add_argument("--repeat", type=int, default=3, help="ケースごとの計測回数（最速値を採用）")
+    parser.add_argument("--min-time", type=float, default=0.3, help="1 回の計測の最低秒数")
+    parser.add_argument("--confirm", type=int, default=2, help="回帰と判定したケースを再計測する最大回数")
+    parser.add_argument("--no-normalize", action="store_true", help="キャリブレーションによる正規化を行わない")
+    parser.add_argument("--update", action="store_true", help="計測値でベースラインを書き換える")
+    parser.add_argument("--output", type=Path, help="比較結果 JSON の出力先")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    quiet_logging()
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None and not args.update:
+        print(f"ベースラインがありません: {args.baseline}（--update で作成してください）", file=sys.stderr)
+        return 2
+
+    cases = (baseline or {}).get("cases", DEFAULT_CASES)
+    if args.scenarios:
+        cases = [case for case in cases if case["scenario"] in args.scenarios]
+
+    timing = TimingConfig(warmup=3, min_iterations=10, min_time=args.min_time)
+    ctx = BenchmarkContext()
+    repeat = max(args.repeat, 1)
+    try:
+        cases, results, skipped = measure_cases(ctx, cases, timing, repeat)
+        if args.update:
+            write_baseline(args.baseline, baseline, results, artifact_hashes(), skipped)
+            print(f"ベースラインを更新しました: {args.baseline}", file=sys.stderr)
+            return 0
+
+        def run_compare() -> List[Dict[str, Any]]:
+            return compare(
+                baseline,
+                results,
+                metric=args.metric,
+                normalize=not args.no_normalize,
+                tolerance_override=args.tolerance,
+            )
+
+        rows = run_compare()
+        # 回帰と判定したケースだけ再計測し、より速い結果が出れば差し替える（一時的な干渉による誤検知対策）
+        for attempt in range(args.confirm):
+            failing = [index for index, row in enumerate(rows) if row["status"] == "regression"]
+            if not failing:
+                break
+            print(f"\n回帰候補を再計測します ({attempt + 1}/{args.confirm})", file=sys.stderr)
+            for index in failing:
+                retry = measure_case(ctx, cases[index], timing, repeat)
+                previous = results[index]
+                results[index] = retry
+                if run_compare()[index]["ratio"] > rows[index]["ratio"]:
+                    results[index] = previous
+            rows = run_compare()
+        rows.extend(
+            {"case": case_key(case), "status": "skipped", "current": None, "expected": None, "ratio": None}
+            for case in skipped
+        )
+    finally:
+        ctx.close()
+    artifacts = artifact_hashes()
+
+    # ベースラインに記録のある成果物だけを比較する（記録に無いものは任意扱い）
+    changed_artifacts = [
+        name for name, digest in baseline.get("model_artifacts", {}).items() if artifacts.get(name) != digest
+    ]
+    note = "正規化なし" if args.no_normalize else "キャリブレーション比で正規化"
+    print(f"\n比較指標: {args.metric}（{note}）", file=sys.stderr)
+    for row in rows:
+        if row["status"] == "skipped":
+            detail = "モデルが無いため計測せず"
+        elif row["expected"] is None:
+            detail = "ベースラインなし"
+        else:
+            detail = f"{row['current']:.3f}ms / 期待値 {row['expected']:.3f}ms ({row['ratio']:.2f}x, 補正 x{row['scale']:.2f}, 許容 {1 + row['tolerance']:.2f}x)"
+        print(f"  [{row['status']:>10}] {row['case']:<60} {detail}", file=sys.stderr)
+    if changed_artifacts:
+        print(f"\nベースライン記録時からモデル成果物が変わっています: {', '.join(changed_artifacts)}", file=sys.stderr)
+
+    regressions = [row for row in rows if row["status"] == "regression"]
+    if args.output:
+        report = {
+            "environment": environment_info(),
+            "metric": args.metric,
+            "normalized": not args.no_normalize,
+            "changed_artifacts": changed_artifacts,
+            "comparisons": rows,
+            "results": results,
+        }
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+
+    if regressions:
+        print(f"\n性能回帰を検出しました: {len(regressions)} 件", file=sys.stderr)
+        return 1
+    print("\n性能回帰はありません", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""マイクロベンチマークの実行スクリプト。
+
+FeatureExtractor.extract / DetectionService.predict / ClusterAnomalyDetector.predict /
+TestClient 経由の /detect をペイロードサイズ・バッチサイズごとに計測し、JSON で出力する。
+
+実行例:
+    uv run python benchmarks/run_benchmarks.py --output benchmarks/results/latest.json
+    uv run python benchmarks/run_benchmarks.py --scenarios extractor --mouse-sizes 0 1000 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from itertools import product
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from scenarios import (
+    BASE_DIR,
+    SCENARIO_NAMES,
+    SIZE_DEPENDENT,
+    BenchmarkContext,
+    TimingConfig,
+    quiet_logging,
+    run_case,
+)
+
+DEFAULT_MOUSE_SIZES = [0, 100, 1000, 5000, 20000]
+DEFAULT_SEQUENCE_SIZES = [0, 100, 1000, 5000]
+DEFAULT_BATCH_SIZES = [1, 16]
+# サイズを片方ずつ振るときに固定する値
+BASELINE_MOUSE = 100
+BASELINE_SEQUENCE = 100
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="推論パイプラインのマイクロベンチマーク")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIO_NAMES, default=list(SCENARIO_NAMES))
+    parser.add_argument("--mouse-sizes", nargs="+", type=int, default=DEFAULT_MOUSE_SIZES)
+    parser.add_argument("--sequence-sizes", nargs="+", type=int, default=DEFAULT_SEQUENCE_SIZES)
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=DEFAULT_BATCH_SIZES)
+    parser.add_argument(
+        "--grid",
+        action="store_true",
+        help="マウス移動数 x シーケンス長の全組み合わせを計測する（既定は片方ずつ振る）",
+    )
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--min-iterations", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="1 ケースあたりの最低計測秒数")
+    parser.add_argument("--output", type=Path, help="結果 JSON の出力先（省略時は stdout）")
+    return parser.parse_args()
+
+
+def size_cases(args: argparse.Namespace) -> List[Tuple[int, int]]:
+    """計測するペイロードサイズ (マウス移動数, シーケンス長) の一覧。"""
+    if args.grid:
+        return list(product(args.mouse_sizes, args.sequence_sizes))
+    cases = [(mouse, BASELINE_SEQUENCE) for mouse in args.mouse_sizes]
+    cases += [(BASELINE_MOUSE, seq) for seq in args.sequence_sizes if (BASELINE_MOUSE, seq) not in cases]
+    return cases
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_info() -> Dict[str, Any]:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": _git_commit(),
+    }
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    timing = TimingConfig(warmup=args.warmup, min_iterations=args.min_iterations, min_time=args.min_time)
+    ctx = BenchmarkContext()
+    results: List[Dict[str, Any]] = []
+    try:
+        for scenario in args.scenarios:
+            sizes = size_cases(args) if SIZE_DEPENDENT[scenario] else [(None, None)]
+            for (mouse, seq), batch_size in product(sizes, args.batch_sizes):
+                result = run_case(
+                    ctx,
+                    scenario,
+                    mouse_movements=mouse,
+                    sequence_events=seq,
+                    batch_size=batch_size,
+                    timing=timing,
+                )
+                results.append(result)
+                print(
+                    f"{scenario:<18} mouse={mouse!s:>6} seq={seq!s:>5} batch={batch_size:>3} "
+                    f"mean={result['mean_ms']:.3f}ms p95={result['p95_ms']:.3f}ms "
+                    f"per_item={result['per_item_ms']:.3f}ms",
+                    file=sys.stderr,
+                )
+    finally:
+        ctx.close()
+    return {"environment": environment_info(), "results": results}
+
+
+def main() -> None:
+    args = parse_args()
+    quiet_logging()
+    report = run_benchmarks(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(text + "\n", encoding="utf-8")
+        print(f"結果を保存しました: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
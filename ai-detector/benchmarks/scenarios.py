@@ -0,0 +1,233 @@
+"""ベンチマークシナリオ定義（特徴量抽出・推論サービス・クラスタ検知・/detect）。
+
+`run_benchmarks.py` から利用する。ペイロードは tests/data/test_detection.json を雛形に、
+マウス移動数・行動シーケンス長を指定して決定的に生成する。
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import statistics
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+SRC_DIR = BASE_DIR / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+TEMPLATE_PATH = BASE_DIR / "tests" / "data" / "test_detection.json"
+
+SEQUENCE_ACTIONS = ("mouse_move", "click", "scroll", "keydown")
+
+# 1 シナリオが依存するペイロード次元（cluster_detector はサイズに依存しない）
+SIZE_DEPENDENT = {"extractor": True, "detection_service": True, "cluster_detector": False, "detect_endpoint": True}
+SCENARIO_NAMES = tuple(SIZE_DEPENDENT)
+
+
+def build_payload(mouse_movements: int, sequence_events: int, seed: int = 0) -> Dict[str, Any]:
+    """指定サイズの /detect ペイロードを生成する。"""
+    with TEMPLATE_PATH.open("r", encoding="utf-8") as fh:
+        payload = json.load(fh)
+
+    rng = np.random.default_rng(seed)
+    start = 1_700_000_000_000
+
+    steps = rng.normal(0.0, 8.0, size=(mouse_movements, 2)).cumsum(axis=0) + 400.0
+    velocities = np.abs(rng.normal(1.0, 0.4, size=mouse_movements))
+    payload["behavioral_data"]["mouse_movements"] = [
+        {"timestamp": start + 16 * i, "x": float(x), "y": float(y), "velocity": float(v)}
+        for i, ((x, y), v) in enumerate(zip(steps, velocities))
+    ]
+
+    intervals = rng.integers(20, 400, size=sequence_events).cumsum()
+    sequence: List[Dict[str, Any]] = []
+    for i, offset in enumerate(intervals):
+        action = SEQUENCE_ACTIONS[i % len(SEQUENCE_ACTIONS)]
+        event: Dict[str, Any] = {"action": action, "timestamp": int(start + offset)}
+        if action in {"mouse_move", "click"}:
+            event.update(x=float(rng.uniform(0, 1280)), y=float(rng.uniform(0, 720)))
+            if action == "mouse_move":
+                event["velocity"] = float(abs(rng.normal(1.0, 0.4)))
+        elif action == "scroll":
+            event.update(delta_x=0.0, delta_y=float(rng.normal(0, 120)))
+        else:
+            event["key"] = "a"
+        sequence.append(event)
+    payload["behavior_sequence"] = sequence
+    return payload
+
+
+def cluster_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """統合ペイロードからクラスタ検知用の入力辞書を作る。"""
+    persona = payload["persona_features"]
+    return {
+        "age": persona["age"],
+        "gender": persona["gender"],
+        "prefecture": persona["prefecture"],
+        **persona["purchase"],
+    }
+
+
+class BenchmarkContext:
+    """ベンチマーク対象のコンポーネントを遅延初期化して保持する。"""
+
+    def __init__(self) -> None:
+        self._client = None
+        self._client_cm = None
+
+    @property
+    def extractor(self):
+        from api.dependencies import get_feature_extractor
+
+        return get_feature_extractor()
+
+    @property
+    def detection_service(self):
+        from api.dependencies import get_detection_service
+
+        return get_detection_service()
+
+    @property
+    def cluster_detector(self):
+        from api.dependencies import get_cluster_detector
+
+        return get_cluster_detector()
+
+    @property
+    def client(self):
+        if self._client is None:
+            from fastapi.testclient import TestClient
+
+            from api.app import app
+
+            client_cm = TestClient(app)
+            # 起動に失敗した（モデルが無いなど）場合は close で抜けないよう、入れてから保持する
+            self._client = client_cm.__enter__()
+            self._client_cm = client_cm
+        return self._client
+
+    def close(self) -> None:
+        if self._client_cm is not None:
+            self._client_cm.__exit__(None, None, None)
+            self._client = self._client_cm = None
+
+
+def prepare(ctx: BenchmarkContext, scenario: str, payloads: List[Dict[str, Any]]) -> Callable[[int], None]:
+    """1 回の呼び出しでバッチ全件を処理する関数を返す（引数は反復番号）。"""
+    from schemas.detection import UnifiedDetectionRequest
+
+    if scenario == "extractor":
+        extractor = ctx.extractor
+        requests = [UnifiedDetectionRequest.model_validate(p) for p in payloads]
+        return lambda _: [extractor.extract(r) for r in requests]
+
+    if scenario == "detection_service":
+        service = ctx.detection_service
+        requests = [UnifiedDetectionRequest.model_validate(p) for p in payloads]
+        return lambda _: [service.predict(r) for r in requests]
+
+    if scenario == "cluster_detector":
+        detector = ctx.cluster_detector
+        inputs = [cluster_payload(p) for p in payloads]
+        return lambda _: [detector.predict(data) for data in inputs]
+
+    if scenario == "detect_endpoint":
+        client = ctx.client
+
+        def run(iteration: int) -> None:
+            for index, payload in enumerate(payloads):
+                # セッションとフィンガープリントを毎回変え、キャッシュや判定履歴に当たらない素の経路を計測する
+                key = f"bench-{iteration}-{index}-{uuid.uuid4().hex[:12]}"
+                fingerprint = {**payload["device_fingerprint"], "canvas_fingerprint": key}
+                body = {**payload, "session_id": key, "request_id": None, "device_fingerprint": fingerprint}
+                response = client.post("/detect", json=body)
+                if response.status_code != 200:
+                    raise RuntimeError(f"/detect が {response.status_code} を返しました: {response.text[:200]}")
+
+        return run
+
+    raise ValueError(f"未知のシナリオです: {scenario}")
+
+
+@dataclass
+class TimingConfig:
+    """計測の反復条件。"""
+
+    warmup: int = 2
+    min_iterations: int = 5
+    min_time: float = 0.2
+    max_iterations: int = 10_000
+
+
+def time_batches(fn: Callable[[int], None], timing: TimingConfig) -> List[float]:
+    """fn を繰り返し呼び、1 回あたりの秒数のリストを返す。"""
+    for i in range(timing.warmup):
+        fn(-1 - i)
+    samples: List[float] = []
+    deadline = time.perf_counter() + timing.min_time
+    iteration = 0
+    while iteration < timing.max_iterations and (
+        iteration < timing.min_iterations or time.perf_counter() < deadline
+    ):
+        start = time.perf_counter()
+        fn(iteration)
+        samples.append(time.perf_counter() - start)
+        iteration += 1
+    return samples
+
+
+def summarize(samples: List[float], batch_size: int) -> Dict[str, float]:
+    """計測値をミリ秒単位の統計に変換する。"""
+    ordered = sorted(samples)
+    per_call_ms = [s * 1000.0 for s in ordered]
+    mean_ms = statistics.fmean(per_call_ms)
+    return {
+        "iterations": len(samples),
+        "mean_ms": mean_ms,
+        "p50_ms": per_call_ms[len(per_call_ms) // 2],
+        "p95_ms": per_call_ms[min(len(per_call_ms) - 1, int(len(per_call_ms) * 0.95))],
+        "min_ms": per_call_ms[0],
+        "stdev_ms": statistics.pstdev(per_call_ms),
+        "per_item_ms": mean_ms / batch_size,
+        "items_per_second": batch_size / (mean_ms / 1000.0) if mean_ms else 0.0,
+    }
+
+
+def run_case(
+    ctx: BenchmarkContext,
+    scenario: str,
+    *,
+    mouse_movements: Optional[int],
+    sequence_events: Optional[int],
+    batch_size: int,
+    timing: TimingConfig,
+) -> Dict[str, Any]:
+    """1 ケース（シナリオ x サイズ x バッチ）を計測する。"""
+    payloads = [
+        build_payload(mouse_movements or 0, sequence_events or 0, seed=index) for index in range(batch_size)
+    ]
+    fn = prepare(ctx, scenario, payloads)
+    samples = time_batches(fn, timing)
+    return {
+        "scenario": scenario,
+        "mouse_movements": mouse_movements,
+        "behavior_sequence": sequence_events,
+        "batch_size": batch_size,
+        **summarize(samples, batch_size),
+    }
+
+
+def quiet_logging() -> None:
+    """計測対象外のログ出力を抑える（stdout に JSON を出すため）。"""
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    for name in ("services", "models", "api", "utils", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
@@ -9,8 +9,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from api import dependencies
-from api.routes import cluster, detection, system
-from utils.logging import setup_logging
+from api.middleware import MetricsMiddleware, ProfilingMiddleware
+from api.routes import admin, cluster, detection, system
+import config
+from utils.logging import setup_logging, shutdown_logging
+from utils.memory import MEMORY_TRACKER
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +22,9 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """アプリケーションライフサイクル管理。"""
     setup_logging()
+    if config.TRACEMALLOC_ENABLED:
+        # モデル読み込み分も追跡できるよう、読み込み前に開始する
+        MEMORY_TRACKER.start(config.TRACEMALLOC_FRAMES)
     logger.info("アプリケーション起動中: モデルを読み込みます")
 
     try:
@@ -31,6 +37,7 @@ async def lifespan(app: FastAPI):
 
     yield
     logger.info("アプリケーションをシャットダウンします")
+    shutdown_logging()
 
 
 app = FastAPI(
@@ -48,6 +55,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(system.router)
 app.include_router(detection.router)
 app.include_router(cluster.router)
+app.include_router(admin.router)
@@ -2,13 +2,24 @@
 
 from __future__ import annotations
 
+import hmac
 from functools import lru_cache
+from typing import Optional
 
+from fastapi import Header, HTTPException
+
+import config
 from models.cluster_detector import ClusterAnomalyDetector
 from models.lightgbm_loader import DEFAULT_FEATURE_NAMES, LightGBMModel, load_lightgbm_model
+from schemas.detection import UnifiedDetectionResponse
 from services.cluster_service import ClusterDetectionService
 from services.detection_service import DetectionService
 from services.feature_extractor import FeatureExtractor
+from services.fingerprint_reputation import FingerprintReputation
+from services.idempotency import IdempotencyStore
+from services.rule_cascade import RuleCascade
+from services.session_state import SessionStateStore
+from services.verdict_cache import VerdictCache
 
 
 @lru_cache
@@ -23,10 +34,50 @@ def get_lightgbm_model() -> LightGBMModel:
     return load_lightgbm_model()
 
 
+@lru_cache
+def get_session_state_store() -> Optional[SessionStateStore]:
+    """差分スナップショット用のセッション集計ストア（無効時は None）。"""
+    if not config.SESSION_STATE_ENABLED:
+        return None
+    return SessionStateStore()
+
+
 @lru_cache
 def get_detection_service() -> DetectionService:
     """LightGBM ベースの検知サービス取得。"""
-    return DetectionService(get_lightgbm_model(), get_feature_extractor())
+    return DetectionService(get_lightgbm_model(), get_feature_extractor(), get_session_state_store())
+
+
+@lru_cache
+def get_verdict_cache() -> Optional[VerdictCache]:
+    """セッション単位の判定キャッシュ（無効時は None）。"""
+    if not config.VERDICT_CACHE_ENABLED:
+        return None
+    return VerdictCache()
+
+
+@lru_cache
+def get_fingerprint_reputation() -> Optional[FingerprintReputation]:
+    """デバイスフィンガープリントの判定履歴（無効時は None）。"""
+    if not config.FINGERPRINT_REPUTATION_ENABLED:
+        return None
+    return FingerprintReputation()
+
+
+@lru_cache
+def get_rule_cascade() -> Optional[RuleCascade]:
+    """モデル推論前のルールカスケード（無効時は None）。"""
+    if not config.RULE_CASCADE_ENABLED:
+        return None
+    return RuleCascade()
+
+
+@lru_cache
+def get_idempotency_store() -> Optional[IdempotencyStore[UnifiedDetectionResponse]]:
+    """request_id 単位の冪等性ストア（無効時は None）。"""
+    if not config.IDEMPOTENCY_ENABLED:
+        return None
+    return IdempotencyStore()
 
 
 @lru_cache
@@ -41,3 +92,14 @@ def get_cluster_detector() -> ClusterAnomalyDetector:
 def get_cluster_service() -> ClusterDetectionService:
     """クラスタ異常検知サービスのシングルトン取得。"""
     return ClusterDetectionService(get_cluster_detector())
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """管理用エンドポイントの認可。トークン未設定時はエンドポイント自体を無効化する。"""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # compare_digest は非 ASCII の str を受け付けないため bytes で比較する（ヘッダーは latin-1 で復号される）
+    if not x_admin_token or not hmac.compare_digest(
+        x_admin_token.encode("utf-8"), config.ADMIN_TOKEN.encode("utf-8")
+    ):
+        raise HTTPException(status_code=403, detail="管理者トークンが不正です")
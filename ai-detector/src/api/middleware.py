@@ -0,0 +1,92 @@
+"""ASGI ミドルウェア。"""
+
+from __future__ import annotations
+
+import time
+
+import config
+from utils.metrics import (
+    REQUEST_BYTES,
+    REQUEST_LATENCY,
+    alloc_mark,
+    begin_alloc_sample,
+    end_alloc_sample,
+    observe_stage,
+)
+from utils.profiler import PROFILER
+
+# request.state（scope["state"]）に保存するキー
+METRICS_START_KEY = "metrics_start"
+HANDLER_DONE_KEY = "handler_done"
+ALLOC_START_KEY = "alloc_start"
+
+
+class MetricsMiddleware:
+    """リクエスト全体のレイテンシ・ボディサイズ・レスポンスシリアライズ時間を記録する。
+
+    BaseHTTPMiddleware を経由しない素の ASGI ミドルウェアにしてオーバーヘッドを抑えている。
+    ハンドラは return 直前に ``request.state.handler_done`` を設定すると、
+    そこからレスポンス開始までが ``response_serialize`` ステージとして記録される。
+    tracemalloc の計測中はサンプリングしたリクエストをステージ別確保バイト数の計測対象にする。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        state = scope.setdefault("state", {})
+        state[METRICS_START_KEY] = start
+        alloc_token = begin_alloc_sample()
+        if alloc_token is not None:
+            state[ALLOC_START_KEY] = alloc_mark()
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start":
+                handler_done = state.get(HANDLER_DONE_KEY)
+                if handler_done is not None:
+                    observe_stage("response_serialize", time.perf_counter() - handler_done)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            end_alloc_sample(alloc_token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_LATENCY.labels(path).observe(time.perf_counter() - start)
+            for name, value in scope.get("headers", ()):
+                if name == b"content-length":
+                    try:
+                        REQUEST_BYTES.labels(path).observe(int(value))
+                    except ValueError:
+                        pass
+                    break
+
+
+class ProfilingMiddleware:
+    """管理エンドポイントで開始したプロファイリングセッション中のリクエストを計測する。
+
+    セッションが無いときは属性参照 1 回だけで素通りする。管理エンドポイント自体は計測しない。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not PROFILER.active or scope["type"] != "http" or scope["path"].startswith("/admin"):
+            await self.app(scope, receive, send)
+            return
+
+        session = PROFILER.begin_request()
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            PROFILER.end_request(session)
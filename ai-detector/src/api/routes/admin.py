@@ -0,0 +1,103 @@
+"""管理用エンドポイント（`AI_DETECTOR_ADMIN_TOKEN` を `X-Admin-Token` ヘッダーで送る）。"""
+
+from __future__ import annotations
+
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+import config
+from api.dependencies import require_admin
+from utils.memory import MEMORY_TRACKER
+from utils.profiler import PROFILER
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+@router.post("/profile/start")
+async def start_profile(
+    mode: Literal["cprofile", "sample"] = "cprofile",
+    requests: Optional[int] = Query(None, ge=1, le=100_000, description="計測するリクエスト数"),
+    seconds: Optional[float] = Query(None, gt=0, le=3600, description="計測する秒数"),
+) -> dict[str, object]:
+    """このワーカーで次の N リクエスト、または T 秒間のプロファイリングを開始する。"""
+    try:
+        return PROFILER.start(mode, requests=requests, seconds=seconds)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+
+@router.post("/profile/stop")
+async def stop_profile() -> dict[str, object]:
+    """実行中のプロファイリングを終了する。"""
+    return PROFILER.stop()
+
+
+@router.get("/profile")
+async def get_profile(
+    format: Literal["json", "pstats", "collapsed"] = "json",
+    sort: Literal["cumulative", "tottime", "ncalls"] = "cumulative",
+    limit: int = Query(50, ge=1, le=1000),
+):
+    """プロファイリング結果を返す。
+
+    - ``json``: 状態・関数別上位統計・パッケージ別自己時間
+    - ``pstats``: pstats のテキスト出力（cprofile モード）
+    - ``collapsed``: flamegraph 用 collapsed-stack（sample モード）
+    """
+    if format == "pstats":
+        return PlainTextResponse(PROFILER.pstats_text(sort=sort, limit=limit))
+    if format == "collapsed":
+        return PlainTextResponse(PROFILER.collapsed())
+    return PROFILER.report(sort=sort, limit=limit)
+
+
+@router.get("/memory")
+async def memory_status() -> dict[str, object]:
+    """RSS・tracemalloc の状態・モデルの推定サイズ・保存済みスナップショット一覧を返す。"""
+    return MEMORY_TRACKER.status()
+
+
+@router.post("/memory/tracemalloc/start")
+async def start_tracemalloc(
+    frames: int = Query(config.TRACEMALLOC_FRAMES, ge=1, le=100, description="保存するスタックの深さ"),
+) -> dict[str, object]:
+    """tracemalloc を開始する（計測中はメモリ確保ごとにオーバーヘッドがかかる）。"""
+    return MEMORY_TRACKER.start(frames)
+
+
+@router.post("/memory/tracemalloc/stop")
+async def stop_tracemalloc() -> dict[str, object]:
+    """tracemalloc を停止し、保存済みスナップショットを破棄する。"""
+    return MEMORY_TRACKER.stop()
+
+
+@router.post("/memory/snapshot")
+async def take_memory_snapshot(
+    group_by: Literal["lineno", "filename", "traceback"] = "lineno",
+    limit: int = Query(20, ge=1, le=500),
+) -> dict[str, object]:
+    """スナップショットを保存し、確保量の多い箇所を返す。"""
+    try:
+        return MEMORY_TRACKER.take_snapshot(group_by=group_by, limit=limit)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+
+
+@router.get("/memory/diff")
+async def diff_memory_snapshots(
+    base: int = Query(..., description="比較元のスナップショット ID"),
+    target: Optional[int] = Query(None, description="比較先のスナップショット ID（省略時は現時点）"),
+    group_by: Literal["lineno", "filename", "traceback"] = "lineno",
+    limit: int = Query(20, ge=1, le=500),
+) -> dict[str, object]:
+    """2 つのスナップショット間で増えた確保箇所を返す。"""
+    try:
+        return MEMORY_TRACKER.diff(base, target, group_by=group_by, limit=limit)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=f"スナップショットが見つかりません: {exc}") from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
@@ -2,13 +2,17 @@
 
 from __future__ import annotations
 
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException
 
 from api.dependencies import get_cluster_service
 from schemas.cluster import ClusterAnomalyRequest, ClusterAnomalyResponse
 from services.cluster_service import ClusterDetectionService
+from utils.logging import log_event
 
 router = APIRouter()
+request_logger = logging.getLogger("api.request")
 
 
 @router.post("/detect_cluster_anomaly", response_model=ClusterAnomalyResponse)
@@ -19,6 +23,15 @@ async def detect_cluster_anomaly(
     """クラスタ異常検知エンドポイント。"""
     try:
         result = service.predict(request)
+        log_event(
+            request_logger,
+            "detect_cluster_anomaly",
+            request_id=result.request_id,
+            cluster_id=result.cluster_id,
+            anomaly_score=result.anomaly_score,
+            threshold=result.threshold,
+            is_anomaly=result.is_anomaly,
+        )
         return ClusterAnomalyResponse(
             cluster_id=result.cluster_id,
             prediction=result.prediction,
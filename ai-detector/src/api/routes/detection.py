@@ -2,22 +2,46 @@
 
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
+import logging
+import time
+import uuid
 
-from api.dependencies import get_cluster_service, get_detection_service
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+from api.dependencies import (
+    get_cluster_service,
+    get_detection_service,
+    get_fingerprint_reputation,
+    get_idempotency_store,
+    get_rule_cascade,
+    get_verdict_cache,
+)
+from api.middleware import ALLOC_START_KEY, HANDLER_DONE_KEY, METRICS_START_KEY
 from schemas.cluster import ClusterAnomalyRequest
 from schemas.detection import (
     BrowserDetectionResult,
     FinalDecision,
     PersonaDetectionResult,
+    SessionStateInfo,
     UnifiedDetectionRequest,
     UnifiedDetectionResponse,
 )
 from services.cluster_service import ClusterDetectionService
 from services.detection_service import DetectionService, DetectionResult
+from services.feature_extractor import FEATURE_SCHEMA_VERSION
+from services.fingerprint_reputation import FingerprintReputation, fingerprint_key
+from services.idempotency import IdempotencyStore
+from services.rule_cascade import RuleCascade
+from services.session_state import SessionResyncRequired
+from services.verdict_cache import VerdictCache, payload_digest
+from utils.logging import log_event
+from utils.metrics import observe_alloc, observe_payload, observe_stage, stage_timer
+from utils.profiler import PROFILER
 from utils.training_logger import log_detection_sample
 
 router = APIRouter()
+# 1 リクエスト 1 行の要約ログ（AI_DETECTOR_LOG_SAMPLE_RATES の `api.request` で間引ける）
+request_logger = logging.getLogger("api.request")
 
 
 def _build_cluster_request(request: UnifiedDetectionRequest) -> ClusterAnomalyRequest:
@@ -37,19 +61,189 @@ def _build_cluster_request(request: UnifiedDetectionRequest) -> ClusterAnomalyRe
         manufacturer=purchase.manufacturer,
         pc1=purchase.pc1,
         pc2=purchase.pc2,
+        product_id=purchase.product_id,
+    )
+
+
+def _short_circuit_response(
+    request: UnifiedDetectionRequest, *, score: float, confidence: float, reason: str
+) -> UnifiedDetectionResponse:
+    """モデルを通さずに確定した bot 判定レスポンス（特徴量は空）。"""
+    return UnifiedDetectionResponse(
+        session_id=request.session_id or str(uuid.uuid4()),
+        request_id=request.request_id or str(uuid.uuid4()),
+        browser_detection=BrowserDetectionResult(
+            score=score,
+            is_bot=True,
+            confidence=confidence,
+            raw_prediction=score,
+            features_extracted={},
+        ),
+        persona_detection=PersonaDetectionResult(is_provided=False),
+        final_decision=FinalDecision(is_bot=True, reason=reason, recommendation="challenge"),
+        # 差分集計は更新していないので、次回は全量を送らせる
+        session_state=(
+            SessionStateInfo(snapshot_seq=request.snapshot_seq, delta_ready=False)
+            if request.snapshot_seq is not None
+            else None
+        ),
     )
 
 
+def _log_short_circuit_sample(
+    request: UnifiedDetectionRequest, response: UnifiedDetectionResponse, source: str
+) -> None:
+    """推論を省略した判定も通常のサンプリングで学習ログに残す（bot 判定は常に保存される）。"""
+    if request.delta:
+        # 差分の配列だけでは学習時に特徴量を再計算できない
+        return
+    with stage_timer("training_log_write"):
+        log_detection_sample(
+            request=request,
+            browser_result=response.browser_detection,
+            persona_result=response.persona_detection,
+            final_decision=response.final_decision,
+            source=source,
+        )
+
+
 @router.post("/detect", response_model=UnifiedDetectionResponse)
 async def detect_agent(
     request: UnifiedDetectionRequest,
+    http_request: Request,
     detection_service: DetectionService = Depends(get_detection_service),
     cluster_service: ClusterDetectionService = Depends(get_cluster_service),
+    verdict_cache: VerdictCache | None = Depends(get_verdict_cache),
+    idempotency_store: IdempotencyStore[UnifiedDetectionResponse] | None = Depends(get_idempotency_store),
+    reputation: FingerprintReputation | None = Depends(get_fingerprint_reputation),
+    cascade: RuleCascade | None = Depends(get_rule_cascade),
 ) -> UnifiedDetectionResponse:
     """ブラウザ行動と購入情報を統合した判定を行う。"""
+    handler_start = time.perf_counter()
+    metrics_state = http_request.scope.get("state", {})
+    if METRICS_START_KEY in metrics_state:
+        # ボディ受信〜JSON デコード〜Pydantic 検証までの時間
+        observe_stage("request_decode", time.perf_counter() - metrics_state[METRICS_START_KEY])
+        observe_alloc("request_decode", metrics_state.get(ALLOC_START_KEY))
+    observe_payload("mouse_movements", len(request.behavioral_data.mouse_movements))
+    observe_payload("behavior_sequence", len(request.behavior_sequence))
+
+    # 推論はイベントループを塞がないようスレッドプールで実行する（処理中の重複はその完了を待つ）
+    detect_args = (request, detection_service, cluster_service, verdict_cache, reputation, cascade, handler_start)
+    if idempotency_store is None or not request.request_id:
+        response = await PROFILER.offload(_detect, *detect_args)
+    else:
+
+        async def compute() -> UnifiedDetectionResponse:
+            return await PROFILER.offload(_detect, *detect_args)
+
+        # 同じ request_id の再送は保存済みレスポンスを返し、処理中なら完了を待つ
+        # （クライアント採番の request_id が別セッションと衝突しないよう session_id と組にする）
+        idempotency_key = (request.session_id or "", request.request_id)
+        response, outcome = await idempotency_store.run(idempotency_key, compute)
+        if outcome != "miss":
+            log_event(
+                request_logger,
+                "detect",
+                session_id=response.session_id,
+                request_id=response.request_id,
+                idempotency=outcome,
+                reason=response.final_decision.reason,
+                elapsed_ms=round((time.perf_counter() - handler_start) * 1000, 3),
+            )
+    metrics_state[HANDLER_DONE_KEY] = time.perf_counter()
+    return response
+
+
+def _detect(
+    request: UnifiedDetectionRequest,
+    detection_service: DetectionService,
+    cluster_service: ClusterDetectionService,
+    verdict_cache: VerdictCache | None,
+    reputation: FingerprintReputation | None,
+    cascade: RuleCascade | None,
+    handler_start: float,
+) -> UnifiedDetectionResponse:
+    """ルール・判定キャッシュ・フィンガープリント履歴の参照、推論、学習ログ書き込みを行いレスポンスを組み立てる。"""
+    if cascade is not None:
+        rule_start = time.perf_counter()
+        with stage_timer("rule_cascade"):
+            match = cascade.evaluate(request)
+        if match is not None:
+            # 決定的なシグナル: 特徴量抽出・モデル推論を省略する
+            saved = cascade.record_savings(match, time.perf_counter() - rule_start)
+            response = _short_circuit_response(request, score=0.0, confidence=1.0, reason="rule_cascade")
+            detection_service.discard_session_state(request.session_id)
+            _log_short_circuit_sample(request, response, source="cascade")
+            log_event(
+                request_logger,
+                "detect",
+                session_id=response.session_id,
+                request_id=response.request_id,
+                rule=match.rule,
+                tier=match.tier,
+                saved_ms=round(saved * 1000, 3),
+                reason=response.final_decision.reason,
+                elapsed_ms=round((time.perf_counter() - handler_start) * 1000, 3),
+            )
+            return response
+
+    digest: str | None = None
+    if verdict_cache is not None and request.session_id:
+        with stage_timer("verdict_cache"):
+            digest = payload_digest(request)
+            cached = verdict_cache.get(request.session_id, digest)
+        if cached is not None:
+            # 前回と同じ内容: モデル推論と学習ログ書き込みを省略する
+            response = cached.model_copy(update={"request_id": request.request_id or str(uuid.uuid4())})
+            log_event(
+                request_logger,
+                "detect",
+                session_id=response.session_id,
+                request_id=response.request_id,
+                verdict_cache="hit",
+                reason=response.final_decision.reason,
+                elapsed_ms=round((time.perf_counter() - handler_start) * 1000, 3),
+            )
+            return response
+
+    reputation_key: str | None = None
+    if reputation is not None:
+        with stage_timer("fingerprint_reputation"):
+            reputation_key = fingerprint_key(request.device_fingerprint)
+            known_bad = reputation.lookup(reputation_key) if reputation_key else None
+        if known_bad is not None:
+            # 既知の bot フィンガープリント: 特徴量抽出・モデル推論を省略する
+            response = _short_circuit_response(
+                request,
+                score=known_bad.mean_score,
+                confidence=known_bad.mean_confidence,
+                reason="fingerprint_reputation",
+            )
+            detection_service.discard_session_state(request.session_id)
+            _log_short_circuit_sample(request, response, source="reputation")
+            log_event(
+                request_logger,
+                "detect",
+                session_id=response.session_id,
+                request_id=response.request_id,
+                fingerprint_reputation="skipped",
+                bot_verdicts=known_bad.bot_verdicts,
+                reason=response.final_decision.reason,
+                elapsed_ms=round((time.perf_counter() - handler_start) * 1000, 3),
+            )
+            return response
+
+    model_start = time.perf_counter()
     browser_result: DetectionResult | None = None
     try:
         browser_result = detection_service.predict(request)
+    except SessionResyncRequired as exc:
+        # 差分を適用できない: クライアントは snapshot_seq を進めて全量（delta=false）を再送する
+        raise HTTPException(
+            status_code=409,
+            detail={"code": "session_resync_required", "message": str(exc), "expected_seq": exc.expected_seq},
+        ) from exc
     except Exception as exc:  # pragma: no cover
         raise HTTPException(status_code=500, detail=f"検知処理中にエラーが発生しました: {exc}") from exc
 
@@ -76,6 +270,9 @@ async def detect_agent(
                 status_code=500, detail=f"クラスタ異常検知処理中にエラーが発生しました: {exc}"
             ) from exc
 
+    if cascade is not None:
+        cascade.observe_model_latency(time.perf_counter() - model_start)
+
     is_bot = browser_result.is_bot or persona_flagged
 
     if persona_flagged:
@@ -106,11 +303,50 @@ async def detect_agent(
         ),
         persona_detection=persona_result,
         final_decision=final_decision,
+        session_state=(
+            SessionStateInfo(
+                snapshot_seq=browser_result.session_state.snapshot_seq,
+                delta_ready=browser_result.session_state.delta_ready,
+            )
+            if browser_result.session_state is not None
+            else None
+        ),
     )
-    log_detection_sample(
-        request=request,
-        browser_result=browser_result,
-        persona_result=persona_result,
-        final_decision=final_decision,
+    if digest is not None:
+        verdict_cache.put(request.session_id, digest, response)
+    if reputation_key is not None:
+        reputation.record(
+            reputation_key,
+            is_bot=browser_result.is_bot,
+            score=browser_result.score,
+            confidence=browser_result.confidence,
+        )
+    with stage_timer("training_log_write"):
+        log_detection_sample(
+            request=request,
+            browser_result=browser_result,
+            persona_result=persona_result,
+            final_decision=final_decision,
+            feature_names=detection_service.feature_names,
+            schema_version=FEATURE_SCHEMA_VERSION,
+        )
+    log_event(
+        request_logger,
+        "detect",
+        session_id=response.session_id,
+        request_id=response.request_id,
+        mouse_movements=len(request.behavioral_data.mouse_movements),
+        behavior_sequence=len(request.behavior_sequence),
+        snapshot_seq=request.snapshot_seq,
+        delta=request.delta,
+        verdict_cache="miss" if digest is not None else None,
+        score=browser_result.score,
+        browser_is_bot=browser_result.is_bot,
+        cluster_id=persona_result.cluster_id,
+        anomaly_score=persona_result.anomaly_score,
+        threshold=persona_result.threshold,
+        is_anomaly=persona_result.is_anomaly,
+        reason=reason,
+        elapsed_ms=round((time.perf_counter() - handler_start) * 1000, 3),
     )
     return response
@@ -5,8 +5,11 @@ from __future__ import annotations
 import time
 
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
 
 from api.dependencies import get_cluster_detector, get_lightgbm_model
+from utils.metrics import render_prometheus
+from utils.training_logger import get_sampling_stats
 
 router = APIRouter()
 
@@ -45,3 +48,15 @@ async def health_check() -> dict[str, object]:
         "cluster_model_loaded": cluster_loaded,
         "timestamp": int(time.time() * 1000),
     }
+
+
+@router.get("/training_log/stats")
+async def training_log_stats() -> dict[str, object]:
+    """学習ログのサンプリング統計（保存・破棄件数）。"""
+    return get_sampling_stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """ステージ別レイテンシ・ペイロードサイズのヒストグラム（Prometheus テキスト形式）。"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
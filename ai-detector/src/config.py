@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import os
 from pathlib import Path
+from typing import Dict
 
 
 # プロジェクトルート（ai-detector ディレクトリ）
@@ -23,6 +24,13 @@ MODELS_DIR = BASE_DIR / "models"
 LIGHTGBM_MODEL_PATH = MODELS_DIR / "browser" / "lightgbm_model.pkl"
 LIGHTGBM_METADATA_PATH = MODELS_DIR / "browser" / "lightgbm_metadata.json"
 CLUSTER_MODELS_DIR = MODELS_DIR / "persona"
+# 商品カテゴリ → (pc1, pc2) の射影テーブル（pc1/pc2 未指定リクエストの補完に利用）
+_category_projection_env = os.getenv("AI_DETECTOR_CATEGORY_PROJECTION_PATH")
+CATEGORY_PROJECTION_PATH = (
+    Path(_category_projection_env).expanduser()
+    if _category_projection_env
+    else CLUSTER_MODELS_DIR / "category_projection.json"
+)
 
 # データディレクトリ（必要に応じて利用）
 DATA_DIR = BASE_DIR / "data"
@@ -47,6 +55,107 @@ TRAINING_LOG_DIR = (TRAINING_LOG_BASE_DIR / TRAINING_LOG_LABEL).resolve()
 
 TRAINING_LOG_ENABLED = os.getenv("AI_DETECTOR_TRAINING_LOG", "").lower() in {"1", "true", "on", "yes"}
 
+# 推論時の特徴量ベクトルを列指向バイナリでも保存するか（学習ログ有効時のみ）
+TRAINING_FEATURE_STORE_ENABLED = os.getenv("AI_DETECTOR_TRAINING_FEATURE_STORE", "1").lower() in {
+    "1",
+    "true",
+    "on",
+    "yes",
+}
+
+
+def _parse_rate_map(raw: str) -> Dict[str, float]:
+    """`normal=0.1,browser_behavior=1` 形式の文字列をサンプリング率の辞書に変換する。"""
+    rates: Dict[str, float] = {}
+    for item in raw.split(","):
+        key, sep, value = item.partition("=")
+        if not sep or not key.strip():
+            continue
+        try:
+            rates[key.strip()] = min(max(float(value), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+# 学習ログのサンプリングポリシー
+# final_decision.reason ごとの保存率（未指定の reason は DEFAULT_RATE）
+TRAINING_LOG_SAMPLE_RATES = _parse_rate_map(os.getenv("AI_DETECTOR_TRAINING_LOG_SAMPLE_RATES", ""))
+TRAINING_LOG_DEFAULT_SAMPLE_RATE = min(
+    max(float(os.getenv("AI_DETECTOR_TRAINING_LOG_DEFAULT_SAMPLE_RATE", "1.0")), 0.0), 1.0
+)
+# bot 判定は常に保存する
+TRAINING_LOG_KEEP_BOT = os.getenv("AI_DETECTOR_TRAINING_LOG_KEEP_BOT", "1").lower() in {"1", "true", "on", "yes"}
+# |score - 0.5| がこの幅以内の境界スコアは常に保存する（0 で無効）
+TRAINING_LOG_BORDERLINE_MARGIN = float(os.getenv("AI_DETECTOR_TRAINING_LOG_BORDERLINE_MARGIN", "0.1"))
+
+# ステージ別レイテンシ等のメトリクス記録（/metrics で公開）
+METRICS_ENABLED = os.getenv("AI_DETECTOR_METRICS", "1").lower() in {"1", "true", "on", "yes"}
+
+# セッション単位の差分スナップショット（snapshot_seq / delta）用の集計状態
+# プロセス内に保持するため、複数インスタンス構成ではセッションアフィニティが必要
+SESSION_STATE_ENABLED = os.getenv("AI_DETECTOR_SESSION_STATE", "1").lower() in {"1", "true", "on", "yes"}
+SESSION_STATE_TTL_SECONDS = float(os.getenv("AI_DETECTOR_SESSION_STATE_TTL_SECONDS", "1800"))
+SESSION_STATE_MAX_SESSIONS = int(os.getenv("AI_DETECTOR_SESSION_STATE_MAX_SESSIONS", "10000"))
+SESSION_STATE_MAX_BYTES = int(os.getenv("AI_DETECTOR_SESSION_STATE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# 同一セッション・同一内容のリクエストに前回の判定を返すキャッシュ
+VERDICT_CACHE_ENABLED = os.getenv("AI_DETECTOR_VERDICT_CACHE", "1").lower() in {"1", "true", "on", "yes"}
+VERDICT_CACHE_TTL_SECONDS = float(os.getenv("AI_DETECTOR_VERDICT_CACHE_TTL_SECONDS", "30"))
+VERDICT_CACHE_MAX_ENTRIES = int(os.getenv("AI_DETECTOR_VERDICT_CACHE_MAX_ENTRIES", "10000"))
+
+# request_id 単位の冪等性ストア（再送に保存済みレスポンスを返す）
+IDEMPOTENCY_ENABLED = os.getenv("AI_DETECTOR_IDEMPOTENCY", "1").lower() in {"1", "true", "on", "yes"}
+IDEMPOTENCY_WINDOW_SECONDS = float(os.getenv("AI_DETECTOR_IDEMPOTENCY_WINDOW_SECONDS", "300"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("AI_DETECTOR_IDEMPOTENCY_MAX_ENTRIES", "10000"))
+
+# デバイスフィンガープリントの判定履歴。確信度の高い bot 判定が溜まったものは推論を省略する
+FINGERPRINT_REPUTATION_ENABLED = os.getenv("AI_DETECTOR_FINGERPRINT_REPUTATION", "1").lower() in {
+    "1",
+    "true",
+    "on",
+    "yes",
+}
+FINGERPRINT_REPUTATION_MAX_ENTRIES = int(os.getenv("AI_DETECTOR_FINGERPRINT_REPUTATION_MAX_ENTRIES", "100000"))
+FINGERPRINT_REPUTATION_TTL_SECONDS = float(os.getenv("AI_DETECTOR_FINGERPRINT_REPUTATION_TTL_SECONDS", "3600"))
+# 推論を省略するのに必要な bot 判定数と、判定として数える確信度の下限
+FINGERPRINT_REPUTATION_MIN_VERDICTS = int(os.getenv("AI_DETECTOR_FINGERPRINT_REPUTATION_MIN_VERDICTS", "5"))
+FINGERPRINT_REPUTATION_MIN_CONFIDENCE = float(os.getenv("AI_DETECTOR_FINGERPRINT_REPUTATION_MIN_CONFIDENCE", "0.8"))
+# 既知の bot でもこの割合はモデルで評価し直し、判定を履歴に記録する（回復・TTL 延長のため）
+FINGERPRINT_REPUTATION_PROBE_RATE = min(
+    max(float(os.getenv("AI_DETECTOR_FINGERPRINT_REPUTATION_PROBE_RATE", "0.05")), 0.0), 1.0
+)
+# 初見のフィンガープリントはブルームフィルタに記録するだけにする（2 回目から履歴を作る）
+FINGERPRINT_REPUTATION_DOORKEEPER = os.getenv("AI_DETECTOR_FINGERPRINT_REPUTATION_DOORKEEPER", "1").lower() in {
+    "1",
+    "true",
+    "on",
+    "yes",
+}
+
+# モデル推論前のルールカスケード（決定的なシグナルで bot を確定し推論を省略する）
+RULE_CASCADE_ENABLED = os.getenv("AI_DETECTOR_RULE_CASCADE", "1").lower() in {"1", "true", "on", "yes"}
+# 無効にするルール名（カンマ区切り）。例: `automation_ua,headless_chrome_ua`
+RULE_CASCADE_DISABLED_RULES = frozenset(
+    name.strip() for name in os.getenv("AI_DETECTOR_RULE_CASCADE_DISABLED_RULES", "").split(",") if name.strip()
+)
+
+# ログ設定
+LOG_LEVEL = os.getenv("AI_DETECTOR_LOG_LEVEL", "INFO").upper()
+# stdout への書き込みをバックグラウンドスレッドで行う（0 で同期書き込み）
+LOG_ASYNC = os.getenv("AI_DETECTOR_LOG_ASYNC", "1").lower() in {"1", "true", "on", "yes"}
+# ロガー名（前方一致）ごとの INFO 以下の出力率。例: `api.request=0.1,services=0`
+LOG_SAMPLE_RATES = _parse_rate_map(os.getenv("AI_DETECTOR_LOG_SAMPLE_RATES", ""))
+
+# tracemalloc によるメモリ計測（デバッグ用。起動時から計測する場合は 1）
+TRACEMALLOC_ENABLED = os.getenv("AI_DETECTOR_TRACEMALLOC", "").lower() in {"1", "true", "on", "yes"}
+TRACEMALLOC_FRAMES = max(int(os.getenv("AI_DETECTOR_TRACEMALLOC_FRAMES", "5")), 1)
+# tracemalloc 計測中にステージ別確保バイト数を記録するリクエストの割合
+ALLOC_SAMPLE_RATE = min(max(float(os.getenv("AI_DETECTOR_ALLOC_SAMPLE_RATE", "0.1")), 0.0), 1.0)
+
+# 管理用エンドポイント（/admin/*）のトークン。未設定なら管理エンドポイントは無効
+ADMIN_TOKEN = os.getenv("AI_DETECTOR_ADMIN_TOKEN", "")
+
 # モデル利用制御
 BROWSER_MODEL_DISABLED = os.getenv("AI_DETECTOR_DISABLE_BROWSER_MODEL", "").lower() in {
     "1",
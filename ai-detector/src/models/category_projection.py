@@ -0,0 +1,62 @@
+"""商品カテゴリ（商品ID）から PCA 座標 (pc1, pc2) を引く射影テーブル。"""
+
+from __future__ import annotations
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Projection = Tuple[float, float]
+
+
+def _parse_entries(raw: Dict[str, Any]) -> Dict[int, Projection]:
+    entries: Dict[int, Projection] = {}
+    for key, value in raw.items():
+        entries[int(key)] = (float(value["pc1"]), float(value["pc2"]))
+    return entries
+
+
+class CategoryProjectionTable:
+    """ペルソナ学習で得た射影結果を保持し、リクエストの pc1/pc2 を補完する。
+
+    商品IDの射影が登録されていればそれを優先し、なければ商品カテゴリの射影を返す。
+    """
+
+    def __init__(
+        self,
+        categories: Dict[int, Projection],
+        products: Optional[Dict[int, Projection]] = None,
+        source: Optional[str] = None,
+    ):
+        self.categories = categories
+        self.products = products or {}
+        self.source = source
+
+    @classmethod
+    def load(cls, path: Path) -> "CategoryProjectionTable":
+        """JSON の射影テーブルを読み込む。"""
+        with open(path, "r", encoding="utf-8") as fh:
+            payload = json.load(fh)
+        return cls(
+            categories=_parse_entries(payload.get("categories", {})),
+            products=_parse_entries(payload.get("products", {})),
+            source=payload.get("source"),
+        )
+
+    def __len__(self) -> int:
+        return len(self.categories) + len(self.products)
+
+    def lookup(
+        self, product_category: Optional[int] = None, product_id: Optional[int] = None
+    ) -> Optional[Projection]:
+        """商品ID → 商品カテゴリの順に射影を探す。見つからなければ None。"""
+        if product_id is not None:
+            projection = self.products.get(int(product_id))
+            if projection is not None:
+                return projection
+        if product_category is not None:
+            return self.categories.get(int(product_category))
+        return None
@@ -11,6 +11,9 @@ import joblib
 import numpy as np
 
 import config
+from models.category_projection import CategoryProjectionTable
+from utils.memory import record_model_footprint
+from utils.metrics import stage_timer
 
 logger = logging.getLogger(__name__)
 
@@ -18,11 +21,13 @@ logger = logging.getLogger(__name__)
 class ClusterAnomalyDetector:
     """KMeans と IsolationForest を組み合わせた異常検知器。"""
 
-    def __init__(self, models_dir: Path | None = None):
+    def __init__(self, models_dir: Path | None = None, projection_path: Path | None = None):
         self.models_dir = models_dir or config.CLUSTER_MODELS_DIR
+        self.projection_path = projection_path or config.CATEGORY_PROJECTION_PATH
         self.kmeans_model = None
         self.cluster_models = None
         self.metadata: Dict[str, Any] | None = None
+        self.projection: CategoryProjectionTable | None = None
         self.logger = logging.getLogger(__name__)
 
     def load_models(self) -> None:
@@ -46,6 +51,10 @@ class ClusterAnomalyDetector:
         self.cluster_models = joblib.load(cluster_models_path)
         self.logger.info("クラスタ異常検知モデルを読み込みました")
 
+        record_model_footprint("kmeans", self.kmeans_model)
+        for cluster_id, cluster_model in self.cluster_models.items():
+            record_model_footprint(f"isolation_forest_{cluster_id}", cluster_model)
+
         if metadata_path.exists():
             with open(metadata_path, "r", encoding="utf-8") as fh:
                 self.metadata = json.load(fh)
@@ -53,6 +62,24 @@ class ClusterAnomalyDetector:
         else:
             self.logger.warning("メタデータファイルが見つかりません: %s", metadata_path)
 
+        projection_path = Path(self.projection_path)
+        if projection_path.exists():
+            self.projection = CategoryProjectionTable.load(projection_path)
+            self.logger.info("射影テーブルを読み込みました: %s件 (%s)", len(self.projection), projection_path)
+        else:
+            self.logger.warning("射影テーブルが見つかりません。pc1/pc2 未指定時は 0.0 で補完します: %s", projection_path)
+
+    def resolve_projection(self, data: Dict[str, Any]) -> Tuple[float, float]:
+        """pc1/pc2 を返す。未指定なら射影テーブル（商品ID → 商品カテゴリ）から補完する。"""
+        pc1 = data.get("pc1")
+        pc2 = data.get("pc2")
+        if (pc1 is None or pc2 is None) and self.projection is not None:
+            projection = self.projection.lookup(data.get("product_category"), data.get("product_id"))
+            if projection is not None:
+                pc1 = projection[0] if pc1 is None else pc1
+                pc2 = projection[1] if pc2 is None else pc2
+        return (pc1 or 0.0, pc2 or 0.0)
+
     def predict_cluster(self, age: int, gender: int, prefecture: int) -> int:
         """クラスタIDを予測する。"""
         if self.kmeans_model is None:
@@ -60,7 +87,7 @@ class ClusterAnomalyDetector:
 
         input_data = np.array([[age, gender, prefecture]])
         cluster_id = int(self.kmeans_model.predict(input_data)[0])
-        self.logger.info(
+        self.logger.debug(
             "クラスタ予測: age=%s gender=%s prefecture=%s -> cluster_id=%s",
             age,
             gender,
@@ -100,7 +127,7 @@ class ClusterAnomalyDetector:
             )
 
         is_anomaly = anomaly_score < threshold
-        self.logger.info(
+        self.logger.debug(
             "異常検知: cluster_id=%s prediction=%s score=%.4f threshold=%.4f is_anomaly=%s",
             cluster_id,
             prediction,
@@ -117,6 +144,7 @@ class ClusterAnomalyDetector:
             age = data["age"]
             gender = data["gender"]
             prefecture = data["prefecture"]
+            pc1, pc2 = self.resolve_projection(data)
 
             purchase_data = (
                 age,
@@ -130,12 +158,14 @@ class ClusterAnomalyDetector:
                 data["limited_flag"],
                 data["payment_method"],
                 data["manufacturer"],
-                data.get("pc1", 0.0) or 0.0,
-                data.get("pc2", 0.0) or 0.0,
+                pc1,
+                pc2,
             )
 
-            cluster_id = self.predict_cluster(age, gender, prefecture)
-            prediction, anomaly_score, threshold = self.detect_anomaly(cluster_id, purchase_data)
+            with stage_timer("cluster_assign"):
+                cluster_id = self.predict_cluster(age, gender, prefecture)
+            with stage_timer("isolation_forest"):
+                prediction, anomaly_score, threshold = self.detect_anomaly(cluster_id, purchase_data)
 
             return {
                 "cluster_id": cluster_id,
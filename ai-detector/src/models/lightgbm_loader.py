@@ -12,6 +12,7 @@ import joblib
 import lightgbm as lgb
 
 import config
+from utils.memory import record_model_footprint
 
 logger = logging.getLogger(__name__)
 
@@ -133,6 +134,7 @@ def load_lightgbm_model(model_path: Path | None = None) -> LightGBMModel:
         raise
 
     logger.info("LightGBMモデルを読み込みました: %s (format=%s)", resolved_path, model_format)
+    record_model_footprint("lightgbm", booster)
     return LightGBMModel(
         booster=booster,
         feature_names=feature_names,
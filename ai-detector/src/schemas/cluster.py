@@ -23,6 +23,9 @@ class ClusterAnomalyRequest(BaseModel):
     manufacturer: Optional[int] = Field(None, description="メーカーID")
     pc1: Optional[float] = Field(None, description="商品特徴量の主成分1")
     pc2: Optional[float] = Field(None, description="商品特徴量の主成分2")
+    product_id: Optional[int] = Field(
+        None, description="商品ID（pc1/pc2 未指定時に射影テーブルから補完するキー）"
+    )
 
 
 class ClusterAnomalyResponse(BaseModel):
@@ -4,7 +4,7 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 
-from pydantic import AliasChoices, BaseModel, ConfigDict, Field
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, model_validator
 
 
 class MouseMovement(BaseModel):
@@ -131,6 +131,7 @@ class PersonaPurchaseData(BaseModel):
     manufacturer: int
     pc1: Optional[float] = None
     pc2: Optional[float] = None
+    product_id: Optional[int] = None
 
 
 class PersonaFeatures(BaseModel):
@@ -167,6 +168,29 @@ class UnifiedDetectionRequest(BaseModel):
         alias="context",
         validation_alias=AliasChoices("context", "contextData"),
     )
+    # 差分スナップショット: snapshot_seq を付けるとサーバーがセッションの集計値を保持し、
+    # 次回以降は delta=true で前回以降の mouse_movements / behavior_sequence だけを送れる
+    snapshot_seq: Optional[int] = Field(
+        None,
+        alias="snapshot_seq",
+        validation_alias=AliasChoices("snapshot_seq", "snapshotSeq"),
+        ge=0,
+    )
+    delta: bool = False
+
+    @model_validator(mode="after")
+    def _check_delta(self) -> "UnifiedDetectionRequest":
+        # 差分は session_id と snapshot_seq で前回の集計値に紐付けるため、どちらも必須
+        if self.delta and (self.snapshot_seq is None or not self.session_id):
+            raise ValueError("delta=true には session_id と snapshot_seq が必要です")
+        return self
+
+
+class SessionStateInfo(BaseModel):
+    """サーバー側のセッション集計状態。delta_ready=false なら次回は全量を送る。"""
+
+    snapshot_seq: int
+    delta_ready: bool
 
 
 class BrowserDetectionResult(BaseModel):
@@ -198,3 +222,4 @@ class UnifiedDetectionResponse(BaseModel):
     browser_detection: BrowserDetectionResult
     persona_detection: PersonaDetectionResult
     final_decision: FinalDecision
+    session_state: Optional[SessionStateInfo] = None
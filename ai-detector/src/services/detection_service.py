@@ -5,13 +5,15 @@ from __future__ import annotations
 import logging
 import uuid
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, List, Optional
 
 import numpy as np
 
 from models.lightgbm_loader import LightGBMModel
 from schemas.detection import UnifiedDetectionRequest
 from services.feature_extractor import FeatureExtractor
+from services.session_state import SessionResyncRequired, SessionStateStatus, SessionStateStore
+from utils.metrics import stage_timer
 
 logger = logging.getLogger(__name__)
 
@@ -27,28 +29,63 @@ class DetectionResult:
     request_id: str
     features_extracted: Dict[str, float]
     raw_prediction: float
+    session_state: Optional[SessionStateStatus] = None
 
 
 class DetectionService:
     """LightGBMモデルを使用した推論サービス。"""
 
-    def __init__(self, model: LightGBMModel, extractor: FeatureExtractor):
+    def __init__(
+        self,
+        model: LightGBMModel,
+        extractor: FeatureExtractor,
+        session_store: Optional[SessionStateStore] = None,
+    ):
         self._model = model
         self._extractor = extractor
+        self._session_store = session_store
         self._pivot = 0.5
 
-    def predict(self, request: UnifiedDetectionRequest) -> DetectionResult:
-        """リクエストを受け取り推論を実行。"""
+    def discard_session_state(self, session_id: Optional[str]) -> None:
+        """セッションの差分集計状態を破棄する（推論を省略して状態を更新しなかった場合など）。"""
+        if self._session_store is not None and session_id:
+            self._session_store.discard(session_id)
+
+    @property
+    def feature_names(self) -> List[str]:
+        """モデルに入力する特徴量名（列順）。"""
+        return list(self._model.feature_names)
 
-        features = self._extractor.extract(request)
+    def predict(self, request: UnifiedDetectionRequest) -> DetectionResult:
+        """リクエストを受け取り推論を実行。
+
+        差分スナップショットを適用できない場合は SessionResyncRequired を送出する。
+        """
+
+        aggregate = None
+        session_state: Optional[SessionStateStatus] = None
+        if request.delta and self._session_store is None:
+            # 差分だけで推論すると部分的な配列から特徴量を計算してしまうため、全量の再送を求める
+            raise SessionResyncRequired("セッション状態が無効です。全量スナップショットを送信してください")
+        with stage_timer("feature_extract"):
+            if self._session_store is not None and request.snapshot_seq is not None and request.session_id:
+                aggregate, session_state = self._session_store.apply(
+                    request.session_id,
+                    request.snapshot_seq,
+                    delta=request.delta,
+                    mouse_movements=request.behavioral_data.mouse_movements,
+                    sequence=request.behavior_sequence,
+                )
+            features = self._extractor.extract(request, aggregate)
         feature_array = np.array(
             [features[name] for name in self._model.feature_names], dtype=float
         ).reshape(1, -1)
 
         # 学習時のポジティブラベルは「human=1」。モデル出力は human 確率。
-        proba = self._model.predict_proba(feature_array)
+        with stage_timer("lightgbm_predict"):
+            proba = self._model.predict_proba(feature_array)
         human_probability = float(np.ravel(proba)[0])
-        logger.info(
+        logger.debug(
             "LightGBM予測確率(human): %.6f (format=%s)",
             human_probability,
             self._model.model_format,
@@ -70,4 +107,5 @@ class DetectionService:
             request_id=request_id,
             features_extracted=features,
             raw_prediction=human_probability,
+            session_state=session_state,
         )
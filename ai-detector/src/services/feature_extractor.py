@@ -5,14 +5,20 @@ from __future__ import annotations
 import logging
 import math
 from collections import Counter
-from typing import Dict, Iterable, List
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
 
 import numpy as np
 
 from schemas.detection import BehaviorEvent, MouseMovement, UnifiedDetectionRequest
 
+if TYPE_CHECKING:
+    from services.session_state import SessionAggregateSnapshot
+
 logger = logging.getLogger(__name__)
 
+# 特徴量の計算ロジックや並びを変更した場合はインクリメントする（学習用特徴量ストアのタグ）
+FEATURE_SCHEMA_VERSION = 1
+
 
 class FeatureExtractor:
     """ブラウザ行動データをLightGBM特徴量に変換する。"""
@@ -34,26 +40,37 @@ class FeatureExtractor:
             features.setdefault(f"action_type_{category}", 0.0)
         return features
 
-    def extract(self, request: UnifiedDetectionRequest) -> Dict[str, float]:
-        """統合リクエストから特徴量辞書を生成する。"""
+    def extract(
+        self,
+        request: UnifiedDetectionRequest,
+        aggregate: Optional["SessionAggregateSnapshot"] = None,
+    ) -> Dict[str, float]:
+        """統合リクエストから特徴量辞書を生成する。
+
+        aggregate を渡した場合（差分スナップショット）、mouse_movements / behavior_sequence 由来の
+        特徴量はリクエストの配列ではなくセッションの累積集計値から計算する。
+        """
 
         features = self._initialize_features()
 
         behavior_sequence = request.behavior_sequence or []
         behavioral_data = request.behavioral_data
 
-        logger.info(
+        logger.debug(
             "特徴量抽出: behavior_sequence=%s, persona_provided=%s",
             len(behavior_sequence),
             bool(request.persona_features),
         )
 
-        self._fill_temporal_features(
-            features, behavior_sequence, behavioral_data.page_interaction.session_duration_ms
-        )
-        self._fill_counts_and_velocity(features, behavior_sequence, behavioral_data)
-        self._fill_mouse_statistics(features, behavioral_data.mouse_movements)
-        self._fill_sequence_statistics(features, behavior_sequence)
+        if aggregate is not None:
+            self._fill_from_aggregate(features, aggregate, behavioral_data.page_interaction.session_duration_ms)
+        else:
+            self._fill_temporal_features(
+                features, behavior_sequence, behavioral_data.page_interaction.session_duration_ms
+            )
+            self._fill_counts_and_velocity(features, behavior_sequence, behavioral_data)
+            self._fill_mouse_statistics(features, behavioral_data.mouse_movements)
+            self._fill_sequence_statistics(features, behavior_sequence)
         self._fill_aggregated_metrics(features, request)
         self._fill_optional_flags(features, behavioral_data)
         self._fill_action_type_features(features, request)
@@ -215,6 +232,92 @@ class FeatureExtractor:
                 previous_state = action
         features["visibility_toggle_count"] = float(visibility_toggle)
 
+    def _fill_from_aggregate(
+        self,
+        features: Dict[str, float],
+        aggregate: "SessionAggregateSnapshot",
+        session_duration_ms: float,
+    ) -> None:
+        """累積集計値から _fill_temporal_features 〜 _fill_sequence_statistics と同じキーを設定する。
+
+        平均・標準偏差は Welford 法で求めるため全量計算とは丸め誤差の範囲で異なる。
+        マウス速度の中央値は P² 法による推定値（6 件以上では近似）。
+        """
+        # 時間関連
+        if aggregate.event_count:
+            features["total_duration_ms"] = aggregate.timestamp_max - aggregate.timestamp_min
+            intervals = aggregate.intervals
+            if intervals.count:
+                mean = intervals.mean
+                std = intervals.std
+                features["avg_time_between_actions"] = mean
+                features["time_between_actions_std"] = std
+                features["time_between_actions_max"] = float(intervals.max)
+                features["time_between_actions_min"] = float(intervals.min)
+                features["time_between_actions_cv"] = float(std / mean) if mean else 0.0
+        else:
+            features["total_duration_ms"] = session_duration_ms
+            features["time_between_actions_std"] = 0.0
+            features["time_between_actions_max"] = 0.0
+            features["time_between_actions_min"] = 0.0
+            features["time_between_actions_cv"] = 0.0
+
+        # アクション回数とマウス速度
+        mouse_count = aggregate.mouse_count
+        features["mouse_movements_count"] = float(mouse_count)
+        action_counts = dict(aggregate.bucket_counts)
+        if action_counts["mouse_move"] == 0 and mouse_count:
+            action_counts["mouse_move"] = mouse_count
+        for name, value in action_counts.items():
+            features[f"action_count_{name}"] = value
+
+        velocity = aggregate.velocity
+        if velocity.count:
+            vel_mean, vel_max, vel_std = velocity.mean, float(velocity.max), velocity.std
+        else:
+            vel_mean = vel_max = vel_std = 0.0
+        features["velocity_mean"] = vel_mean
+        features["velocity_max"] = vel_max
+        features["velocity_std"] = vel_std
+        features["mouse_velocity_mean"] = vel_mean
+        features["mouse_velocity_max"] = vel_max
+        features["mouse_velocity_std"] = vel_std
+
+        # マウス統計
+        features["mouse_event_count"] = float(mouse_count)
+        features["mouse_activity_flag"] = 1.0 if mouse_count > 0 else 0.0
+        features["mouse_path_length"] = aggregate.mouse_path_length if mouse_count >= 2 else 0.0
+        features["mouse_duration_ms"] = aggregate.mouse_duration_ms
+        if velocity.count:
+            features["mouse_velocity_median"] = aggregate.velocity_median
+            features["mouse_stationary_ratio"] = float(aggregate.stationary_count / velocity.count)
+        else:
+            features["mouse_velocity_median"] = 0.0
+            features["mouse_stationary_ratio"] = 0.0
+
+        # シーケンス統計
+        count = aggregate.event_count
+        action_counter = aggregate.action_counts
+        total_actions = sum(action_counter.values())
+        features["sequence_event_count"] = float(count)
+        features["seq_total_actions"] = float(total_actions)
+        for name in ["mouse_move", "click", "keystroke", "scroll", "TIMED_SHORT", "TIMED_LONG"]:
+            features[f"seq_count_{name}"] = float(action_counter.get(name, 0))
+        if count:
+            features["sequence_unique_actions"] = float(len(action_counter))
+            if total_actions > 0:
+                entropy = 0.0
+                for value in action_counter.values():
+                    p = value / total_actions
+                    entropy -= p * math.log(p)
+                features["action_entropy"] = entropy
+            features["timed_action_ratio"] = float(aggregate.timed_count) / count
+        else:
+            features["sequence_unique_actions"] = 0.0
+            features["action_entropy"] = 0.0
+            features["timed_action_ratio"] = 0.0
+        features["visibility_toggle_count"] = float(aggregate.visibility_toggles)
+
     def _fill_aggregated_metrics(self, features: Dict[str, float], request: UnifiedDetectionRequest) -> None:
         """BehaviorTracker が計算した集計値を特徴量へマッピングする。"""
         behavioral_data = request.behavioral_data
@@ -0,0 +1,166 @@
+"""デバイスフィンガープリント単位の判定履歴（レピュテーション）。
+
+bot ファームは canvas / WebGL / UA ハッシュ / JA4 の組み合わせを大量のセッションで使い回す。
+フィンガープリントごとに直近の確信度の高いブラウザ判定を数え、bot 判定が十分に溜まり
+human 判定が 1 件も無いものは「既知の bot」として特徴量抽出とモデル推論を省略する。
+
+- 判定履歴は LRU（件数上限・TTL 付き）で保持する。TTL は最後の bot 判定から数え、
+  切れると再びモデルで評価される
+- ``doorkeeper`` を有効にすると、初見のフィンガープリントはブルームフィルタに記録するだけで
+  履歴を作らない（2 回目から作る）。人間のフィンガープリントはほぼ一意なので、LRU が
+  一度きりのキーで埋まるのを防げる。偽陽性は履歴の作成が 1 回早まるだけで、判定の省略には影響しない
+- 省略したリクエストの判定は履歴に加えない（自己強化を避けるため）。代わりに既知の bot への
+  リクエストの一部（``probe_rate``）はモデルで評価し直して記録する。bot 判定が続けば TTL が延び、
+  human 判定が出れば以降は省略しなくなる
+"""
+
+from __future__ import annotations
+
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import config
+from schemas.detection import DeviceFingerprint
+from utils.bloom import BloomFilter
+from utils.metrics import REGISTRY
+
+FINGERPRINT_REPUTATION_REQUESTS = REGISTRY.counter(
+    "ai_detector_fingerprint_reputation_requests_total",
+    "Requests checked against the fingerprint reputation table "
+    "(skipped = inference short-circuited, probe = known-bad sent to the models).",
+    ("result",),
+)
+FINGERPRINT_REPUTATION_ENTRIES = REGISTRY.gauge(
+    "ai_detector_fingerprint_reputation_entries",
+    "Number of fingerprints in the reputation table.",
+)
+
+# 識別子として使えない値（取得失敗時に SDK が送る値など）
+_UNUSABLE_VALUES = {"", "unknown", "error", "unsupported", "canvas_error", "webgl_error"}
+
+
+def fingerprint_key(device_fingerprint: DeviceFingerprint) -> Optional[str]:
+    """安定した識別子からキーを作る。canvas と WebGL がどちらも無い場合は None（キーが粗すぎるため）。"""
+    canvas = (device_fingerprint.canvas_fingerprint or "").strip()
+    webgl = (device_fingerprint.webgl_fingerprint or "").strip()
+    if canvas.lower() in _UNUSABLE_VALUES and webgl.lower() in _UNUSABLE_VALUES:
+        return None
+    parts = (canvas, webgl, device_fingerprint.user_agent_hash or "", device_fingerprint.tls_ja4 or "")
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+@dataclass
+class ReputationEntry:
+    """1 フィンガープリント分の確信度の高い判定の集計。"""
+
+    bot_verdicts: int = 0
+    human_verdicts: int = 0
+    bot_score_sum: float = 0.0
+    bot_confidence_sum: float = 0.0
+    last_bot_verdict: float = 0.0
+
+
+@dataclass(frozen=True)
+class KnownBadVerdict:
+    """既知の bot と判定されたフィンガープリントの要約（レスポンスの組み立てに使う）。"""
+
+    bot_verdicts: int
+    mean_score: float
+    mean_confidence: float
+
+
+class FingerprintReputation:
+    """フィンガープリント → ReputationEntry の LRU（件数上限・TTL 付き）。"""
+
+    def __init__(
+        self,
+        max_entries: int = config.FINGERPRINT_REPUTATION_MAX_ENTRIES,
+        ttl_seconds: float = config.FINGERPRINT_REPUTATION_TTL_SECONDS,
+        min_bot_verdicts: int = config.FINGERPRINT_REPUTATION_MIN_VERDICTS,
+        min_confidence: float = config.FINGERPRINT_REPUTATION_MIN_CONFIDENCE,
+        doorkeeper: bool = config.FINGERPRINT_REPUTATION_DOORKEEPER,
+        probe_rate: float = config.FINGERPRINT_REPUTATION_PROBE_RATE,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.min_bot_verdicts = min_bot_verdicts
+        self.min_confidence = min_confidence
+        self.probe_rate = probe_rate
+        self._clock = clock
+        self._rng = rng
+        self._entries: "OrderedDict[str, ReputationEntry]" = OrderedDict()
+        # 世代ごとにクリアするので、LRU 件数と同じ容量で十分
+        self._doorkeeper = BloomFilter(max_entries) if doorkeeper else None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, key: str) -> Optional[KnownBadVerdict]:
+        """既知の bot なら KnownBadVerdict、それ以外（probe_rate で再評価に回すものを含む）は None。"""
+        with self._lock:
+            entry = self._get(key)
+            if (
+                entry is None
+                or entry.human_verdicts > 0
+                or entry.bot_verdicts < self.min_bot_verdicts
+            ):
+                FINGERPRINT_REPUTATION_REQUESTS.labels("evaluated").inc()
+                return None
+            verdict = KnownBadVerdict(
+                bot_verdicts=entry.bot_verdicts,
+                mean_score=entry.bot_score_sum / entry.bot_verdicts,
+                mean_confidence=entry.bot_confidence_sum / entry.bot_verdicts,
+            )
+        if self.probe_rate > 0 and self._rng() < self.probe_rate:
+            FINGERPRINT_REPUTATION_REQUESTS.labels("probe").inc()
+            return None
+        FINGERPRINT_REPUTATION_REQUESTS.labels("skipped").inc()
+        return verdict
+
+    def record(self, key: str, *, is_bot: bool, score: float, confidence: float) -> None:
+        """モデルの判定を記録する。確信度が min_confidence 未満の判定は数えない。"""
+        if confidence < self.min_confidence:
+            return
+        with self._lock:
+            entry = self._get(key)
+            if entry is None:
+                if self._doorkeeper is not None and not self._admit(key):
+                    return
+                entry = ReputationEntry(last_bot_verdict=self._clock())
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                FINGERPRINT_REPUTATION_ENTRIES.labels().set(len(self._entries))
+            if is_bot:
+                entry.bot_verdicts += 1
+                entry.bot_score_sum += score
+                entry.bot_confidence_sum += confidence
+                entry.last_bot_verdict = self._clock()
+            else:
+                entry.human_verdicts += 1
+
+    def _get(self, key: str) -> Optional[ReputationEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._clock() - entry.last_bot_verdict >= self.ttl_seconds:
+            del self._entries[key]
+            FINGERPRINT_REPUTATION_ENTRIES.labels().set(len(self._entries))
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _admit(self, key: str) -> bool:
+        """2 回目以降のフィンガープリントだけ履歴を作る。"""
+        doorkeeper = self._doorkeeper
+        if len(doorkeeper) >= doorkeeper.capacity:
+            doorkeeper.clear()
+        return doorkeeper.add(key)
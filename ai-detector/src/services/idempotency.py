@@ -0,0 +1,98 @@
+"""request_id 単位の冪等性ストア。
+
+タイムアウト時にクライアントが同じ request_id で再送してきた場合、一定時間内であれば
+保存済みのレスポンスを返して再推論・学習ログの二重書き込みを避ける。処理中の request_id に
+重複が届いた場合は、その計算の完了を待って同じ結果を返す（single-flight）。
+
+ストアはプロセス内のみで共有される。失敗した計算は保存しないため、後続の再送は再計算される。
+計算は最初のリクエストとは独立したタスクで実行するため、そのクライアントが切断しても
+合流した待機者の処理は失敗せず、結果は保存される。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Literal, Tuple, TypeVar
+
+import config
+from utils.metrics import REGISTRY
+
+T = TypeVar("T")
+IdempotencyOutcome = Literal["miss", "hit", "coalesced"]
+
+IDEMPOTENCY_REQUESTS = REGISTRY.counter(
+    "ai_detector_idempotency_requests_total",
+    "Requests with a request_id by idempotency outcome.",
+    ("result",),
+)
+IDEMPOTENCY_ENTRIES = REGISTRY.gauge(
+    "ai_detector_idempotency_entries",
+    "Number of stored responses in the idempotency store.",
+)
+
+
+class IdempotencyStore(Generic[T]):
+    """キー（(session_id, request_id) など）→ 結果の LRU（保持期間・件数上限付き）と処理中の Future。"""
+
+    def __init__(
+        self,
+        window_seconds: float = config.IDEMPOTENCY_WINDOW_SECONDS,
+        max_entries: int = config.IDEMPOTENCY_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._completed: "OrderedDict[Hashable, Tuple[T, float]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._completed)
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> Tuple[T, IdempotencyOutcome]:
+        """key の結果を返す。保存済みなら "hit"、処理中の計算を待ったなら "coalesced"。"""
+        entry = self._completed.get(key)
+        if entry is not None:
+            if self._clock() - entry[1] < self.window_seconds:
+                self._completed.move_to_end(key)
+                IDEMPOTENCY_REQUESTS.labels("hit").inc()
+                return entry[0], "hit"
+            del self._completed[key]
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            IDEMPOTENCY_REQUESTS.labels("coalesced").inc()
+            # 待機側のキャンセルで実行中の計算まで止めないよう shield する
+            return await asyncio.shield(pending), "coalesced"
+
+        IDEMPOTENCY_REQUESTS.labels("miss").inc()
+        # 計算はどのリクエストにも属さないタスクで実行する。最初のリクエストが切断（キャンセル）されても
+        # 計算は続き、合流した待機者は結果を受け取れる
+        task = asyncio.ensure_future(compute())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task), "miss"
+
+    def _finish(self, key: Hashable, task: asyncio.Future) -> None:
+        """計算タスクの完了時に呼ばれる。成功した結果だけを保存する。"""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            # 待機者がいない場合の "exception was never retrieved" 警告は exception() の呼び出しで抑止される
+            return
+        self._store(key, task.result())
+
+    def _store(self, key: Hashable, result: T) -> None:
+        self._completed[key] = (result, self._clock())
+        self._completed.move_to_end(key)
+        while len(self._completed) > self.max_entries:
+            self._completed.popitem(last=False)
+        IDEMPOTENCY_ENTRIES.labels().set(len(self._completed))
+
+    def clear(self) -> None:
+        self._completed.clear()
+        IDEMPOTENCY_ENTRIES.labels().set(0)
@@ -0,0 +1,125 @@
+"""モデル推論前に評価する段階的ルール（ルールカスケード）。
+
+解析済みリクエストだけで判断できる決定的なシグナル（``navigator.webdriver`` やヘッドレス UA）を
+安い順に評価し、当たった時点で bot と確定して特徴量抽出・LightGBM・ペルソナモデルを省略する。
+どのルールにも当たらない（曖昧な）リクエストだけがモデルに進む。ルールは bot 判定の確定にのみ使い、
+allow を確定するルールは置かない（回避されやすいため）。
+
+段（tier）ごとの確定数を ``ai_detector_rule_cascade_requests_total{outcome=<tier>|model}`` に、
+省略できた推定時間（モデル経路の平均レイテンシ − ルール評価時間）を
+``ai_detector_rule_cascade_saved_seconds_total{tier}`` に記録する。
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+import config
+from schemas.detection import UnifiedDetectionRequest
+from utils.metrics import REGISTRY
+
+RULE_CASCADE_REQUESTS = REGISTRY.counter(
+    "ai_detector_rule_cascade_requests_total",
+    "Requests by the cascade tier that finalized them (model = passed to the models).",
+    ("outcome",),
+)
+RULE_CASCADE_SAVED_SECONDS = REGISTRY.counter(
+    "ai_detector_rule_cascade_saved_seconds_total",
+    "Estimated model-path latency avoided by each cascade tier in seconds.",
+    ("tier",),
+)
+RULE_CASCADE_RULE_HITS = REGISTRY.counter(
+    "ai_detector_rule_cascade_rule_hits_total",
+    "Requests finalized by each cascade rule.",
+    ("rule",),
+)
+
+# モデル経路レイテンシの指数移動平均の重み
+_EMA_ALPHA = 0.05
+
+
+@dataclass(frozen=True)
+class Rule:
+    """リクエストを受け取り、bot と確定できるなら True を返す述語。"""
+
+    name: str
+    tier: str
+    predicate: Callable[[UnifiedDetectionRequest], bool]
+
+
+@dataclass(frozen=True)
+class RuleMatch:
+    rule: str
+    tier: str
+
+
+def _has_signal(signal: str) -> Callable[[UnifiedDetectionRequest], bool]:
+    def predicate(request: UnifiedDetectionRequest) -> bool:
+        return signal in (request.device_fingerprint.anti_fingerprint_signals or ())
+
+    return predicate
+
+
+def _user_agent_contains(*needles: str) -> Callable[[UnifiedDetectionRequest], bool]:
+    def predicate(request: UnifiedDetectionRequest) -> bool:
+        user_agent = request.device_fingerprint.user_agent.lower()
+        return any(needle in user_agent for needle in needles)
+
+    return predicate
+
+
+# 評価順（安い段から）。SDK が検出済みのシグナル → UA 文字列の走査
+DEFAULT_RULES: Tuple[Rule, ...] = (
+    Rule("navigator_webdriver_true", "fingerprint_signals", _has_signal("navigator_webdriver_true")),
+    Rule("headless_user_agent", "fingerprint_signals", _has_signal("headless_user_agent")),
+    Rule("headless_chrome_ua", "user_agent", _user_agent_contains("headlesschrome")),
+    Rule("automation_ua", "user_agent", _user_agent_contains("phantomjs", "slimerjs", "selenium", "webdriver")),
+)
+
+
+class RuleCascade:
+    """ルールを順に評価し、最初に当たったルールで判定を確定する。"""
+
+    def __init__(
+        self,
+        rules: Iterable[Rule] = DEFAULT_RULES,
+        disabled: Iterable[str] = config.RULE_CASCADE_DISABLED_RULES,
+    ):
+        disabled_names = set(disabled)
+        self.rules: List[Rule] = [rule for rule in rules if rule.name not in disabled_names]
+        self._model_latency: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tiers(self) -> Sequence[str]:
+        return list(dict.fromkeys(rule.tier for rule in self.rules))
+
+    def evaluate(self, request: UnifiedDetectionRequest) -> Optional[RuleMatch]:
+        """当たったルール（無ければ None）。結果を段ごとのカウンタに記録する。"""
+        for rule in self.rules:
+            if rule.predicate(request):
+                RULE_CASCADE_REQUESTS.labels(rule.tier).inc()
+                RULE_CASCADE_RULE_HITS.labels(rule.name).inc()
+                return RuleMatch(rule=rule.name, tier=rule.tier)
+        RULE_CASCADE_REQUESTS.labels("model").inc()
+        return None
+
+    def observe_model_latency(self, seconds: float) -> None:
+        """モデル経路（特徴量抽出〜ペルソナ判定）の所要時間を平均に取り込む。"""
+        with self._lock:
+            if self._model_latency is None:
+                self._model_latency = seconds
+            else:
+                self._model_latency += _EMA_ALPHA * (seconds - self._model_latency)
+
+    def record_savings(self, match: RuleMatch, rule_seconds: float) -> float:
+        """確定によって省略できた推定時間を記録して返す（モデル経路の実績が無ければ 0）。"""
+        with self._lock:
+            model_latency = self._model_latency
+        if model_latency is None:
+            return 0.0
+        saved = max(model_latency - rule_seconds, 0.0)
+        RULE_CASCADE_SAVED_SECONDS.labels(match.tier).inc(saved)
+        return saved
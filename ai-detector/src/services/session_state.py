@@ -0,0 +1,427 @@
+"""セッション単位の行動データ集計ストア（差分スナップショット用）。
+
+SDK は同じ session_id について累積の mouse_movements / behavior_sequence を何度も送ってくる。
+クライアントが ``snapshot_seq`` を付けて送ると、サーバーはセッションごとの集計値
+（件数・Welford 法による平均/分散・最終タイムスタンプなど）を保持し、以降は
+``delta: true`` で前回スナップショット以降の差分だけを受け付ける。特徴量は集計値から
+計算するため、抽出コストは累積件数ではなく差分の件数に比例する。
+
+- 集計値は TTL・セッション数・合計バイト数の上限付きで LRU 管理する
+- 状態が無い・``snapshot_seq`` が飛んでいる差分は正しく計算できないため
+  :class:`SessionResyncRequired` を送出する（API は 409 を返し、クライアントは全量を再送する）
+- マウス速度の中央値は P² 法で逐次推定する（5 点だけ保持するため全量計算とは近似値の範囲で異なる）
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import config
+from schemas.detection import BehaviorEvent, MouseMovement
+from utils.metrics import REGISTRY
+
+SESSION_STATE_EVENTS = REGISTRY.counter(
+    "ai_detector_session_state_events_total",
+    "Session state store operations by outcome.",
+    ("outcome",),
+)
+SESSION_STATE_SESSIONS = REGISTRY.gauge(
+    "ai_detector_session_state_sessions",
+    "Number of sessions held in the session state store.",
+)
+SESSION_STATE_BYTES = REGISTRY.gauge(
+    "ai_detector_session_state_bytes",
+    "Estimated memory used by the session state store in bytes.",
+)
+
+# 集計値 1 件あたりの固定オーバーヘッド（オブジェクト・カウンタ辞書などの概算）
+_BASE_AGGREGATE_BYTES = 2048
+_BYTES_PER_ACTION_KEY = 128
+_VISIBILITY_ACTIONS = {"visible", "hidden"}
+
+
+class SessionResyncRequired(Exception):
+    """差分を適用できない（状態が無い・連番が飛んでいる）。クライアントは全量を再送する必要がある。"""
+
+    def __init__(self, message: str, expected_seq: Optional[int] = None):
+        super().__init__(message)
+        self.expected_seq = expected_seq
+
+
+class RunningStats:
+    """Welford 法による件数・平均・母分散と最小/最大。"""
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def push(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+    def snapshot(self) -> "StatsSnapshot":
+        return StatsSnapshot(self.count, self.mean, self.std, self.min, self.max)
+
+
+@dataclass(frozen=True)
+class StatsSnapshot:
+    """RunningStats のある時点の値。"""
+
+    count: int
+    mean: float
+    std: float
+    min: float
+    max: float
+
+
+class StreamingMedian:
+    """P² 法（Jain & Chlamtac, 1985）による中央値の逐次推定。保持するのは 5 点のマーカーだけ。
+
+    5 件以下のうちは値をそのまま持ち、np.median と同じ値を返す。
+    """
+
+    __slots__ = ("count", "heights", "positions", "desired")
+
+    _INCREMENTS = (0.0, 0.25, 0.5, 0.75, 1.0)
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.heights: List[float] = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0.0, 1.0, 2.0, 3.0, 4.0]
+
+    def push(self, value: float) -> None:
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+        positions = self.positions
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self._INCREMENTS[i]
+
+        for i in (1, 2, 3):
+            offset = self.desired[i] - positions[i]
+            if (offset >= 1 and positions[i + 1] - positions[i] > 1) or (
+                offset <= -1 and positions[i - 1] - positions[i] < -1
+            ):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (
+                        positions[i + step] - positions[i]
+                    )
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    @property
+    def value(self) -> float:
+        if not self.count:
+            return 0.0
+        if self.count > 5:
+            return self.heights[2]
+        middle = self.count // 2
+        if self.count % 2:
+            return self.heights[middle]
+        return (self.heights[middle - 1] + self.heights[middle]) / 2
+
+
+class SessionAggregate:
+    """1 セッション分の累積集計値。FeatureExtractor が特徴量の計算に使う。"""
+
+    def __init__(self, snapshot_seq: int):
+        self.snapshot_seq = snapshot_seq
+
+        # behavior_sequence
+        self.event_count = 0
+        self.action_counts: Dict[str, int] = {}
+        self.bucket_counts = {"mouse_move": 0, "click": 0, "keystroke": 0, "scroll": 0, "idle": 0}
+        self.timed_count = 0
+        self.timestamp_min: Optional[int] = None
+        self.timestamp_max: Optional[int] = None
+        self.last_timestamp: Optional[int] = None
+        self.intervals = RunningStats()
+        self.visibility_state: Optional[str] = None
+        self.visibility_toggles = 0
+
+        # mouse_movements
+        self.mouse_count = 0
+        self.mouse_first_timestamp: Optional[int] = None
+        self.mouse_last: Optional[Tuple[float, float, int]] = None
+        self.mouse_path_length = 0.0
+        self.velocity = RunningStats()
+        self.velocity_median = StreamingMedian()
+        self.stationary_count = 0
+
+    def update(self, mouse_movements: Iterable[MouseMovement], sequence: Iterable[BehaviorEvent]) -> None:
+        """差分のイベントを取り込む（FeatureExtractor の全量計算と同じ順序・条件で集計する）。"""
+        for event in sequence:
+            self._add_event(event)
+        for movement in mouse_movements:
+            self._add_movement(movement)
+
+    def _add_event(self, event: BehaviorEvent) -> None:
+        self.event_count += 1
+        timestamp = event.timestamp
+        if self.timestamp_min is None or timestamp < self.timestamp_min:
+            self.timestamp_min = timestamp
+        if self.timestamp_max is None or timestamp > self.timestamp_max:
+            self.timestamp_max = timestamp
+        if self.last_timestamp is not None and timestamp >= self.last_timestamp:
+            self.intervals.push(timestamp - self.last_timestamp)
+        self.last_timestamp = timestamp
+
+        action = event.action
+        if not action:
+            return
+        self.action_counts[action] = self.action_counts.get(action, 0) + 1
+        action_lower = action.lower()
+        if "mouse" in action_lower:
+            self.bucket_counts["mouse_move"] += 1
+        elif "click" in action_lower:
+            self.bucket_counts["click"] += 1
+        elif "key" in action_lower:
+            self.bucket_counts["keystroke"] += 1
+        elif "scroll" in action_lower:
+            self.bucket_counts["scroll"] += 1
+        elif "idle" in action_lower:
+            self.bucket_counts["idle"] += 1
+        if "timed" in action_lower:
+            self.timed_count += 1
+        if action_lower in _VISIBILITY_ACTIONS:
+            if self.visibility_state is not None and action_lower != self.visibility_state:
+                self.visibility_toggles += 1
+            self.visibility_state = action_lower
+
+    def _add_movement(self, movement: MouseMovement) -> None:
+        self.mouse_count += 1
+        if self.mouse_first_timestamp is None:
+            self.mouse_first_timestamp = movement.timestamp
+        if self.mouse_last is not None:
+            last_x, last_y, _ = self.mouse_last
+            self.mouse_path_length += math.hypot(movement.x - last_x, movement.y - last_y)
+        self.mouse_last = (movement.x, movement.y, movement.timestamp)
+
+        velocity = movement.velocity
+        if velocity is not None:
+            self.velocity.push(velocity)
+            self.velocity_median.push(velocity)
+            if abs(velocity) <= 0.05:
+                self.stationary_count += 1
+
+    @property
+    def mouse_duration_ms(self) -> float:
+        if self.mouse_count < 2 or self.mouse_last is None or self.mouse_first_timestamp is None:
+            return 0.0
+        return float(self.mouse_last[2] - self.mouse_first_timestamp)
+
+    def approx_bytes(self) -> int:
+        return _BASE_AGGREGATE_BYTES + len(self.action_counts) * _BYTES_PER_ACTION_KEY
+
+    def snapshot(self) -> "SessionAggregateSnapshot":
+        """特徴量の計算に使う値を複製する（ストアのロック内で呼ぶ）。"""
+        return SessionAggregateSnapshot(
+            snapshot_seq=self.snapshot_seq,
+            event_count=self.event_count,
+            action_counts=MappingProxyType(dict(self.action_counts)),
+            bucket_counts=MappingProxyType(dict(self.bucket_counts)),
+            timed_count=self.timed_count,
+            timestamp_min=self.timestamp_min,
+            timestamp_max=self.timestamp_max,
+            intervals=self.intervals.snapshot(),
+            visibility_toggles=self.visibility_toggles,
+            mouse_count=self.mouse_count,
+            mouse_path_length=self.mouse_path_length,
+            mouse_duration_ms=self.mouse_duration_ms,
+            velocity=self.velocity.snapshot(),
+            velocity_median=self.velocity_median.value,
+            stationary_count=self.stationary_count,
+        )
+
+
+@dataclass(frozen=True)
+class SessionAggregateSnapshot:
+    """apply が返す集計値の複製。ロックの外で読んでも後続の差分の影響を受けない。"""
+
+    snapshot_seq: int
+    event_count: int
+    action_counts: Mapping[str, int]
+    bucket_counts: Mapping[str, int]
+    timed_count: int
+    timestamp_min: Optional[int]
+    timestamp_max: Optional[int]
+    intervals: StatsSnapshot
+    visibility_toggles: int
+    mouse_count: int
+    mouse_path_length: float
+    mouse_duration_ms: float
+    velocity: StatsSnapshot
+    velocity_median: float
+    stationary_count: int
+
+
+@dataclass(frozen=True)
+class SessionStateStatus:
+    """レスポンスで返すセッション状態（次に差分を送れるか）。"""
+
+    snapshot_seq: int
+    delta_ready: bool
+
+
+class SessionStateStore:
+    """session_id → SessionAggregate の LRU ストア（TTL・件数・バイト数上限付き）。"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = config.SESSION_STATE_TTL_SECONDS,
+        max_sessions: int = config.SESSION_STATE_MAX_SESSIONS,
+        max_bytes: int = config.SESSION_STATE_MAX_BYTES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[SessionAggregate, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def apply(
+        self,
+        session_id: str,
+        snapshot_seq: int,
+        *,
+        delta: bool,
+        mouse_movements: Iterable[MouseMovement],
+        sequence: Iterable[BehaviorEvent],
+    ) -> Tuple[Optional[SessionAggregateSnapshot], SessionStateStatus]:
+        """スナップショットを取り込む。
+
+        全量（delta=False）なら集計値を作り直して (None, status) を返す（特徴量は従来どおり全量から計算する）。
+        差分なら前回の集計値に追加して (snapshot, status) を返す。同じ snapshot_seq の再送は
+        追加せずに現在の集計値を返す。集計値はロック内で複製して返すため、同じセッションの
+        差分が並行して届いても呼び出し側の値は変わらない。適用できない差分は SessionResyncRequired。
+        """
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+
+            if not delta:
+                aggregate = SessionAggregate(snapshot_seq)
+                aggregate.update(mouse_movements, sequence)
+                ready = self._store(session_id, aggregate, now)
+                SESSION_STATE_EVENTS.labels("full").inc()
+                return None, SessionStateStatus(snapshot_seq, ready)
+
+            entry = self._entries.get(session_id)
+            if entry is None:
+                SESSION_STATE_EVENTS.labels("resync").inc()
+                raise SessionResyncRequired("セッション状態がありません。全量スナップショットを送信してください")
+            aggregate, _, size = entry
+            if snapshot_seq == aggregate.snapshot_seq:
+                # 末尾へ移すなら更新時刻も進める（_expire は更新時刻順を前提にしている）
+                self._entries.move_to_end(session_id)
+                self._entries[session_id] = (aggregate, now, size)
+                SESSION_STATE_EVENTS.labels("replay").inc()
+                return aggregate.snapshot(), SessionStateStatus(snapshot_seq, True)
+            if snapshot_seq != aggregate.snapshot_seq + 1:
+                SESSION_STATE_EVENTS.labels("resync").inc()
+                raise SessionResyncRequired(
+                    f"snapshot_seq が連続していません (expected={aggregate.snapshot_seq + 1}, got={snapshot_seq})",
+                    expected_seq=aggregate.snapshot_seq + 1,
+                )
+
+            aggregate.update(mouse_movements, sequence)
+            aggregate.snapshot_seq = snapshot_seq
+            ready = self._store(session_id, aggregate, now)
+            SESSION_STATE_EVENTS.labels("delta").inc()
+            return aggregate.snapshot(), SessionStateStatus(snapshot_seq, ready)
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            self._remove(session_id)
+            self._publish()
+
+    def _store(self, session_id: str, aggregate: SessionAggregate, now: float) -> bool:
+        """集計値を保存する。上限超過でそのまま追い出された場合は False。"""
+        self._remove(session_id)
+        size = aggregate.approx_bytes()
+        self._entries[session_id] = (aggregate, now, size)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_sessions or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            SESSION_STATE_EVENTS.labels("evicted").inc()
+        self._publish()
+        return session_id in self._entries
+
+    def _expire(self, now: float) -> None:
+        # 最終更新順に並んでいるので、先頭から期限切れを取り除けばよい
+        removed = False
+        while self._entries:
+            session_id, (_, updated_at, _) = next(iter(self._entries.items()))
+            if now - updated_at < self.ttl_seconds:
+                break
+            self._remove(session_id)
+            SESSION_STATE_EVENTS.labels("expired").inc()
+            removed = True
+        if removed:
+            self._publish()
+
+    def _remove(self, session_id: str) -> None:
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _publish(self) -> None:
+        SESSION_STATE_SESSIONS.labels().set(len(self._entries))
+        SESSION_STATE_BYTES.labels().set(self._bytes)
@@ -0,0 +1,108 @@
+"""セッション単位の判定結果キャッシュ。
+
+アイドル状態のタブが送る定期スナップショットのように、同じ session_id で内容がほぼ変わらない
+リクエストが続く場合に、前回の UnifiedDetectionResponse をそのまま返してモデル推論を省略する。
+
+キーは ``(session_id, payload_digest(request))``。ダイジェストは配列の件数と末尾イベント、
+集計値、デバイス情報、ペルソナ、context.action_type から計算し、経過時間だけで増える
+``session_duration_ms`` / ``page_dwell_time_ms`` は含めない（新しいイベントが無ければ TTL の間は
+同じ判定を返す）。差分スナップショットは ``snapshot_seq`` もキーに含めるため、同じ連番の再送だけが当たる。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import config
+from schemas.detection import UnifiedDetectionRequest, UnifiedDetectionResponse
+from utils.metrics import REGISTRY
+
+VERDICT_CACHE_REQUESTS = REGISTRY.counter(
+    "ai_detector_verdict_cache_requests_total",
+    "Verdict cache lookups by result.",
+    ("result",),
+)
+VERDICT_CACHE_ENTRIES = REGISTRY.gauge(
+    "ai_detector_verdict_cache_entries",
+    "Number of cached verdicts.",
+)
+
+
+def payload_digest(request: UnifiedDetectionRequest) -> str:
+    """判定に影響する内容の簡易ダイジェスト（配列全体は走査しない）。"""
+    behavioral_data = request.behavioral_data
+    movements = behavioral_data.mouse_movements
+    sequence = request.behavior_sequence
+    last_movement = movements[-1] if movements else None
+    last_event = sequence[-1] if sequence else None
+    page = behavioral_data.page_interaction
+    context = request.context if isinstance(request.context, dict) else {}
+
+    parts = (
+        len(movements),
+        (last_movement.timestamp, last_movement.x, last_movement.y, last_movement.velocity) if last_movement else None,
+        len(sequence),
+        (last_event.timestamp, last_event.action) if last_event else None,
+        tuple(behavioral_data.click_patterns.model_dump().values()),
+        tuple(behavioral_data.keystroke_dynamics.model_dump().values()),
+        tuple(behavioral_data.scroll_behavior.model_dump().values()),
+        (page.first_interaction_delay_ms, page.form_fill_speed_cpm, page.paste_ratio),
+        request.device_fingerprint.model_dump_json(),
+        request.persona_features.model_dump_json() if request.persona_features else None,
+        context.get("action_type"),
+        request.snapshot_seq,
+        request.delta,
+    )
+    return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class VerdictCache:
+    """(session_id, digest) → UnifiedDetectionResponse の LRU キャッシュ（TTL・件数上限付き）。"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = config.VERDICT_CACHE_TTL_SECONDS,
+        max_entries: int = config.VERDICT_CACHE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[UnifiedDetectionResponse, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, session_id: str, digest: str) -> Optional[UnifiedDetectionResponse]:
+        key = (session_id, digest)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._clock() - entry[1] >= self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+                VERDICT_CACHE_ENTRIES.labels().set(len(self._entries))
+            if entry is None:
+                VERDICT_CACHE_REQUESTS.labels("miss").inc()
+                return None
+            self._entries.move_to_end(key)
+        VERDICT_CACHE_REQUESTS.labels("hit").inc()
+        return entry[0]
+
+    def put(self, session_id: str, digest: str, response: UnifiedDetectionResponse) -> None:
+        key = (session_id, digest)
+        with self._lock:
+            self._entries[key] = (response, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            VERDICT_CACHE_ENTRIES.labels().set(len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            VERDICT_CACHE_ENTRIES.labels().set(0)
@@ -0,0 +1,59 @@
+"""固定サイズのブルームフィルタ（集合への所属を偽陽性ありで判定する）。"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+
+
+class BloomFilter:
+    """容量と目標偽陽性率からビット数・ハッシュ数を決めるブルームフィルタ。
+
+    ``capacity`` 件を超えて追加すると偽陽性率が上がるため、呼び出し側で ``len()`` を見て
+    ``clear()`` する（一定件数ごとに世代を切り替える）想定。
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        if capacity <= 0 or not 0.0 < error_rate < 1.0:
+            raise ValueError("capacity は正、error_rate は (0, 1) で指定してください")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    def _positions(self, key: str):
+        # 2 つの 64bit ハッシュから k 個の位置を作る（double hashing）
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> bool:
+        """追加する。既に含まれていた（と判定された）場合は True。"""
+        present = True
+        for position in self._positions(key):
+            byte, bit = divmod(position, 8)
+            mask = 1 << bit
+            if not self._bits[byte] & mask:
+                present = False
+                self._bits[byte] |= mask
+        if not present:
+            self._count += 1
+        return present
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position // 8] & (1 << (position % 8)) for position in self._positions(key))
+
+    def clear(self) -> None:
+        self._bits = bytearray(len(self._bits))
+        self._count = 0
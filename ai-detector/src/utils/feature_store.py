@@ -0,0 +1,163 @@
+"""推論時に算出した特徴量ベクトルを列指向バイナリで保存・読み込むユーティリティ。
+
+1 日 1 ディレクトリ (``features_v<schema>_<YYYYMMDD>``) に以下のファイルを追記する。
+
+- ``features.f32``: float32 の行優先行列 (行数 x 特徴量数)
+- ``labels.i1``: int8 のラベル列 (human=1, bot=0, unspecified=-1)
+- ``session_ids.txt``: 1 行 1 セッションID
+- ``schema.json``: 特徴量スキーマのバージョンと特徴量名
+
+学習時は ``np.memmap`` で ``features.f32`` をそのまま読み込めるため、JSONL を再パースする必要がない。
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FEATURES_FILENAME = "features.f32"
+LABELS_FILENAME = "labels.i1"
+SESSION_IDS_FILENAME = "session_ids.txt"
+SCHEMA_FILENAME = "schema.json"
+
+FEATURE_DTYPE = np.float32
+LABEL_DTYPE = np.int8
+
+LABEL_CODES = {"human": 1, "bot": 0, "unspecified": -1}
+
+# (書き込み先ディレクトリ, schema.json の mtime) → (feature_schema_version, feature_names)。
+# 書き込み先は日付でしか変わらないため直近の 1 件だけを保持する。ディレクトリの削除・差し替えで
+# schema.json が無くなる・更新されると mtime が変わるので、その時は読み直す（作り直す）。
+_schema_cache: Dict[Tuple[Path, int], Tuple[int, Tuple[str, ...]]] = {}
+
+
+@dataclass
+class FeatureBlock:
+    """1 ディレクトリ分の特徴量ブロック。"""
+
+    path: Path
+    features: np.ndarray
+    labels: np.ndarray
+    session_ids: List[str]
+    feature_names: List[str]
+    schema_version: int
+
+
+def block_dir(base_dir: Path, schema_version: int, date_str: str) -> Path:
+    """スキーマバージョンと日付からブロックディレクトリを返す。"""
+    return base_dir / f"features_v{schema_version}_{date_str}"
+
+
+def _schema_mtime(directory: Path) -> int:
+    """schema.json の mtime（ns）。無ければ -1。"""
+    try:
+        return (directory / SCHEMA_FILENAME).stat().st_mtime_ns
+    except FileNotFoundError:
+        return -1
+
+
+def _load_or_create_schema(
+    directory: Path, names: List[str], schema_version: int
+) -> Tuple[int, Tuple[str, ...]]:
+    """既存の schema.json を読む。無ければ作成する。"""
+    directory.mkdir(parents=True, exist_ok=True)
+    schema_path = directory / SCHEMA_FILENAME
+    if schema_path.exists():
+        schema = json.loads(schema_path.read_text(encoding="utf-8"))
+        return schema.get("feature_schema_version"), tuple(schema.get("feature_names") or ())
+    schema = {
+        "feature_schema_version": schema_version,
+        "feature_names": names,
+        "dtype": np.dtype(FEATURE_DTYPE).name,
+        "label_dtype": np.dtype(LABEL_DTYPE).name,
+        "label_mapping": LABEL_CODES,
+    }
+    schema_path.write_text(json.dumps(schema, indent=2, ensure_ascii=False), encoding="utf-8")
+    return schema_version, tuple(names)
+
+
+def append_feature_row(
+    directory: Path,
+    *,
+    vector: Sequence[float],
+    label: str,
+    session_id: str | None,
+    feature_names: Sequence[str],
+    schema_version: int,
+) -> bool:
+    """特徴量ベクトル 1 行を追記する。スキーマ不一致時は書き込まず False を返す。
+
+    schema.json の検証結果はディレクトリと schema.json の mtime ごとにキャッシュし、
+    書き込み先が変わった・schema.json が消えた（更新された）時だけ読み直す。
+    呼び出し側で排他制御を行うこと。
+    """
+    names = list(feature_names)
+    if len(vector) != len(names):
+        raise ValueError(f"特徴量数が一致しません: vector={len(vector)} names={len(names)}")
+
+    schema = _schema_cache.get((directory, _schema_mtime(directory)))
+    if schema is None:
+        schema = _load_or_create_schema(directory, names, schema_version)
+        _schema_cache.clear()
+        _schema_cache[(directory, _schema_mtime(directory))] = schema
+    if schema != (schema_version, tuple(names)):
+        logger.warning("特徴量スキーマが既存ブロックと一致しないため保存をスキップします: %s", directory)
+        return False
+
+    row = np.asarray(vector, dtype=FEATURE_DTYPE)
+    label_code = np.array([LABEL_CODES.get(label, LABEL_CODES["unspecified"])], dtype=LABEL_DTYPE)
+    session = (session_id or "").replace("\n", " ")
+
+    with (directory / FEATURES_FILENAME).open("ab") as fh:
+        fh.write(row.tobytes())
+    with (directory / LABELS_FILENAME).open("ab") as fh:
+        fh.write(label_code.tobytes())
+    with (directory / SESSION_IDS_FILENAME).open("a", encoding="utf-8") as fh:
+        fh.write(session + "\n")
+    return True
+
+
+def load_feature_block(directory: Path) -> FeatureBlock:
+    """ブロックディレクトリを memmap で読み込む。"""
+    schema = json.loads((directory / SCHEMA_FILENAME).read_text(encoding="utf-8"))
+    feature_names = list(schema["feature_names"])
+    n_features = len(feature_names)
+
+    features_path = directory / FEATURES_FILENAME
+    labels_path = directory / LABELS_FILENAME
+    feature_rows = features_path.stat().st_size // (np.dtype(FEATURE_DTYPE).itemsize * n_features)
+    label_rows = labels_path.stat().st_size // np.dtype(LABEL_DTYPE).itemsize
+    with (directory / SESSION_IDS_FILENAME).open("r", encoding="utf-8") as fh:
+        session_ids = fh.read().splitlines()
+
+    # 書き込み途中で停止した場合に備え、全列で揃っている行数だけを使う
+    n_rows = min(feature_rows, label_rows, len(session_ids))
+    if n_rows == 0:
+        features = np.empty((0, n_features), dtype=FEATURE_DTYPE)
+    else:
+        features = np.memmap(features_path, dtype=FEATURE_DTYPE, mode="r", shape=(n_rows, n_features))
+    labels = np.fromfile(labels_path, dtype=LABEL_DTYPE, count=n_rows)
+
+    return FeatureBlock(
+        path=directory,
+        features=features,
+        labels=labels,
+        session_ids=session_ids[:n_rows],
+        feature_names=feature_names,
+        schema_version=int(schema["feature_schema_version"]),
+    )
+
+
+def find_feature_blocks(root: Path, schema_version: int) -> List[Path]:
+    """root 以下から指定スキーマバージョンのブロックディレクトリを列挙する。"""
+    pattern = f"features_v{schema_version}_*"
+    return sorted(
+        path for path in root.rglob(pattern) if path.is_dir() and (path / SCHEMA_FILENAME).exists()
+    )
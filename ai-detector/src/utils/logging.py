@@ -1,13 +1,163 @@
-"""アプリケーション共通のロギング設定。"""
+"""アプリケーション共通のロギング設定。
 
+リクエスト処理スレッドではレコードをキューに積むだけにし、stdout への書き込みは
+バックグラウンドスレッド（QueueListener）で行う。キューが溢れた場合はブロックせずに破棄する。
+
+ロガー名の前方一致でサンプリング率を指定できる（``AI_DETECTOR_LOG_SAMPLE_RATES``、
+例: ``api.request=0.1,services=0``）。WARNING 以上は常に出力する。
+"""
+
+from __future__ import annotations
+
+import atexit
 import logging
+import queue
+import random
 import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Mapping, Optional
+
+import config
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s - %(message)s"
+DEFAULT_QUEUE_SIZE = 10_000
+
+_listener: Optional[QueueListener] = None
+_installed_handler: Optional[logging.Handler] = None
+_setup_lock = threading.Lock()
+
+
+class SamplingFilter(logging.Filter):
+    """ロガー名の前方一致で決まる確率でレコードを通す。"""
+
+    def __init__(self, rates: Mapping[str, float], always_level: int = logging.WARNING):
+        super().__init__()
+        # 長い（より具体的な）プレフィックスを優先する
+        self._rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self._always_level = always_level
+        self._cache: Dict[str, float] = {}
+
+    def rate_for(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            for prefix, value in self._rates:
+                if name == prefix or name.startswith(prefix + "."):
+                    rate = value
+                    break
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= self._always_level:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """キューが満杯のときはブロックせず破棄件数を数える QueueHandler。"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Fields:
+    """``key=value`` 形式への変換を、出力が確定するまで遅延させる。"""
+
+    __slots__ = ("fields",)
+
+    def __init__(self, fields: Mapping[str, Any]):
+        self.fields = fields
+
+    def __str__(self) -> str:
+        return " ".join(f"{key}={_format_value(value)}" for key, value in self.fields.items())
+
+
+def _format_value(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    text = str(value)
+    if not text or any(ch.isspace() or ch in '="' for ch in text):
+        return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return text
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO, **fields: Any) -> None:
+    """1 行の構造化ログ（``event key=value ...``）を出力する。
+
+    サンプリングで破棄されたレコードは文字列化されない。
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, "%s %s", event, _Fields(fields))
+
+
+def setup_logging(
+    level: int | str | None = None,
+    *,
+    use_queue: Optional[bool] = None,
+    sample_rates: Optional[Mapping[str, float]] = None,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+) -> None:
+    """ルートロガーにハンドラを設定する（複数回呼ばれても 1 回分だけ設定する）。"""
+    global _listener, _installed_handler
+
+    level = config.LOG_LEVEL if level is None else level
+    use_queue = config.LOG_ASYNC if use_queue is None else use_queue
+    sample_rates = config.LOG_SAMPLE_RATES if sample_rates is None else sample_rates
+
+    with _setup_lock:
+        root = logging.getLogger()
+        root.setLevel(level)
+        if _installed_handler is not None and _installed_handler in root.handlers:
+            return
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handler: logging.Handler = stream_handler
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        if use_queue:
+            log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+            handler = DroppingQueueHandler(log_queue)
+            _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+            _listener.start()
+        # サンプリングはキューに積む前（呼び出し元スレッド）で判定し、不要な整形を避ける
+        handler.addFilter(SamplingFilter(sample_rates))
+        root.addHandler(handler)
+        _installed_handler = handler
+
+
+def shutdown_logging() -> None:
+    """キューに残ったレコードを書き出してバックグラウンドスレッドを止める。"""
+    global _listener, _installed_handler
+
+    with _setup_lock:
+        if _installed_handler is not None:
+            logging.getLogger().removeHandler(_installed_handler)
+        if _listener is not None:
+            _listener.stop()
+        _listener = None
+        _installed_handler = None
+
+
+def dropped_records() -> int:
+    """キュー満杯で破棄したログレコード数。"""
+    handler = _installed_handler
+    return handler.dropped if isinstance(handler, DroppingQueueHandler) else 0
 
 
-def setup_logging(level: int = logging.INFO) -> None:
-    """標準的なロギング設定を適用する。"""
-    logging.basicConfig(
-        level=level,
-        format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
-        handlers=[logging.StreamHandler(sys.stdout)],
-    )
+atexit.register(shutdown_logging)
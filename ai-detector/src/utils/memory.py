@@ -0,0 +1,256 @@
+"""メモリ使用量の可視化（モデルのフットプリントと tracemalloc スナップショット）。
+
+- モデル読み込み時に :func:`record_model_footprint` で推定サイズをログと
+  ``ai_detector_model_memory_bytes`` ゲージに記録する
+- 管理エンドポイントから tracemalloc を開始し、スナップショットの取得と差分比較を行う
+  （長時間稼働ワーカーの RSS 増加の調査用。計測中は割り当てごとにオーバーヘッドがかかる）
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils.metrics import MODEL_MEMORY_BYTES
+
+logger = logging.getLogger(__name__)
+
+MAX_SNAPSHOTS = 8
+
+_SCALARS = (str, bytes, bytearray, int, float, complex, bool, type(None))
+_SHARED = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)
+
+
+def deep_sizeof(obj: Any) -> int:
+    """オブジェクトグラフ全体の推定バイト数。
+
+    numpy 配列はバッファを含めて数え、``__dict__`` を持たない拡張型（sklearn の Tree など）は
+    ``__getstate__`` の中身で代用する。LightGBM Booster のようにネイティブ側にモデルを持つ
+    オブジェクトは ``model_to_string()`` の長さを近似値として加える。
+    """
+    seen: set[int] = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SHARED):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+
+        if isinstance(current, _SCALARS):
+            continue
+        if isinstance(current, np.ndarray):
+            if current.base is not None:
+                stack.append(current.base)
+            if current.dtype == object:
+                stack.extend(current.ravel().tolist())
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+            continue
+        if isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+            continue
+
+        model_to_string = getattr(current, "model_to_string", None)
+        if callable(model_to_string):
+            try:
+                total += len(model_to_string())
+            except Exception:  # pragma: no cover - 未学習 Booster など
+                pass
+
+        if hasattr(current, "__dict__"):
+            stack.append(vars(current))
+        else:
+            try:
+                state = current.__getstate__()
+            except Exception:
+                state = None
+            if state is not None and state is not current:
+                stack.append(state)
+        for klass in type(current).__mro__:
+            for slot in getattr(klass, "__slots__", ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total
+
+
+def process_rss_bytes() -> Optional[int]:
+    """このプロセスの RSS（/proc が無い環境では None）。"""
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+_MODEL_FOOTPRINTS: Dict[str, int] = {}
+
+
+def record_model_footprint(name: str, model: Any) -> int:
+    """モデルの推定サイズを記録してログに出す。"""
+    size = deep_sizeof(model)
+    _MODEL_FOOTPRINTS[name] = size
+    MODEL_MEMORY_BYTES.labels(name).set(size)
+    logger.info("モデルのメモリ使用量(推定): %s = %d bytes (%.2f MiB)", name, size, size / (1024 * 1024))
+    return size
+
+
+def model_footprints() -> Dict[str, int]:
+    return dict(_MODEL_FOOTPRINTS)
+
+
+@dataclass
+class MemorySnapshot:
+    """保存済みの tracemalloc スナップショット。"""
+
+    snapshot_id: int
+    taken_at: float
+    traced_bytes: int
+    snapshot: tracemalloc.Snapshot
+
+
+def _filtered(snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+    return snapshot.filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+    )
+
+
+def _location(traceback: tracemalloc.Traceback, group_by: str) -> str:
+    if group_by == "traceback":
+        return " <- ".join(f"{frame.filename}:{frame.lineno}" for frame in traceback)
+    frame = traceback[0]
+    return frame.filename if group_by == "filename" else f"{frame.filename}:{frame.lineno}"
+
+
+class MemoryTracker:
+    """tracemalloc の開始・停止とスナップショットの保持（直近 MAX_SNAPSHOTS 件）。"""
+
+    def __init__(self, max_snapshots: int = MAX_SNAPSHOTS):
+        self.max_snapshots = max_snapshots
+        self._snapshots: "OrderedDict[int, MemorySnapshot]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            logger.info("tracemalloc を開始しました (frames=%s)", frames)
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        """計測を止める。保存済みスナップショットも破棄する（トレース情報は停止時に失われるため）。"""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc を停止しました")
+        with self._lock:
+            self._snapshots.clear()
+        return self.status()
+
+    def take_snapshot(self, group_by: str = "lineno", limit: int = 20) -> Dict[str, Any]:
+        """スナップショットを保存し、上位の確保箇所を返す。計測していなければ RuntimeError。"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc が開始されていません")
+        snapshot = _filtered(tracemalloc.take_snapshot())
+        traced = tracemalloc.get_traced_memory()[0]
+        with self._lock:
+            entry = MemorySnapshot(self._next_id, time.time(), traced, snapshot)
+            self._snapshots[entry.snapshot_id] = entry
+            self._next_id += 1
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        stats = snapshot.statistics(group_by)[:limit]
+        return {
+            **self._describe(entry),
+            "top": [
+                {"location": _location(stat.traceback, group_by), "size": stat.size, "count": stat.count}
+                for stat in stats
+            ],
+        }
+
+    def diff(
+        self,
+        base_id: int,
+        target_id: Optional[int] = None,
+        group_by: str = "lineno",
+        limit: int = 20,
+    ) -> Dict[str, Any]:
+        """base と target（省略時は現時点）の差分。増加量の大きい順に返す。
+
+        存在しない ID は KeyError、計測していなければ RuntimeError。
+        """
+        with self._lock:
+            base = self._snapshots[base_id]
+            target = self._snapshots[target_id] if target_id is not None else None
+        if target is None:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc が開始されていません")
+            target_snapshot = _filtered(tracemalloc.take_snapshot())
+            target_traced = tracemalloc.get_traced_memory()[0]
+        else:
+            target_snapshot = target.snapshot
+            target_traced = target.traced_bytes
+
+        stats = target_snapshot.compare_to(base.snapshot, group_by)[:limit]
+        return {
+            "base": base_id,
+            "target": target_id,
+            "traced_bytes_diff": target_traced - base.traced_bytes,
+            "top": [
+                {
+                    "location": _location(stat.traceback, group_by),
+                    "size": stat.size,
+                    "size_diff": stat.size_diff,
+                    "count": stat.count,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats
+            ],
+        }
+
+    @staticmethod
+    def _describe(entry: MemorySnapshot) -> Dict[str, Any]:
+        return {"id": entry.snapshot_id, "taken_at": entry.taken_at, "traced_bytes": entry.traced_bytes}
+
+    def status(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        with self._lock:
+            snapshots: List[Dict[str, Any]] = [self._describe(entry) for entry in self._snapshots.values()]
+        return {
+            "rss_bytes": process_rss_bytes(),
+            "tracemalloc": {
+                "tracing": tracing,
+                "frames": tracemalloc.get_traceback_limit() if tracing else None,
+                "traced_bytes": current,
+                "peak_bytes": peak,
+                "overhead_bytes": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+            },
+            "models": model_footprints(),
+            "snapshots": snapshots,
+        }
+
+
+MEMORY_TRACKER = MemoryTracker()
@@ -0,0 +1,295 @@
+"""稼働中ワーカーのオンデマンドプロファイリング。
+
+管理エンドポイントからセッションを開始すると、以降 N リクエスト、または T 秒間のリクエスト処理を
+このワーカー上で計測する。
+
+- ``cprofile``: cProfile による関数単位の集計（pstats 互換）
+- ``sample``: バックグラウンドスレッドでリクエスト処理中のスタックを一定間隔でサンプリングし、
+  flamegraph.pl / speedscope で読める collapsed-stack 形式を出力する
+
+同時に計測するリクエストは 1 件のみ（処理中に届いた他のリクエストは計測対象外）。
+リクエスト処理の一部をスレッドプールで実行する場合は ``offload`` を使うと、その間は計測対象を
+ワーカースレッドに切り替える。
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+PROFILE_MODES = ("cprofile", "sample")
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+_SRC_DIR = Path(__file__).resolve().parents[1]
+
+T = TypeVar("T")
+
+
+@dataclass
+class ProfileSession:
+    """1 回分のプロファイリングセッション。"""
+
+    mode: str
+    max_requests: Optional[int]
+    deadline: Optional[float]
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    requests_profiled: int = 0
+    requests_skipped: int = 0
+    samples: int = 0
+    profile: Optional[cProfile.Profile] = None
+    stacks: Counter = field(default_factory=Counter)
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+
+def _module_group(filename: str) -> str:
+    """ファイルパスからパッケージ名（pydantic / lightgbm / services など）を推定する。"""
+    path = filename.replace("\\", "/")
+    marker = "site-packages/"
+    if marker in path:
+        return path.split(marker, 1)[1].split("/", 1)[0].removesuffix(".py")
+    src = str(_SRC_DIR).replace("\\", "/") + "/"
+    if path.startswith(src):
+        return path[len(src):].split("/", 1)[0].removesuffix(".py")
+    if path.startswith("<") or path == "~":
+        return "builtins"
+    return "stdlib"
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({_module_group(code.co_filename)}/{Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+# 計測中のリクエストのコンテキストでだけセットされる（スレッドプールにも引き継がれる）
+_request_session: ContextVar[Optional[ProfileSession]] = ContextVar("profile_session", default=None)
+
+
+class RequestProfiler:
+    """ワーカー単位のプロファイラ。"""
+
+    def __init__(self, sample_interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.sample_interval = sample_interval
+        self._session: Optional[ProfileSession] = None
+        self._lock = threading.Lock()
+        self._current_thread: Optional[int] = None
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def active(self) -> bool:
+        session = self._session
+        return session is not None and not session.finished
+
+    def start(self, mode: str, requests: Optional[int] = None, seconds: Optional[float] = None) -> Dict[str, Any]:
+        """セッションを開始する。既に計測中なら RuntimeError。"""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"未対応のモードです: {mode}")
+        if not requests and not seconds:
+            raise ValueError("requests か seconds のいずれかを指定してください")
+        with self._lock:
+            if self.active:
+                raise RuntimeError("プロファイリングは既に実行中です")
+            self._session = ProfileSession(
+                mode=mode,
+                max_requests=requests or None,
+                deadline=time.monotonic() + seconds if seconds else None,
+                profile=cProfile.Profile() if mode == "cprofile" else None,
+            )
+        if mode == "sample":
+            self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+            self._sampler.start()
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        """セッションを終了する（結果は次回開始まで保持）。"""
+        with self._lock:
+            self._finish_locked()
+        return self.status()
+
+    def _finish_locked(self) -> None:
+        session = self._session
+        if session is not None and not session.finished:
+            session.finished_at = time.time()
+
+    def _expired(self, session: ProfileSession) -> bool:
+        if session.deadline is not None and time.monotonic() >= session.deadline:
+            return True
+        return session.max_requests is not None and session.requests_profiled >= session.max_requests
+
+    def begin_request(self) -> Optional[ProfileSession]:
+        """計測対象ならセッションを返し、計測を開始する。"""
+        with self._lock:
+            session = self._session
+            if session is None or session.finished:
+                return None
+            if self._expired(session):
+                self._finish_locked()
+                return None
+            if self._current_thread is not None:
+                session.requests_skipped += 1
+                return None
+            self._current_thread = threading.get_ident()
+        _request_session.set(session)
+        if session.profile is not None:
+            session.profile.enable()
+        return session
+
+    def end_request(self, session: ProfileSession) -> None:
+        """begin_request で開始した計測を終了する。"""
+        if session.profile is not None:
+            session.profile.disable()
+        _request_session.set(None)
+        with self._lock:
+            self._current_thread = None
+            session.requests_profiled += 1
+            if self._session is session and self._expired(session):
+                self._finish_locked()
+
+    async def offload(self, func: Callable[..., T], *args: Any) -> T:
+        """func をスレッドプールで実行する。計測中のリクエストなら、その間の計測対象をワーカースレッドに移す。"""
+        session = _request_session.get()
+        if session is None:
+            return await run_in_threadpool(func, *args)
+        # cProfile はスレッド単位で有効になるため、イベントループ側を止めてワーカー側で再開する
+        if session.profile is not None:
+            session.profile.disable()
+        try:
+            return await run_in_threadpool(self._run_profiled, session, func, *args)
+        finally:
+            if session.profile is not None:
+                session.profile.enable()
+
+    def _run_profiled(self, session: ProfileSession, func: Callable[..., T], *args: Any) -> T:
+        with self._lock:
+            owner = self._current_thread
+            self._current_thread = threading.get_ident()
+        if session.profile is not None:
+            session.profile.enable()
+        try:
+            return func(*args)
+        finally:
+            if session.profile is not None:
+                session.profile.disable()
+            with self._lock:
+                self._current_thread = owner
+
+    def _sample_loop(self) -> None:
+        session = self._session
+        while session is not None and not session.finished:
+            time.sleep(self.sample_interval)
+            thread_id = self._current_thread
+            if thread_id is not None:
+                frame = sys._current_frames().get(thread_id)
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    session.stacks[";".join(reversed(stack))] += 1
+                    session.samples += 1
+            if session.deadline is not None and time.monotonic() >= session.deadline:
+                with self._lock:
+                    if self._current_thread is None:
+                        self._finish_locked()
+
+    def status(self) -> Dict[str, Any]:
+        session = self._session
+        if session is None:
+            return {"active": False, "session": None}
+        return {
+            "active": self.active,
+            "session": {
+                "mode": session.mode,
+                "max_requests": session.max_requests,
+                "remaining_seconds": (
+                    max(session.deadline - time.monotonic(), 0.0) if session.deadline is not None else None
+                ),
+                "started_at": session.started_at,
+                "finished_at": session.finished_at,
+                "requests_profiled": session.requests_profiled,
+                "requests_skipped": session.requests_skipped,
+                "samples": session.samples,
+            },
+        }
+
+    def _stats(self) -> Optional[pstats.Stats]:
+        session = self._session
+        if session is None or session.profile is None or session.requests_profiled == 0:
+            return None
+        if self._current_thread is not None:
+            # 計測中のリクエストがある間は集計しない（create_stats がプロファイラを止めるため）
+            return None
+        return pstats.Stats(session.profile)
+
+    def report(self, sort: str = "cumulative", limit: int = 50) -> Dict[str, Any]:
+        """関数別の上位統計とパッケージ別の自己時間を返す。"""
+        result = self.status()
+        stats = self._stats()
+        if stats is None:
+            result["by_package"] = self._package_samples()
+            return result
+
+        key = {"cumulative": 3, "tottime": 2, "ncalls": 1}.get(sort, 3)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][key], reverse=True)[:limit]
+        result["functions"] = [
+            {
+                "function": f"{func} ({Path(filename).name}:{line})",
+                "package": _module_group(filename),
+                "ncalls": ncalls,
+                "tottime": round(tottime, 6),
+                "cumtime": round(cumtime, 6),
+            }
+            for (filename, line, func), (_, ncalls, tottime, cumtime, _) in rows
+        ]
+        by_package: Dict[str, float] = {}
+        for (filename, _, _), (_, _, tottime, _, _) in stats.stats.items():
+            group = _module_group(filename)
+            by_package[group] = by_package.get(group, 0.0) + tottime
+        result["by_package"] = {
+            name: round(value, 6) for name, value in sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)
+        }
+        return result
+
+    def _package_samples(self) -> Dict[str, int]:
+        """sample モードのパッケージ別サンプル数（スタック末端のフレームで集計）。"""
+        session = self._session
+        if session is None:
+            return {}
+        counts: Counter = Counter()
+        for stack, count in session.stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            counts[leaf.rsplit("(", 1)[-1].split("/", 1)[0]] += count
+        return dict(counts.most_common())
+
+    def pstats_text(self, sort: str = "cumulative", limit: int = 50) -> str:
+        """pstats.print_stats と同じテキスト。"""
+        stats = self._stats()
+        if stats is None:
+            return ""
+        buffer = io.StringIO()
+        stats.stream = buffer
+        stats.sort_stats(sort).print_stats(limit)
+        return buffer.getvalue()
+
+    def collapsed(self) -> str:
+        """collapsed-stack 形式（``frame1;frame2;frame3 count``）。"""
+        session = self._session
+        if session is None:
+            return ""
+        return "".join(f"{stack} {count}\n" for stack, count in session.stacks.most_common())
+
+
+PROFILER = RequestProfiler()
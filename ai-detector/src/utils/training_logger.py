@@ -2,22 +2,149 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
+import logging
+import random
 import threading
 import time
-from dataclasses import asdict, is_dataclass
+from dataclasses import asdict, dataclass, field, is_dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Mapping
+from typing import Any, Dict, Mapping, Sequence, Tuple
 
 import config
+from utils import feature_store
+
+logger = logging.getLogger(__name__)
 
 _lock = threading.Lock()
 
+# セッションIDのハッシュを [0, 1) に写像する際の分母
+_HASH_SPACE = float(1 << 64)
+
+
+@dataclass(frozen=True)
+class SamplingPolicy:
+    """学習ログの保存可否を決めるポリシー。
+
+    bot 判定・境界スコアは常に保存し、それ以外は final_decision.reason ごとの保存率で間引く。
+    間引きはセッションIDのハッシュで決めるため、保存対象になったセッションは全スナップショットが残る。
+    """
+
+    default_rate: float = 1.0
+    reason_rates: Mapping[str, float] = field(default_factory=dict)
+    keep_bot: bool = True
+    borderline_margin: float = 0.0
+    pivot: float = 0.5
+
+    @classmethod
+    def from_config(cls) -> "SamplingPolicy":
+        return cls(
+            default_rate=config.TRAINING_LOG_DEFAULT_SAMPLE_RATE,
+            reason_rates=dict(config.TRAINING_LOG_SAMPLE_RATES),
+            keep_bot=config.TRAINING_LOG_KEEP_BOT,
+            borderline_margin=config.TRAINING_LOG_BORDERLINE_MARGIN,
+        )
+
+    def decide(self, *, session_id: str | None, reason: str, is_bot: bool, score: float | None) -> Tuple[bool, str]:
+        """(保存するか, 判定ルール名) を返す。"""
+        if self.keep_bot and is_bot:
+            return True, "always_bot"
+        if self.borderline_margin > 0 and score is not None and abs(score - self.pivot) <= self.borderline_margin:
+            return True, "always_borderline"
+
+        rate = self.reason_rates.get(reason, self.default_rate)
+        if rate >= 1.0:
+            return True, "rate"
+        if rate <= 0.0:
+            return False, "rate"
+        return _session_bucket(session_id) < rate, "rate"
+
+
+class SamplingStats:
+    """保存・破棄件数のスレッドセーフなカウンタ。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._kept = 0
+        self._dropped = 0
+        self._by_reason: Dict[str, Dict[str, int]] = {}
+        self._by_rule: Dict[str, int] = {}
+
+    def record(self, reason: str, kept: bool, rule: str) -> None:
+        with self._lock:
+            bucket = self._by_reason.setdefault(reason, {"kept": 0, "dropped": 0})
+            if kept:
+                self._kept += 1
+                bucket["kept"] += 1
+                self._by_rule[rule] = self._by_rule.get(rule, 0) + 1
+            else:
+                self._dropped += 1
+                bucket["dropped"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "kept": self._kept,
+                "dropped": self._dropped,
+                "by_reason": {reason: dict(counts) for reason, counts in self._by_reason.items()},
+                "kept_by_rule": dict(self._by_rule),
+            }
+
+
+_policy: SamplingPolicy | None = None
+_stats = SamplingStats()
+
+
+def _session_bucket(session_id: str | None) -> float:
+    """セッションIDを [0, 1) の値に一貫して写像する。IDが無い場合は乱数。"""
+    if not session_id:
+        return random.random()
+    digest = hashlib.blake2b(session_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / _HASH_SPACE
+
+
+def _field(obj: Any, name: str) -> Any:
+    if isinstance(obj, Mapping):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def get_sampling_policy() -> SamplingPolicy:
+    """現在のサンプリングポリシー（未設定なら config から生成）。"""
+    global _policy
+    if _policy is None:
+        _policy = SamplingPolicy.from_config()
+    return _policy
+
+
+def set_sampling_policy(policy: SamplingPolicy | None) -> None:
+    """サンプリングポリシーを差し替える。None で config の値に戻す。"""
+    global _policy
+    _policy = policy
+
+
+def get_sampling_stats() -> Dict[str, Any]:
+    """保存・破棄件数のスナップショットを返す。"""
+    stats = _stats.snapshot()
+    stats["enabled"] = config.TRAINING_LOG_ENABLED
+    return stats
+
+
+def reset_sampling_stats() -> None:
+    """カウンタを初期化する。"""
+    global _stats
+    _stats = SamplingStats()
+
+
+def _current_date_str() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%d")
+
 
 def _current_log_path() -> Path:
     """UTC日付ごとのファイルパスを返す。"""
-    date_str = datetime.now(timezone.utc).strftime("%Y%m%d")
+    date_str = _current_date_str()
     log_dir = config.TRAINING_LOG_DIR
     log_dir.mkdir(parents=True, exist_ok=True)
     return log_dir / f"behavioral_{date_str}.jsonl"
@@ -37,14 +164,63 @@ def _serialize(obj: Any) -> Any:
     return obj
 
 
-def log_detection_sample(*, request: Any, browser_result: Any, persona_result: Any, final_decision: Any) -> None:
-    """検知リクエストと結果をJSONラインで書き出す。"""
+def _write_feature_vector(
+    browser_result: Any, session_id: str | None, feature_names: Sequence[str], schema_version: int
+) -> None:
+    """推論に使った特徴量ベクトルを列指向ストアへ追記する。_lock 取得済みで呼ぶこと。"""
+    features = getattr(browser_result, "features_extracted", None)
+    if not features:
+        return
+    vector = [float(features.get(name, 0.0) or 0.0) for name in feature_names]
+    directory = feature_store.block_dir(config.TRAINING_LOG_DIR, schema_version, _current_date_str())
+    try:
+        feature_store.append_feature_row(
+            directory,
+            vector=vector,
+            label=config.TRAINING_LOG_LABEL,
+            session_id=session_id,
+            feature_names=feature_names,
+            schema_version=schema_version,
+        )
+    except Exception as exc:  # pragma: no cover - 学習ログ失敗で推論を止めない
+        logger.warning("特徴量ストアへの書き込みに失敗しました: %s", exc)
+
+
+def log_detection_sample(
+    *,
+    request: Any,
+    browser_result: Any,
+    persona_result: Any,
+    final_decision: Any,
+    feature_names: Sequence[str] | None = None,
+    schema_version: int | None = None,
+    source: str = "model",
+) -> None:
+    """検知リクエストと結果をJSONラインで書き出す。
+
+    保存可否は SamplingPolicy で判定する。feature_names と schema_version（特徴量抽出側の
+    FEATURE_SCHEMA_VERSION）が与えられた場合は、推論時の特徴量ベクトルを同じ列順で特徴量ストアにも保存する。
+    source は判定の出どころ（``model`` / 推論を省略した経路名）で、JSONL の ``source`` に残す。
+    """
     if not config.TRAINING_LOG_ENABLED:
         return
 
+    session_id = getattr(browser_result, "session_id", None) or getattr(request, "session_id", None)
+    reason = str(_field(final_decision, "reason") or "unknown")
+    keep, rule = get_sampling_policy().decide(
+        session_id=session_id,
+        reason=reason,
+        is_bot=bool(_field(final_decision, "is_bot")),
+        score=getattr(browser_result, "score", None),
+    )
+    _stats.record(reason, keep, rule)
+    if not keep:
+        return
+
     entry = {
         "timestamp": int(time.time() * 1000),
-        "session_id": getattr(browser_result, "session_id", None) or getattr(request, "session_id", None),
+        "session_id": session_id,
+        "source": source,
         "request": _serialize(request),
         "browser_result": _serialize(browser_result),
         "persona_result": _serialize(persona_result),
@@ -56,3 +232,5 @@ def log_detection_sample(*, request: Any, browser_result: Any, persona_result: A
     with _lock:
         with log_path.open("a", encoding="utf-8") as fh:
             fh.write(line + "\n")
+        if feature_names and schema_version is not None and config.TRAINING_FEATURE_STORE_ENABLED:
+            _write_feature_vector(browser_result, session_id, feature_names, schema_version)
@@ -0,0 +1,97 @@
+"""メモリ計測（モデルサイズ・tracemalloc スナップショット・ステージ別確保量）のテスト。"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+from api.app import app
+from utils.memory import MEMORY_TRACKER, deep_sizeof
+from utils.metrics import alloc_mark, begin_alloc_sample, end_alloc_sample
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+TOKEN = "test-admin-token"
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def admin_token(monkeypatch) -> dict[str, str]:
+    monkeypatch.setattr(config, "ADMIN_TOKEN", TOKEN)
+    yield {"X-Admin-Token": TOKEN}
+    MEMORY_TRACKER.stop()
+
+
+def test_deep_sizeof_counts_array_buffers() -> None:
+    model = {"weights": np.zeros(100_000), "meta": {"name": "x"}}
+    assert deep_sizeof(model) >= 800_000
+
+
+def test_model_footprints_are_exposed(client: TestClient) -> None:
+    body = client.get("/metrics").text
+    assert 'ai_detector_model_memory_bytes{model="lightgbm"}' in body
+    assert 'ai_detector_model_memory_bytes{model="kmeans"}' in body
+
+
+def test_snapshot_diff_and_stage_allocations(client: TestClient, admin_token, monkeypatch) -> None:
+    assert client.post("/admin/memory/snapshot", headers=admin_token).status_code == 409
+
+    started = client.post("/admin/memory/tracemalloc/start", headers=admin_token)
+    assert started.status_code == 200
+    assert started.json()["tracemalloc"]["tracing"] is True
+
+    snapshot = client.post("/admin/memory/snapshot", params={"limit": 5}, headers=admin_token)
+    assert snapshot.status_code == 200
+    base_id = snapshot.json()["id"]
+    assert len(snapshot.json()["top"]) <= 5
+
+    monkeypatch.setattr(config, "ALLOC_SAMPLE_RATE", 1.0)
+    with (DATA_DIR / "test_detection.json").open("r", encoding="utf-8") as fh:
+        payload = json.load(fh)
+    assert client.post("/detect", json=payload).status_code == 200
+
+    diff = client.get("/admin/memory/diff", params={"base": base_id}, headers=admin_token)
+    assert diff.status_code == 200
+    assert diff.json()["base"] == base_id
+    assert client.get("/admin/memory/diff", params={"base": 10_000}, headers=admin_token).status_code == 404
+
+    status = client.get("/admin/memory", headers=admin_token).json()
+    assert [entry["id"] for entry in status["snapshots"]] == [base_id]
+    assert "lightgbm" in status["models"]
+
+    body = client.get("/metrics").text
+    assert 'ai_detector_stage_alloc_bytes_count{stage="feature_extract"}' in body
+    assert 'ai_detector_stage_alloc_bytes_count{stage="request_decode"}' in body
+
+
+def test_only_one_request_is_alloc_sampled_at_a_time(monkeypatch) -> None:
+    monkeypatch.setattr(config, "ALLOC_SAMPLE_RATE", 1.0)
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        first, second = contextvars.copy_context(), contextvars.copy_context()
+        token = first.run(begin_alloc_sample)
+        assert token is not None and first.run(alloc_mark) is not None
+        # 計測中のリクエストがある間、別のリクエストはピークをリセットしない
+        assert second.run(begin_alloc_sample) is None
+        assert second.run(alloc_mark) is None
+        first.run(end_alloc_sample, token)
+
+        token = second.run(begin_alloc_sample)
+        assert token is not None
+        second.run(end_alloc_sample, token)
+    finally:
+        if started:
+            tracemalloc.stop()
@@ -0,0 +1,62 @@
+"""管理用プロファイリングエンドポイントのテスト。"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+from api.app import app
+from utils.profiler import PROFILER
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+TOKEN = "test-admin-token"
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def admin_token(monkeypatch) -> dict[str, str]:
+    monkeypatch.setattr(config, "ADMIN_TOKEN", TOKEN)
+    yield {"X-Admin-Token": TOKEN}
+    PROFILER.stop()
+
+
+def test_admin_routes_require_token(client: TestClient, monkeypatch) -> None:
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "")
+    assert client.get("/admin/profile").status_code == 404
+
+    monkeypatch.setattr(config, "ADMIN_TOKEN", TOKEN)
+    assert client.get("/admin/profile").status_code == 403
+    assert client.get("/admin/profile", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    # 非 ASCII のトークンでも 500 にならず 403
+    assert client.get("/admin/profile", headers={"X-Admin-Token": "sécret".encode("latin-1")}).status_code == 403
+
+
+def test_cprofile_session_covers_next_n_requests(client: TestClient, admin_token) -> None:
+    with (DATA_DIR / "test_detection.json").open("r", encoding="utf-8") as fh:
+        payload = json.load(fh)
+
+    started = client.post("/admin/profile/start", params={"requests": 2}, headers=admin_token)
+    assert started.status_code == 200
+    assert started.json()["active"] is True
+    assert client.post("/admin/profile/start", params={"requests": 2}, headers=admin_token).status_code == 409
+
+    for _ in range(3):
+        assert client.post("/detect", json=payload).status_code == 200
+
+    report = client.get("/admin/profile", headers=admin_token).json()
+    assert report["active"] is False
+    assert report["session"]["requests_profiled"] == 2
+    assert report["functions"]
+    assert "services" in report["by_package"]
+
+    text = client.get("/admin/profile", params={"format": "pstats"}, headers=admin_token).text
+    assert "function calls" in text
@@ -111,3 +111,30 @@ def test_cluster_anomaly_giftcard_single_should_be_flagged(client: TestClient) -
     body = response.json()
     assert body["is_anomaly"] is True
     assert body["prediction"] == -1
+
+
+def test_cluster_anomaly_fills_pc_from_projection_table(client: TestClient) -> None:
+    """pc1/pc2 未指定時は射影テーブルのカテゴリ座標で補完される。"""
+    from api.dependencies import get_cluster_detector
+
+    projection = get_cluster_detector().projection
+    assert projection is not None
+    pc1, pc2 = projection.lookup(product_category=10)
+
+    payload = {
+        "age": 28,
+        "gender": 2,
+        "prefecture": 14,
+        "product_category": 10,  # ゲーム
+        "quantity": 1,
+        "price": 7000,
+        "total_amount": 7000,
+        "purchase_time": 20,
+        "limited_flag": 0,
+        "payment_method": 3,
+        "manufacturer": 10,
+    }
+    filled = client.post("/detect_cluster_anomaly", json=payload).json()
+    explicit = client.post("/detect_cluster_anomaly", json={**payload, "pc1": pc1, "pc2": pc2}).json()
+    assert filled["anomaly_score"] == explicit["anomaly_score"]
+    assert filled["is_anomaly"] is False
@@ -0,0 +1,124 @@
+"""デバイスフィンガープリントの判定履歴による推論省略のテスト。"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+from api.app import app
+from api.dependencies import get_fingerprint_reputation
+from schemas.detection import UnifiedDetectionRequest
+from services.fingerprint_reputation import FingerprintReputation, fingerprint_key
+from utils import training_logger
+from utils.bloom import BloomFilter
+from utils.metrics import STAGE_LATENCY
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_bloom_filter_membership() -> None:
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"key-{i}")
+    assert len(bloom) <= 1000
+    assert bloom.add("key-0") is True
+    assert all(f"key-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10_000))
+    assert false_positives < 300
+
+
+def test_reputation_requires_confident_bot_verdicts_only() -> None:
+    now = [0.0]
+    reputation = FingerprintReputation(
+        max_entries=100,
+        ttl_seconds=60,
+        min_bot_verdicts=3,
+        min_confidence=0.8,
+        doorkeeper=True,
+        probe_rate=0.0,
+        clock=lambda: now[0],
+    )
+    # 初見は doorkeeper に記録されるだけ
+    reputation.record("farm", is_bot=True, score=0.05, confidence=0.9)
+    assert len(reputation) == 0
+    for _ in range(3):
+        reputation.record("farm", is_bot=True, score=0.05, confidence=0.9)
+    reputation.record("farm", is_bot=True, score=0.4, confidence=0.2)  # 確信度が低い判定は数えない
+    verdict = reputation.lookup("farm")
+    assert verdict is not None and verdict.bot_verdicts == 3
+    assert verdict.mean_score == pytest.approx(0.05)
+
+    for _ in range(4):
+        reputation.record("mixed", is_bot=True, score=0.05, confidence=0.9)
+    reputation.record("mixed", is_bot=False, score=0.95, confidence=0.9)
+    assert reputation.lookup("mixed") is None
+
+    # TTL は最後の bot 判定から数える
+    now[0] = 50.0
+    reputation.record("farm", is_bot=True, score=0.05, confidence=0.9)
+    now[0] = 100.0
+    assert reputation.lookup("farm") is not None
+    now[0] = 110.0
+    assert reputation.lookup("farm") is None
+
+
+def test_probed_known_bad_fingerprint_can_recover() -> None:
+    draws = iter([0.5, 0.01])
+    reputation = FingerprintReputation(
+        max_entries=100,
+        ttl_seconds=60,
+        min_bot_verdicts=2,
+        min_confidence=0.8,
+        doorkeeper=False,
+        probe_rate=0.05,
+        clock=lambda: 0.0,
+        rng=lambda: next(draws),
+    )
+    for _ in range(2):
+        reputation.record("shared", is_bot=True, score=0.05, confidence=0.9)
+    assert reputation.lookup("shared") is not None
+    # probe_rate に当たったリクエストはモデルで評価され、その判定が記録される
+    assert reputation.lookup("shared") is None
+    reputation.record("shared", is_bot=False, score=0.95, confidence=0.9)
+    assert reputation.lookup("shared") is None
+
+
+def test_known_bad_fingerprint_skips_inference(client: TestClient, tmp_path, monkeypatch) -> None:
+    with (DATA_DIR / "test_detection.json").open("r", encoding="utf-8") as fh:
+        payload = json.load(fh)
+    payload.update(session_id="farm-session", request_id="farm-request")
+    payload["device_fingerprint"]["canvas_fingerprint"] = "farm-canvas"
+
+    monkeypatch.setattr(config, "TRAINING_LOG_ENABLED", True)
+    monkeypatch.setattr(config, "TRAINING_LOG_DIR", tmp_path)
+    monkeypatch.setattr(training_logger, "_policy", training_logger.SamplingPolicy(default_rate=0.0))
+    reputation = get_fingerprint_reputation()
+    monkeypatch.setattr(reputation, "probe_rate", 0.0)
+    key = fingerprint_key(UnifiedDetectionRequest.model_validate(payload).device_fingerprint)
+    for _ in range(reputation.min_bot_verdicts + 1):
+        reputation.record(key, is_bot=True, score=0.02, confidence=0.96)
+
+    predictions = STAGE_LATENCY.labels("lightgbm_predict").snapshot()[2]
+    response = client.post("/detect", json=payload)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["final_decision"] == {"is_bot": True, "reason": "fingerprint_reputation", "recommendation": "challenge"}
+    assert body["browser_detection"]["features_extracted"] == {}
+    assert STAGE_LATENCY.labels("lightgbm_predict").snapshot()[2] == predictions
+    assert 'ai_detector_fingerprint_reputation_requests_total{result="skipped"}' in client.get("/metrics").text
+
+    # 推論を省略した bot 判定も学習ログに残る（bot は常に保存）
+    entries = [json.loads(line) for line in next(tmp_path.glob("behavioral_*.jsonl")).read_text().splitlines()]
+    assert [entry["source"] for entry in entries] == ["reputation"]
+    assert entries[0]["final_decision"]["reason"] == "fingerprint_reputation"
+    assert entries[0]["request"]["behavioral_data"]["mouse_movements"]
@@ -0,0 +1,142 @@
+"""request_id 単位の冪等性ストアのテスト。"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.app import app
+from api.dependencies import get_detection_service
+from services.idempotency import IDEMPOTENCY_REQUESTS, IdempotencyStore
+from utils.metrics import STAGE_LATENCY
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_concurrent_duplicates_share_one_computation() -> None:
+    store: IdempotencyStore[int] = IdempotencyStore(window_seconds=60, max_entries=10)
+    calls = 0
+
+    async def compute() -> int:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def scenario():
+        results = await asyncio.gather(*(store.run("req-1", compute) for _ in range(3)))
+        replay = await store.run("req-1", compute)
+        return results, replay
+
+    results, replay = asyncio.run(scenario())
+    assert calls == 1
+    assert [outcome for _, outcome in results] == ["miss", "coalesced", "coalesced"]
+    assert {value for value, _ in results} == {1}
+    assert replay == (1, "hit")
+
+
+def test_owner_cancellation_does_not_fail_coalesced_waiters() -> None:
+    store: IdempotencyStore[str] = IdempotencyStore(window_seconds=60, max_entries=10)
+    calls = 0
+
+    async def compute() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        owner = asyncio.create_task(store.run("req-1", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(store.run("req-1", compute))
+        await asyncio.sleep(0.01)
+        # 最初のリクエストのクライアントが切断しても、合流した待機者には結果が返る
+        owner.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        return await waiter, await store.run("req-1", compute)
+
+    waited, replay = asyncio.run(scenario())
+    assert waited == ("done", "coalesced")
+    assert replay == ("done", "hit")
+    assert calls == 1
+
+
+def test_failures_are_not_stored_and_window_expires() -> None:
+    now = [0.0]
+    store: IdempotencyStore[str] = IdempotencyStore(window_seconds=5, max_entries=10, clock=lambda: now[0])
+
+    async def fail() -> str:
+        raise RuntimeError("boom")
+
+    async def ok() -> str:
+        return "ok"
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(store.run("k", fail))
+    assert asyncio.run(store.run("k", ok)) == ("ok", "miss")
+    assert asyncio.run(store.run("k", ok)) == ("ok", "hit")
+    now[0] = 5.0
+    assert asyncio.run(store.run("k", ok)) == ("ok", "miss")
+
+
+def test_retried_request_id_returns_stored_response(client: TestClient) -> None:
+    with (DATA_DIR / "test_detection.json").open("r", encoding="utf-8") as fh:
+        payload = json.load(fh)
+    payload.update(session_id="idempotency-session", request_id="idempotency-request")
+
+    first = client.post("/detect", json=payload)
+    assert first.status_code == 200
+    predictions = STAGE_LATENCY.labels("lightgbm_predict").snapshot()[2]
+
+    # 内容が変わっていても同じ request_id の再送は保存済みレスポンスを返す
+    payload["behavioral_data"]["mouse_movements"] = []
+    retry = client.post("/detect", json=payload)
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    assert STAGE_LATENCY.labels("lightgbm_predict").snapshot()[2] == predictions
+
+
+def test_concurrent_duplicate_requests_coalesce(client: TestClient, monkeypatch) -> None:
+    with (DATA_DIR / "test_detection.json").open("r", encoding="utf-8") as fh:
+        payload = json.load(fh)
+    payload.update(session_id="coalesce-session", request_id="coalesce-request")
+
+    service = get_detection_service()
+    original_predict = service.predict
+    calls = []
+
+    def slow_predict(request):
+        # 推論がスレッドプールで実行されていれば、待っている間に重複リクエストが処理中の計算に合流できる
+        calls.append(threading.get_ident())
+        time.sleep(0.2)
+        return original_predict(request)
+
+    monkeypatch.setattr(service, "predict", slow_predict)
+    coalesced = IDEMPOTENCY_REQUESTS.labels("coalesced").value
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(async_client.post("/detect", json=payload) for _ in range(2)))
+
+    first, second = asyncio.run(scenario())
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert len(calls) == 1
+    assert calls[0] != threading.get_ident()
+    assert IDEMPOTENCY_REQUESTS.labels("coalesced").value == coalesced + 1
@@ -0,0 +1,49 @@
+"""ロギング設定（サンプリング・キュー経由の出力・構造化ログ）のテスト。"""
+
+from __future__ import annotations
+
+import logging
+import queue
+
+from utils.logging import DroppingQueueHandler, SamplingFilter, log_event
+
+
+def _record(name: str, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 0, "message", None, None)
+
+
+def test_sampling_filter_uses_most_specific_prefix() -> None:
+    sampling = SamplingFilter({"api": 1.0, "api.request": 0.0, "services": 0.0})
+
+    assert sampling.filter(_record("api.routes.detection"))
+    assert not sampling.filter(_record("api.request"))
+    assert not sampling.filter(_record("services.detection_service"))
+    assert sampling.filter(_record("servicesx"))
+    # WARNING 以上はサンプリング対象外
+    assert sampling.filter(_record("api.request", logging.WARNING))
+
+
+def test_dropping_queue_handler_does_not_block_when_full() -> None:
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    handler.handle(_record("api.request"))
+    handler.handle(_record("api.request"))
+
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
+
+
+def test_log_event_emits_single_logfmt_line() -> None:
+    logger = logging.getLogger("tests.log_event")
+    logger.propagate = False
+    records: "queue.Queue[logging.LogRecord]" = queue.Queue()
+    handler = DroppingQueueHandler(records)
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        log_event(logger, "detect", session_id="abc", score=0.5, is_bot=False, cluster_id=None, note="a b")
+    finally:
+        logger.removeHandler(handler)
+
+    record = records.get_nowait()
+    assert record.getMessage() == 'detect session_id=abc score=0.5 is_bot=false cluster_id=- note="a b"'
+    assert records.empty()
@@ -0,0 +1,54 @@
+"""/metrics エンドポイントとヒストグラム出力のテスト。"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.app import app
+from utils.metrics import HistogramFamily
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    family = HistogramFamily("test_latency_seconds", "test", (0.1, 1.0), ("stage",))
+    for value in (0.05, 0.5, 5.0):
+        family.labels("decode").observe(value)
+
+    lines = family.render()
+    assert "# TYPE test_latency_seconds histogram" in lines
+    assert 'test_latency_seconds_bucket{stage="decode",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{stage="decode",le="1.0"} 2' in lines
+    assert 'test_latency_seconds_bucket{stage="decode",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count{stage="decode"} 3' in lines
+
+
+def test_metrics_endpoint_exposes_stage_latencies(client: TestClient) -> None:
+    with (DATA_DIR / "test_detection.json").open("r", encoding="utf-8") as fh:
+        payload = json.load(fh)
+    assert client.post("/detect", json=payload).status_code == 200
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    for stage in (
+        "request_decode",
+        "feature_extract",
+        "lightgbm_predict",
+        "training_log_write",
+        "response_serialize",
+    ):
+        assert f'ai_detector_stage_latency_seconds_count{{stage="{stage}"}}' in body
+    assert 'ai_detector_payload_items_count{field="mouse_movements"}' in body
+    assert 'ai_detector_request_latency_seconds_count{path="/detect"}' in body
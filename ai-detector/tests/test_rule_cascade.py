@@ -0,0 +1,87 @@
+"""モデル推論前のルールカスケードのテスト。"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import config
+from api.app import app
+from schemas.detection import UnifiedDetectionRequest
+from services.rule_cascade import RULE_CASCADE_SAVED_SECONDS, RuleCascade
+from utils import training_logger
+from utils.metrics import STAGE_LATENCY
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _payload(**fingerprint) -> dict:
+    with (DATA_DIR / "test_detection.json").open("r", encoding="utf-8") as fh:
+        payload = json.load(fh)
+    payload["device_fingerprint"].update(fingerprint)
+    return payload
+
+
+def test_rules_are_evaluated_in_tier_order_and_can_be_disabled() -> None:
+    request = UnifiedDetectionRequest.model_validate(
+        _payload(
+            anti_fingerprint_signals=["plugins_empty", "headless_user_agent"],
+            user_agent="Mozilla/5.0 HeadlessChrome/120.0",
+        )
+    )
+    cascade = RuleCascade()
+    assert cascade.tiers == ["fingerprint_signals", "user_agent"]
+    match = cascade.evaluate(request)
+    assert (match.rule, match.tier) == ("headless_user_agent", "fingerprint_signals")
+
+    match = RuleCascade(disabled={"headless_user_agent"}).evaluate(request)
+    assert (match.rule, match.tier) == ("headless_chrome_ua", "user_agent")
+
+    # 決定的でないシグナルだけならモデルに回す
+    ambiguous = UnifiedDetectionRequest.model_validate(_payload(anti_fingerprint_signals=["plugins_empty"]))
+    assert cascade.evaluate(ambiguous) is None
+
+
+def test_savings_use_observed_model_latency() -> None:
+    cascade = RuleCascade()
+    request = UnifiedDetectionRequest.model_validate(_payload(anti_fingerprint_signals=["navigator_webdriver_true"]))
+    match = cascade.evaluate(request)
+    assert cascade.record_savings(match, 0.0001) == 0.0
+    cascade.observe_model_latency(0.01)
+    before = RULE_CASCADE_SAVED_SECONDS.labels("fingerprint_signals").get()
+    assert cascade.record_savings(match, 0.0001) == pytest.approx(0.0099)
+    assert RULE_CASCADE_SAVED_SECONDS.labels("fingerprint_signals").get() == pytest.approx(before + 0.0099)
+
+
+def test_webdriver_signal_finalizes_before_models(client: TestClient, tmp_path, monkeypatch) -> None:
+    payload = _payload(anti_fingerprint_signals=["navigator_webdriver_true"])
+    payload.update(session_id="cascade-session", request_id="cascade-request")
+    monkeypatch.setattr(config, "TRAINING_LOG_ENABLED", True)
+    monkeypatch.setattr(config, "TRAINING_LOG_DIR", tmp_path)
+    monkeypatch.setattr(training_logger, "_policy", training_logger.SamplingPolicy(default_rate=0.0))
+
+    predictions = STAGE_LATENCY.labels("lightgbm_predict").snapshot()[2]
+    response = client.post("/detect", json=payload)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["final_decision"] == {"is_bot": True, "reason": "rule_cascade", "recommendation": "challenge"}
+    assert body["persona_detection"]["is_provided"] is False
+    assert STAGE_LATENCY.labels("lightgbm_predict").snapshot()[2] == predictions
+
+    metrics = client.get("/metrics").text
+    assert 'ai_detector_rule_cascade_requests_total{outcome="fingerprint_signals"}' in metrics
+    assert 'ai_detector_rule_cascade_rule_hits_total{rule="navigator_webdriver_true"}' in metrics
+
+    # カスケードで確定した bot も学習ログに残る（bot クラスのサンプルが減らないように）
+    entries = [json.loads(line) for line in next(tmp_path.glob("behavioral_*.jsonl")).read_text().splitlines()]
+    assert [entry["source"] for entry in entries] == ["cascade"]
+    assert entries[0]["final_decision"]["reason"] == "rule_cascade"
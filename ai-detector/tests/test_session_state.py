@@ -0,0 +1,211 @@
+"""差分スナップショット（セッション単位の集計状態）のテスト。"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from api.app import app
+from api.dependencies import get_detection_service, get_feature_extractor, get_lightgbm_model
+from schemas.detection import UnifiedDetectionRequest
+from services.detection_service import DetectionService
+from services.session_state import SessionResyncRequired, SessionStateStore, StreamingMedian
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _payload() -> dict:
+    with (DATA_DIR / "test_detection.json").open("r", encoding="utf-8") as fh:
+        payload = json.load(fh)
+    movements = payload["behavioral_data"]["mouse_movements"]
+    sequence = payload["behavior_sequence"]
+    # 平均・分散に差が出るよう件数を増やす
+    payload["behavioral_data"]["mouse_movements"] = [
+        {**m, "x": m["x"] + i * 3, "timestamp": m["timestamp"] + i * 40, "velocity": (m.get("velocity") or 0) + i * 0.1}
+        for i, m in enumerate(movements * 8)
+    ]
+    payload["behavior_sequence"] = [
+        {**event, "timestamp": event["timestamp"] + i * 150} for i, event in enumerate(sequence * 5)
+    ]
+    return payload
+
+
+def _split(payload: dict, session_id: str, mouse_split: int, seq_split: int) -> tuple[dict, dict]:
+    full = json.loads(json.dumps(payload))
+    full.update(session_id=session_id, request_id=f"{session_id}-1", snapshot_seq=1)
+    full["behavioral_data"]["mouse_movements"] = payload["behavioral_data"]["mouse_movements"][:mouse_split]
+    full["behavior_sequence"] = payload["behavior_sequence"][:seq_split]
+
+    delta = json.loads(json.dumps(payload))
+    delta.update(session_id=session_id, request_id=f"{session_id}-2", snapshot_seq=2, delta=True)
+    delta["behavioral_data"]["mouse_movements"] = payload["behavioral_data"]["mouse_movements"][mouse_split:]
+    delta["behavior_sequence"] = payload["behavior_sequence"][seq_split:]
+    return full, delta
+
+
+def test_delta_features_match_full_extraction() -> None:
+    payload = _payload()
+    extractor = get_feature_extractor()
+    expected = extractor.extract(UnifiedDetectionRequest.model_validate(payload))
+
+    store = SessionStateStore()
+    full, delta = _split(payload, "s-1", mouse_split=7, seq_split=11)
+    aggregate, status = store.apply(
+        "s-1", 1, delta=False,
+        mouse_movements=UnifiedDetectionRequest.model_validate(full).behavioral_data.mouse_movements,
+        sequence=UnifiedDetectionRequest.model_validate(full).behavior_sequence,
+    )
+    assert aggregate is None and status.delta_ready
+
+    delta_request = UnifiedDetectionRequest.model_validate(delta)
+    aggregate, status = store.apply(
+        "s-1", 2, delta=True,
+        mouse_movements=delta_request.behavioral_data.mouse_movements,
+        sequence=delta_request.behavior_sequence,
+    )
+    actual = extractor.extract(delta_request, aggregate)
+
+    assert status.snapshot_seq == 2
+    assert actual.keys() == expected.keys()
+    for name, value in expected.items():
+        if name == "mouse_velocity_median":
+            # 中央値は P² 法による推定値
+            assert actual[name] == pytest.approx(value, rel=0.05), name
+            continue
+        assert actual[name] == pytest.approx(value, rel=1e-9, abs=1e-9), name
+
+
+def test_apply_returns_snapshot_unaffected_by_later_deltas() -> None:
+    payload = _payload()
+    request = UnifiedDetectionRequest.model_validate(payload)
+    movements, sequence = request.behavioral_data.mouse_movements, request.behavior_sequence
+    store = SessionStateStore()
+    store.apply("s-1", 1, delta=False, mouse_movements=movements[:5], sequence=sequence[:5])
+    snapshot, _ = store.apply("s-1", 2, delta=True, mouse_movements=movements[5:10], sequence=sequence[5:10])
+
+    # 同じセッションの差分が後から適用されても、返した値は変わらない
+    store.apply("s-1", 3, delta=True, mouse_movements=movements[10:], sequence=sequence[10:])
+    assert snapshot.snapshot_seq == 2
+    assert snapshot.mouse_count == 10 and snapshot.velocity.count == 10
+    assert snapshot.event_count == 10 and sum(snapshot.action_counts.values()) <= 10
+    with pytest.raises(TypeError):
+        snapshot.action_counts["click"] = 1  # type: ignore[index]
+
+
+def test_streaming_median_tracks_exact_median() -> None:
+    rng = np.random.default_rng(0)
+    for values in (rng.lognormal(size=5000), rng.normal(size=5000), np.arange(5000.0)):
+        median = StreamingMedian()
+        for value in values:
+            median.push(float(value))
+        spread = np.percentile(values, 75) - np.percentile(values, 25)
+        assert abs(median.value - float(np.median(values))) < 0.05 * spread
+
+    for size in range(1, 6):
+        median = StreamingMedian()
+        values = [3.0, 1.0, 4.0, 1.5, 9.0][:size]
+        for value in values:
+            median.push(value)
+        assert median.value == float(np.median(values))
+
+
+def test_store_rejects_gaps_and_evicts() -> None:
+    now = [0.0]
+    store = SessionStateStore(ttl_seconds=10, max_sessions=2, clock=lambda: now[0])
+    with pytest.raises(SessionResyncRequired):
+        store.apply("missing", 2, delta=True, mouse_movements=[], sequence=[])
+
+    store.apply("a", 1, delta=False, mouse_movements=[], sequence=[])
+    with pytest.raises(SessionResyncRequired) as excinfo:
+        store.apply("a", 3, delta=True, mouse_movements=[], sequence=[])
+    assert excinfo.value.expected_seq == 2
+    # 同じ連番の再送は状態を変えずに受け付ける
+    assert store.apply("a", 1, delta=True, mouse_movements=[], sequence=[])[0] is not None
+
+    store.apply("b", 1, delta=False, mouse_movements=[], sequence=[])
+    store.apply("c", 1, delta=False, mouse_movements=[], sequence=[])
+    assert len(store) == 2
+    with pytest.raises(SessionResyncRequired):
+        store.apply("a", 2, delta=True, mouse_movements=[], sequence=[])
+
+    now[0] = 11.0
+    with pytest.raises(SessionResyncRequired):
+        store.apply("c", 2, delta=True, mouse_movements=[], sequence=[])
+    assert len(store) == 0 and store.total_bytes == 0
+
+
+def test_replay_refreshes_ttl_in_lru_order() -> None:
+    now = [0.0]
+    store = SessionStateStore(ttl_seconds=10, max_sessions=10, clock=lambda: now[0])
+    store.apply("a", 1, delta=False, mouse_movements=[], sequence=[])
+    now[0] = 5.0
+    store.apply("b", 1, delta=False, mouse_movements=[], sequence=[])
+    now[0] = 8.0
+    store.apply("a", 1, delta=True, mouse_movements=[], sequence=[])
+
+    # 再送で末尾に移った "a" は再送時刻から TTL を数え、先に期限が来る "b" の失効を妨げない
+    now[0] = 16.0
+    assert store.apply("a", 2, delta=True, mouse_movements=[], sequence=[])[1].snapshot_seq == 2
+    with pytest.raises(SessionResyncRequired):
+        store.apply("b", 2, delta=True, mouse_movements=[], sequence=[])
+
+
+def test_detect_endpoint_accepts_delta_snapshots(client: TestClient) -> None:
+    payload = _payload()
+    full, delta = _split(payload, "delta-api-session", mouse_split=10, seq_split=12)
+
+    first = client.post("/detect", json=full)
+    assert first.status_code == 200
+    assert first.json()["session_state"] == {"snapshot_seq": 1, "delta_ready": True}
+
+    second = client.post("/detect", json=delta)
+    assert second.status_code == 200
+    features = second.json()["browser_detection"]["features_extracted"]
+    assert features["mouse_event_count"] == len(payload["behavioral_data"]["mouse_movements"])
+    assert features["sequence_event_count"] == len(payload["behavior_sequence"])
+
+    gap = client.post("/detect", json={**delta, "request_id": "gap", "snapshot_seq": 5})
+    assert gap.status_code == 409
+    assert gap.json()["detail"]["code"] == "session_resync_required"
+    assert gap.json()["detail"]["expected_seq"] == 3
+
+
+def test_delta_requires_snapshot_seq(client: TestClient) -> None:
+    payload = _payload()
+    payload.update(session_id="delta-no-seq", request_id="delta-no-seq", delta=True)
+    with pytest.raises(ValidationError):
+        UnifiedDetectionRequest.model_validate(payload)
+    assert client.post("/detect", json=payload).status_code == 422
+
+
+def test_delta_without_session_state_requires_resync(client: TestClient) -> None:
+    payload = _payload()
+    _, delta = _split(payload, "delta-unknown-session", mouse_split=10, seq_split=12)
+    response = client.post("/detect", json=delta)
+    assert response.status_code == 409
+    assert response.json()["detail"]["code"] == "session_resync_required"
+
+    # セッション状態を無効にしている場合も、差分だけで推論せず全量の再送を求める
+    app.dependency_overrides[get_detection_service] = lambda: DetectionService(
+        get_lightgbm_model(), get_feature_extractor(), None
+    )
+    try:
+        response = client.post("/detect", json={**delta, "request_id": "delta-store-off"})
+        assert response.status_code == 409
+        assert response.json()["detail"]["code"] == "session_resync_required"
+        full = client.post("/detect", json={**delta, "request_id": "full-store-off", "delta": False})
+        assert full.status_code == 200
+        assert full.json()["session_state"] is None
+    finally:
+        app.dependency_overrides.pop(get_detection_service, None)
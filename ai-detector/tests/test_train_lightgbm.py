@@ -0,0 +1,70 @@
+"""LightGBM 学習スクリプト（training/browser/train_lightgbm.py）のテスト。"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+TRAINING_DIR = Path(__file__).resolve().parents[1] / "training" / "browser"
+if str(TRAINING_DIR) not in sys.path:
+    sys.path.insert(0, str(TRAINING_DIR))
+
+import train_lightgbm  # noqa: E402
+
+
+def test_build_folds_applies_balanced_weights() -> None:
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(60, len(train_lightgbm.FEATURE_NAMES))), columns=train_lightgbm.FEATURE_NAMES)
+    y = np.array([1] * 45 + [0] * 15)
+    groups = [f"session-{i % 9}" for i in range(60)]
+
+    _, folds = train_lightgbm.build_folds(X, y, groups)
+    assert folds
+    for fold in folds:
+        weight = fold.train_set.get_field("weight")
+        assert weight is not None
+        labels = fold.train_set.get_field("label")
+        np.testing.assert_allclose(weight, train_lightgbm.balanced_weights(labels.astype(int)), rtol=1e-6)
+        # 検証 fold は重み無し（評価は素の分布で行う）
+        assert fold.valid_set.get_field("weight") is None
+
+
+def test_search_tree_count_carries_over_to_refit(monkeypatch) -> None:
+    rng = np.random.default_rng(1)
+    n_rows = 240
+    X = pd.DataFrame(
+        rng.normal(size=(n_rows, len(train_lightgbm.FEATURE_NAMES))), columns=train_lightgbm.FEATURE_NAMES
+    )
+    y = (X.iloc[:, 0] + 0.5 * rng.normal(size=n_rows) > 0.4).astype(int).to_numpy()
+    groups = [f"session-{i % 24}" for i in range(n_rows)]
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "train_lightgbm.py",
+            "--search",
+            "--search-candidates=3",
+            "--search-min-rounds=20",
+            "--search-max-rounds=60",
+            "--early-stopping-rounds=5",
+            "--num-threads=1",
+        ],
+    )
+    args = train_lightgbm.parse_args()
+
+    full_set, folds = train_lightgbm.build_folds(X, y, groups)
+    search = train_lightgbm.search_hyperparameters(folds, X.to_numpy()[:32], args)
+    assert 1 <= search["num_boost_round"] <= args.search_max_rounds
+
+    model, metrics = train_lightgbm.train_and_evaluate(
+        full_set, folds, y, params=search["params"], num_boost_round=search["num_boost_round"]
+    )
+    assert model.num_trees() == search["num_boost_round"]
+    assert metrics["num_boost_round"] == search["num_boost_round"]
+    # 全データ学習も fold と同じ balanced 重みで行う
+    np.testing.assert_allclose(full_set.get_field("weight"), train_lightgbm.balanced_weights(y), rtol=1e-6)
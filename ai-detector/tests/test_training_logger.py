@@ -0,0 +1,149 @@
+"""学習ログ出力（JSONL + 特徴量ストア）のテスト。"""
+
+from __future__ import annotations
+
+import json
+import shutil
+from dataclasses import dataclass, field
+from typing import Dict
+
+import numpy as np
+import pytest
+
+import config
+from services.feature_extractor import FEATURE_SCHEMA_VERSION
+from utils import feature_store, training_logger
+
+
+@dataclass
+class _BrowserResult:
+    session_id: str
+    features_extracted: Dict[str, float] = field(default_factory=dict)
+    score: float = 0.9
+
+
+def _log(session_id: str, reason: str = "normal", is_bot: bool = False, score: float = 0.9) -> None:
+    training_logger.log_detection_sample(
+        request=None,
+        browser_result=_BrowserResult(session_id, score=score),
+        persona_result=None,
+        final_decision={"reason": reason, "is_bot": is_bot},
+    )
+
+
+@pytest.fixture
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "TRAINING_LOG_ENABLED", True)
+    monkeypatch.setattr(config, "TRAINING_FEATURE_STORE_ENABLED", True)
+    monkeypatch.setattr(config, "TRAINING_LOG_LABEL", "bot")
+    monkeypatch.setattr(config, "TRAINING_LOG_DIR", tmp_path)
+    training_logger.set_sampling_policy(None)
+    training_logger.reset_sampling_stats()
+    yield tmp_path
+    training_logger.set_sampling_policy(None)
+
+
+def test_log_detection_sample_writes_feature_store(log_dir) -> None:
+    names = ["a", "b", "c"]
+    for idx in range(3):
+        training_logger.log_detection_sample(
+            request=None,
+            browser_result=_BrowserResult(f"sess-{idx}", {"a": float(idx), "b": 0.5, "extra": 9.0}),
+            persona_result=None,
+            final_decision={"reason": "normal"},
+            feature_names=names,
+            schema_version=FEATURE_SCHEMA_VERSION,
+        )
+
+    jsonl_files = list(log_dir.glob("behavioral_*.jsonl"))
+    assert len(jsonl_files) == 1
+    assert len(jsonl_files[0].read_text(encoding="utf-8").splitlines()) == 3
+
+    blocks = feature_store.find_feature_blocks(log_dir, FEATURE_SCHEMA_VERSION)
+    assert len(blocks) == 1
+    block = feature_store.load_feature_block(blocks[0])
+    assert block.feature_names == names
+    assert block.features.dtype == np.float32
+    assert block.features.shape == (3, 3)
+    np.testing.assert_allclose(block.features[:, 0], [0.0, 1.0, 2.0])
+    np.testing.assert_allclose(block.features[:, 2], [0.0, 0.0, 0.0])
+    assert block.labels.tolist() == [0, 0, 0]
+    assert block.session_ids == ["sess-0", "sess-1", "sess-2"]
+
+    schema = json.loads((blocks[0] / feature_store.SCHEMA_FILENAME).read_text(encoding="utf-8"))
+    assert schema["feature_schema_version"] == FEATURE_SCHEMA_VERSION
+
+
+def test_feature_store_skips_mismatched_schema(log_dir) -> None:
+    directory = feature_store.block_dir(log_dir, FEATURE_SCHEMA_VERSION, "20250101")
+    common = {"label": "human", "session_id": "s", "schema_version": FEATURE_SCHEMA_VERSION}
+    assert feature_store.append_feature_row(directory, vector=[1.0], feature_names=["a"], **common)
+    assert not feature_store.append_feature_row(directory, vector=[1.0], feature_names=["b"], **common)
+
+    block = feature_store.load_feature_block(directory)
+    assert block.features.shape == (1, 1)
+    assert block.labels.tolist() == [1]
+
+
+def test_feature_store_reads_schema_once_per_directory(log_dir, monkeypatch) -> None:
+    loads = []
+    original = feature_store._load_or_create_schema
+    monkeypatch.setattr(
+        feature_store, "_load_or_create_schema", lambda *args: loads.append(args[0]) or original(*args)
+    )
+    common = {"label": "bot", "session_id": "s", "feature_names": ["a"], "schema_version": FEATURE_SCHEMA_VERSION}
+    day1 = feature_store.block_dir(log_dir, FEATURE_SCHEMA_VERSION, "20250101")
+    day2 = feature_store.block_dir(log_dir, FEATURE_SCHEMA_VERSION, "20250102")
+    for _ in range(5):
+        assert feature_store.append_feature_row(day1, vector=[1.0], **common)
+    assert feature_store.append_feature_row(day2, vector=[2.0], **common)
+
+    # 日付の切り替わり（ローテーション）でだけ schema.json を読み直す
+    assert loads == [day1, day2]
+    assert feature_store.load_feature_block(day1).features.shape == (5, 1)
+
+
+def test_feature_store_recreates_removed_directory(log_dir) -> None:
+    common = {"label": "bot", "session_id": "s", "feature_names": ["a"], "schema_version": FEATURE_SCHEMA_VERSION}
+    directory = feature_store.block_dir(log_dir, FEATURE_SCHEMA_VERSION, "20250103")
+    assert feature_store.append_feature_row(directory, vector=[1.0], **common)
+    shutil.rmtree(directory)
+
+    # 処理中にディレクトリが消えても schema.json ごと作り直して書き込む
+    assert feature_store.append_feature_row(directory, vector=[2.0], **common)
+    block = feature_store.load_feature_block(directory)
+    assert block.features.tolist() == [[2.0]]
+
+
+def test_sampling_policy_is_consistent_per_session(log_dir) -> None:
+    training_logger.set_sampling_policy(training_logger.SamplingPolicy(reason_rates={"normal": 0.3}))
+    sessions = [f"sess-{idx}" for idx in range(200)]
+    for _ in range(3):
+        for session_id in sessions:
+            _log(session_id)
+
+    lines = next(log_dir.glob("behavioral_*.jsonl")).read_text(encoding="utf-8").splitlines()
+    kept_sessions = [json.loads(line)["session_id"] for line in lines]
+    counts = {sid: kept_sessions.count(sid) for sid in set(kept_sessions)}
+    # 保存対象になったセッションは 3 回とも保存される
+    assert set(counts.values()) == {3}
+    assert 20 < len(counts) < 100
+
+    stats = training_logger.get_sampling_stats()
+    assert stats["kept"] == len(lines)
+    assert stats["kept"] + stats["dropped"] == 600
+    assert stats["by_reason"]["normal"]["dropped"] == stats["dropped"]
+
+
+def test_sampling_policy_always_keeps_bot_and_borderline(log_dir) -> None:
+    training_logger.set_sampling_policy(
+        training_logger.SamplingPolicy(default_rate=0.0, borderline_margin=0.1)
+    )
+    _log("a", reason="browser_behavior", is_bot=True, score=0.1)
+    _log("b", score=0.55)
+    _log("c", score=0.95)
+
+    stats = training_logger.get_sampling_stats()
+    assert stats["kept"] == 2
+    assert stats["dropped"] == 1
+    assert stats["kept_by_rule"] == {"always_bot": 1, "always_borderline": 1}
@@ -0,0 +1,76 @@
+"""セッション単位の判定キャッシュのテスト。"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api.app import app
+from schemas.detection import UnifiedDetectionRequest
+from services.verdict_cache import VERDICT_CACHE_REQUESTS, VerdictCache, payload_digest
+from utils.metrics import STAGE_LATENCY
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+
+@pytest.fixture(scope="module")
+def client() -> TestClient:
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _payload(session_id: str) -> dict:
+    with (DATA_DIR / "test_detection.json").open("r", encoding="utf-8") as fh:
+        payload = json.load(fh)
+    payload["session_id"] = session_id
+    return payload
+
+
+def _predict_count() -> int:
+    return STAGE_LATENCY.labels("lightgbm_predict").snapshot()[2]
+
+
+def test_digest_ignores_elapsed_time_but_not_new_events() -> None:
+    payload = _payload("digest-session")
+    base = payload_digest(UnifiedDetectionRequest.model_validate(payload))
+
+    later = json.loads(json.dumps(payload))
+    later["request_id"] = "another-request"
+    later["behavioral_data"]["page_interaction"]["session_duration_ms"] += 5000
+    assert payload_digest(UnifiedDetectionRequest.model_validate(later)) == base
+
+    moved = json.loads(json.dumps(payload))
+    moved["behavioral_data"]["mouse_movements"].append({"timestamp": 1700000009000, "x": 1, "y": 2, "velocity": 0.3})
+    assert payload_digest(UnifiedDetectionRequest.model_validate(moved)) != base
+
+
+def test_cache_expires_and_evicts() -> None:
+    now = [0.0]
+    cache = VerdictCache(ttl_seconds=10, max_entries=1, clock=lambda: now[0])
+    response = object()
+    cache.put("a", "d1", response)  # type: ignore[arg-type]
+    assert cache.get("a", "d1") is response
+    cache.put("b", "d1", response)  # type: ignore[arg-type]
+    assert cache.get("a", "d1") is None
+    now[0] = 10.0
+    assert cache.get("b", "d1") is None
+
+
+def test_repeated_snapshot_skips_models(client: TestClient) -> None:
+    payload = _payload("verdict-cache-session")
+    first = client.post("/detect", json=payload)
+    assert first.status_code == 200
+
+    predictions = _predict_count()
+    hits = VERDICT_CACHE_REQUESTS.labels("hit").get()
+    second = client.post("/detect", json={**payload, "request_id": "retry-1"})
+    assert second.status_code == 200
+    assert _predict_count() == predictions
+    assert VERDICT_CACHE_REQUESTS.labels("hit").get() == hits + 1
+    assert second.json()["request_id"] == "retry-1"
+    assert second.json()["browser_detection"] == first.json()["browser_detection"]
+
+    assert "ai_detector_verdict_cache_requests_total" in client.get("/metrics").text
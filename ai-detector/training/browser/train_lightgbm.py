@@ -4,25 +4,48 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
 import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import joblib
 import lightgbm as lgb
 import numpy as np
 import pandas as pd
-from sklearn.metrics import accuracy_score, roc_auc_score, precision_recall_fscore_support
-from sklearn.model_selection import GroupKFold
+from sklearn.metrics import accuracy_score, log_loss, roc_auc_score, precision_recall_fscore_support
+from sklearn.model_selection import GroupKFold, GroupShuffleSplit
+
+try:  # 高速 JSON パーサ（未インストールなら標準 json）
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:  # pragma: no cover - orjson は任意依存
+    _json_loads = json.loads
 
 SCRIPT_PATH = Path(__file__).resolve()
 PROJECT_ROOT = SCRIPT_PATH.parents[2]
+SRC_DIR = PROJECT_ROOT / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
+from services.feature_extractor import FEATURE_SCHEMA_VERSION  # noqa: E402
+from utils.feature_store import find_feature_blocks, load_feature_block  # noqa: E402
 
 HUMAN_LABEL = 1
 BOT_LABEL = 0
 
+# extract_features のロジックを変更したらインクリメントする（特徴量キャッシュの無効化に使う）
+FEATURE_EXTRACTOR_VERSION = 2
+
 # メモ版の特徴量セット（DEFAULT_FEATURE_NAMES と揃える）
 FEATURE_NAMES = [
     "mouse_movements_count",
@@ -54,6 +77,20 @@ FEATURE_NAMES = [
     "action_type_PERIODIC_SNAPSHOT",
     "action_type_TIMED_SHORT",
 ]
+FEATURE_INDEX = {name: idx for idx, name in enumerate(FEATURE_NAMES)}
+
+# LightGBM 学習パラメータ（旧 LGBMClassifier 設定と同等。class_weight="balanced" は行重みで表現）
+NUM_BOOST_ROUND = 500
+BASE_PARAMS: Dict[str, Any] = {
+    "objective": "binary",
+    "learning_rate": 0.05,
+    "num_leaves": 31,
+    "max_depth": -1,
+    "bagging_fraction": 0.8,
+    "feature_fraction": 0.8,
+    "seed": 42,
+    "verbosity": -1,
+}
 
 
 def parse_args() -> argparse.Namespace:
@@ -71,6 +108,82 @@ def parse_args() -> argparse.Namespace:
         help="モデルやメトリクスの出力ディレクトリ。",
     )
     parser.add_argument("--model-name", type=str, default="lightgbm_model.pkl", help="出力モデルファイル名。")
+    parser.add_argument(
+        "--feature-store",
+        action="store_true",
+        help="JSONL を再パースせず、推論時に保存した特徴量ストア (features_v*_*) を memmap で読み込む。",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="JSONL の特徴量抽出に使うプロセス数（1 ならメインプロセスで処理）。",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=Path("training/browser/cache/features"),
+        help="JSONL ごとの抽出済み特徴量 (.npy) を保存するキャッシュディレクトリ。",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="特徴量キャッシュを使わずに全ファイルを再抽出する。")
+    parser.add_argument(
+        "--num-threads",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="学習に使う合計スレッド数。CV では並列 fold 数で等分する。",
+    )
+    parser.add_argument(
+        "--parallel-folds",
+        type=int,
+        default=0,
+        help="同時に学習する CV fold 数（0 なら fold 数と同じ）。",
+    )
+    parser.add_argument(
+        "--search",
+        action="store_true",
+        help="successive halving でハイパーパラメータを探索してから学習する。",
+    )
+    parser.add_argument("--search-candidates", type=int, default=16, help="探索で最初にサンプリングする候補数。")
+    parser.add_argument("--search-min-rounds", type=int, default=50, help="探索の最初のラウンド予算。")
+    parser.add_argument("--search-max-rounds", type=int, default=1000, help="探索のラウンド予算の上限。")
+    parser.add_argument("--search-eta", type=int, default=3, help="各段で残す候補の割合の逆数と予算の増加率。")
+    parser.add_argument(
+        "--early-stopping-rounds",
+        type=int,
+        default=50,
+        help="探索時に検証 logloss が改善しなければ打ち切るラウンド数。",
+    )
+    parser.add_argument(
+        "--latency-weight",
+        type=float,
+        default=0.02,
+        help="探索の目的関数で 1 行推論 p50 レイテンシ 1ms あたり差し引く AUC。",
+    )
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="--base-model から追加学習し、--since 以降の新しいログだけで boosting を継続する。",
+    )
+    parser.add_argument(
+        "--base-model",
+        type=Path,
+        default=Path("models/browser/lightgbm_model.pkl"),
+        help="追加学習の起点とするモデル (.pkl / .txt)。",
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        default=None,
+        help="この日付 (YYYYMMDD) 以降のログファイルだけを使う。warm start で未指定ならベースモデルの更新日。",
+    )
+    parser.add_argument("--warm-start-rounds", type=int, default=100, help="追加する boosting ラウンド数。")
+    parser.add_argument("--holdout-ratio", type=float, default=0.2, help="回帰チェック用ホールドアウトの割合。")
+    parser.add_argument(
+        "--regression-tolerance",
+        type=float,
+        default=0.005,
+        help="ホールドアウト AUC がベースモデルよりこの値を超えて下がったら保存しない。",
+    )
     parser.add_argument("--random-state", type=int, default=42, help="乱数 seed。")
     parser.add_argument(
         "--log-level",
@@ -81,16 +194,41 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-def load_jsonl_file(path: Path) -> List[Dict[str, Any]]:
-    """JSONL を読み込む。"""
-    records: List[Dict[str, Any]] = []
-    with path.open("r", encoding="utf-8") as f:
+def iter_jsonl_file(path: Path) -> Iterator[Dict[str, Any]]:
+    """JSONL を 1 行ずつパースしながら返す。"""
+    with path.open("rb") as f:
         for line in f:
             line = line.strip()
             if not line:
                 continue
-            records.append(json.loads(line))
-    return records
+            yield _json_loads(line)
+
+
+def _count_lines(path: Path) -> int:
+    """改行数から行数の上限を数える（行列の事前確保用）。"""
+    count = 0
+    last = b"\n"
+    with path.open("rb") as f:
+        while chunk := f.read(1 << 20):
+            count += chunk.count(b"\n")
+            last = chunk[-1:]
+    return count + (0 if last == b"\n" else 1)
+
+
+# mouse_movements / behavior_sequence から計算する特徴量（差分スナップショットでは推論時の値を使う）
+SEQUENCE_DERIVED_FEATURES = (
+    "mouse_movements_count",
+    "mouse_velocity_mean",
+    "mouse_velocity_std",
+    "mouse_velocity_max",
+    "seq_total_actions",
+    "seq_count_mouse_move",
+    "seq_count_click",
+    "seq_count_keystroke",
+    "seq_count_scroll",
+    "seq_count_TIMED_SHORT",
+    "seq_count_TIMED_LONG",
+)
 
 
 def extract_features(record: Dict[str, Any]) -> Dict[str, Any]:
@@ -143,99 +281,589 @@ def extract_features(record: Dict[str, Any]) -> Dict[str, Any]:
 
     features["context_action_type"] = context.get("action_type", "UNKNOWN") or "UNKNOWN"
 
+    if req.get("delta"):
+        # 差分スナップショットの配列は前回以降の分だけなので、配列由来の特徴量は
+        # 推論時にセッション集計値から計算した値を使う
+        extracted = (record.get("browser_result") or {}).get("features_extracted") or {}
+        for name in SEQUENCE_DERIVED_FEATURES:
+            if name in extracted:
+                features[name] = float(extracted[name])
+
     return features
 
 
-def build_dataset(data_dir: Path) -> Tuple[pd.DataFrame, List[int], List[str]]:
-    all_features: List[Dict[str, Any]] = []
+def fill_feature_row(row: np.ndarray, record: Dict[str, Any]) -> None:
+    """extract_features の結果を FEATURE_NAMES 順で row に書き込む（action_type は one-hot）。"""
+    features = extract_features(record)
+    for idx, name in enumerate(FEATURE_NAMES):
+        value = features.get(name)
+        row[idx] = value if value is not None else 0.0
+    action_idx = FEATURE_INDEX.get(f"action_type_{features['context_action_type']}")
+    if action_idx is not None:
+        row[action_idx] = 1.0
+
+
+def extract_file_features(path: Path) -> Tuple[np.ndarray, List[str]]:
+    """1 ファイル分の特徴量を float32 行列として抽出する（プロセスプールのワーカー）。"""
+    matrix = np.zeros((_count_lines(path), len(FEATURE_NAMES)), dtype=np.float32)
+    session_ids: List[str] = []
+    for rec in iter_jsonl_file(path):
+        fill_feature_row(matrix[len(session_ids)], rec)
+        session_ids.append(rec.get("session_id", "") or "")
+    return matrix[: len(session_ids)], session_ids
+
+
+@dataclass(frozen=True)
+class CacheKey:
+    """キャッシュの有効性を判定するファイル指紋。"""
+
+    path: str
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """JSONL ファイル単位の抽出済み特徴量キャッシュ。
+
+    パス・サイズ・mtime・内容ハッシュと FEATURE_EXTRACTOR_VERSION / FEATURE_NAMES が一致すれば
+    保存済みの ``.npy`` ブロックを再利用する。サイズと mtime が一致する場合はハッシュ計算を省略する。
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.cached_rows = 0
+
+    def _entry_paths(self, path: Path) -> Tuple[Path, Path]:
+        stem = hashlib.sha1(str(path.resolve()).encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{stem}.npy", self.cache_dir / f"{stem}.json"
+
+    def lookup(self, path: Path) -> Tuple[Optional[Tuple[np.ndarray, List[str]]], CacheKey]:
+        """(キャッシュ済みブロック or None, 現在のファイル指紋) を返す。"""
+        stat = path.stat()
+        npy_path, manifest_path = self._entry_paths(path)
+        manifest: Dict[str, Any] = {}
+        if manifest_path.exists() and npy_path.exists():
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+
+        compatible = (
+            manifest.get("extractor_version") == FEATURE_EXTRACTOR_VERSION
+            and manifest.get("feature_names") == FEATURE_NAMES
+            and manifest.get("path") == str(path.resolve())
+        )
+        if compatible and manifest.get("size") == stat.st_size and manifest.get("mtime_ns") == stat.st_mtime_ns:
+            key = CacheKey(str(path.resolve()), stat.st_size, stat.st_mtime_ns, manifest["sha256"])
+        else:
+            key = CacheKey(str(path.resolve()), stat.st_size, stat.st_mtime_ns, _file_sha256(path))
+            if compatible and manifest.get("sha256") == key.sha256:
+                # 内容は同じで mtime だけ変わった場合は指紋を更新して再利用
+                self._write_manifest(manifest_path, key, manifest["session_ids"])
+            else:
+                self.misses += 1
+                return None, key
+
+        matrix = np.load(npy_path, mmap_mode="r")
+        self.hits += 1
+        self.cached_rows += len(manifest["session_ids"])
+        return (matrix, manifest["session_ids"]), key
+
+    def store(self, key: CacheKey, matrix: np.ndarray, session_ids: List[str]) -> None:
+        npy_path, manifest_path = self._entry_paths(Path(key.path))
+        np.save(npy_path, np.ascontiguousarray(matrix, dtype=np.float32))
+        self._write_manifest(manifest_path, key, session_ids)
+
+    def _write_manifest(self, manifest_path: Path, key: CacheKey, session_ids: List[str]) -> None:
+        manifest = {
+            "path": key.path,
+            "size": key.size,
+            "mtime_ns": key.mtime_ns,
+            "sha256": key.sha256,
+            "extractor_version": FEATURE_EXTRACTOR_VERSION,
+            "feature_names": FEATURE_NAMES,
+            "session_ids": session_ids,
+        }
+        manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+
+
+_DATE_PATTERN = re.compile(r"(\d{8})")
+
+
+def file_date(path: Path) -> str:
+    """ファイル名 (behavioral_YYYYMMDD.jsonl / features_v1_YYYYMMDD) の日付。無ければ mtime の日付。"""
+    match = _DATE_PATTERN.search(path.name)
+    if match:
+        return match.group(1)
+    return datetime.utcfromtimestamp(path.stat().st_mtime).strftime("%Y%m%d")
+
+
+def build_dataset(
+    data_dir: Path, workers: int = 1, cache: FeatureCache | None = None, since: str | None = None
+) -> Tuple[pd.DataFrame, np.ndarray, List[str]]:
+    """bot / human の JSONL を並列に読み込み、FEATURE_NAMES 順の float32 行列を組み立てる。
+
+    cache を渡すと、変更のないファイルは抽出をスキップしてキャッシュ済みブロックを使う。
+    since (YYYYMMDD) を渡すと、その日付以降のファイルだけを読み込む。
+    """
+    files: List[Tuple[Path, int]] = []
+    for cls, label in [("bot", BOT_LABEL), ("human", HUMAN_LABEL)]:
+        cls_dir = data_dir / cls
+        if not cls_dir.exists():
+            continue
+        files.extend(
+            (file, label)
+            for file in sorted(cls_dir.glob("*.jsonl"))
+            if since is None or file_date(file) >= since
+        )
+
+    paths = [file for file, _ in files]
+    # 行数の上限で事前確保し、ワーカーの結果を届いた順に書き込む（ピークメモリ ≒ 行列 1 本 + 処理中ブロック）
+    capacity = sum(_count_lines(path) for path in paths)
+    X = np.empty((capacity, len(FEATURE_NAMES)), dtype=np.float32)
+    labels = np.empty(capacity, dtype=np.int8)
+    session_ids: List[str] = []
+
+    cached: Dict[Path, Tuple[np.ndarray, List[str]]] = {}
+    keys: Dict[Path, CacheKey] = {}
+    if cache is not None:
+        for path in paths:
+            block, keys[path] = cache.lookup(path)
+            if block is not None:
+                cached[path] = block
+    miss_paths = [path for path in paths if path not in cached]
+
+    executor = (
+        ProcessPoolExecutor(max_workers=min(workers, len(miss_paths)))
+        if workers > 1 and len(miss_paths) > 1
+        else None
+    )
+    try:
+        extracted = (
+            executor.map(extract_file_features, miss_paths) if executor else map(extract_file_features, miss_paths)
+        )
+        for path, label in files:
+            if path in cached:
+                matrix, block_ids = cached[path]
+            else:
+                matrix, block_ids = next(extracted)
+                if cache is not None:
+                    cache.store(keys[path], matrix, block_ids)
+            offset = len(session_ids)
+            X[offset : offset + len(block_ids)] = matrix
+            labels[offset : offset + len(block_ids)] = label
+            session_ids.extend(block_ids)
+            logging.debug("Loaded %s (%d rows)", path, len(block_ids))
+    finally:
+        if executor:
+            executor.shutdown()
+
+    n_rows = len(session_ids)
+    X = X[:n_rows]
+    labels = labels[:n_rows]
+    if cache is not None:
+        logging.info(
+            "Feature cache: hits=%d misses=%d (cached rows=%d)", cache.hits, cache.misses, cache.cached_rows
+        )
+    logging.info("Dataset built: %d rows from %d files (workers=%d)", n_rows, len(paths), workers)
+    return pd.DataFrame(X, columns=FEATURE_NAMES, copy=False), labels, session_ids
+
+
+def load_feature_store_dataset(
+    data_dir: Path, since: str | None = None
+) -> Tuple[pd.DataFrame, List[int], List[str]]:
+    """推論時に保存された特徴量ストアから学習データを組み立てる。"""
+    matrices: List[np.ndarray] = []
     labels: List[int] = []
     session_ids: List[str] = []
 
-    for cls, label in [("bot", 0), ("human", 1)]:
+    for cls, label in [("bot", BOT_LABEL), ("human", HUMAN_LABEL)]:
         cls_dir = data_dir / cls
         if not cls_dir.exists():
             continue
-        for file in cls_dir.glob("*.jsonl"):
-            records = load_jsonl_file(file)
-            for rec in records:
-                feats = extract_features(rec)
-                all_features.append(feats)
-                labels.append(label)
-                session_ids.append(rec.get("session_id", ""))
-
-    df = pd.DataFrame(all_features)
-    return df, labels, session_ids
-
-
-def prepare_features(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
-    cat_col = "context_action_type"
-    dummies = pd.get_dummies(df[cat_col], prefix="action_type")
-    df_numeric = df.drop(columns=[cat_col]).copy()
-    df_processed = pd.concat([df_numeric, dummies], axis=1)
-
-    # DEFAULT_FEATURE_NAMES の順番にそろえ、欠損は 0 で埋める
-    for name in FEATURE_NAMES:
-        if name not in df_processed.columns:
-            df_processed[name] = 0.0
-    df_processed = df_processed[FEATURE_NAMES]
-
-    feature_names = list(df_processed.columns)
-    return df_processed, feature_names
-
-
-def train_and_evaluate(X: pd.DataFrame, y: List[int], groups: List[str]) -> lgb.LGBMClassifier:
-    clf = lgb.LGBMClassifier(
-        objective="binary",
-        n_estimators=500,
-        learning_rate=0.05,
-        num_leaves=31,
-        max_depth=-1,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        class_weight="balanced",
-        random_state=42,
-        verbosity=-1,
-    )
+        for block_path in find_feature_blocks(cls_dir, FEATURE_SCHEMA_VERSION):
+            if since is not None and file_date(block_path) < since:
+                continue
+            block = load_feature_block(block_path)
+            if block.feature_names != FEATURE_NAMES:
+                logging.warning("特徴量名が FEATURE_NAMES と一致しないためスキップします: %s", block_path)
+                continue
+            mask = block.labels == label
+            matrices.append(np.asarray(block.features[mask]))
+            labels.extend([label] * int(mask.sum()))
+            session_ids.extend(sid for sid, keep in zip(block.session_ids, mask) if keep)
+            logging.info("特徴量ストアを読み込みました: %s (%d rows)", block_path, int(mask.sum()))
+
+    if not matrices:
+        return pd.DataFrame(columns=FEATURE_NAMES), labels, session_ids
+    X = pd.DataFrame(np.concatenate(matrices), columns=FEATURE_NAMES)
+    return X, labels, session_ids
+
+
+def balanced_weights(y: np.ndarray) -> np.ndarray:
+    """class_weight="balanced" と同じ n_samples / (n_classes * count) の行重み。"""
+    classes, counts = np.unique(y, return_counts=True)
+    class_weight = {cls: len(y) / (len(classes) * count) for cls, count in zip(classes, counts)}
+    return np.array([class_weight[label] for label in y], dtype=np.float32)
+
+
+def evaluate_predictions(y_true: np.ndarray, probs: np.ndarray) -> Dict[str, float]:
+    preds = (probs >= 0.5).astype(int)
+    try:
+        auc = roc_auc_score(y_true, probs)
+    except ValueError:
+        auc = float("nan")
+    _, _, f1, _ = precision_recall_fscore_support(y_true, preds, average="binary", zero_division=0)
+    return {"accuracy": float(accuracy_score(y_true, preds)), "auc": float(auc), "f1": float(f1)}
 
+
+@dataclass
+class FoldData:
+    """GroupKFold の 1 fold 分（学習/検証用 Dataset は全データ Dataset の subset）。"""
+
+    fold: int
+    train_set: lgb.Dataset
+    valid_set: lgb.Dataset
+    X_val: pd.DataFrame
+    y_val: np.ndarray
+
+
+def build_folds(X: pd.DataFrame, y: np.ndarray, groups: List[str]) -> Tuple[lgb.Dataset, List[FoldData]]:
+    """特徴量のビン化を全データで 1 回だけ行い、各 fold をその subset として組み立てる。"""
     n_splits = min(3, len(set(groups)))
     gkf = GroupKFold(n_splits=n_splits if n_splits > 1 else 2)
-    accuracies: List[float] = []
-    aucs: List[float] = []
-    f1s: List[float] = []
 
+    # 重みは親に持たせない（subset 構築時に親の重みで上書きされるため）。全データ学習の直前に設定する。
+    full_set = lgb.Dataset(X, label=y, feature_name=list(X.columns), free_raw_data=False)
+    full_set.construct()
+
+    # subset の構築は親 Dataset を参照するためメインスレッドで済ませる。
+    # 行重みは class_weight="balanced" と同様に各 fold の学習ラベルから計算し直す。
+    # construct 前に設定した重みは subset の構築で捨てられるため、構築後に設定する。
+    folds: List[FoldData] = []
     for fold, (train_idx, val_idx) in enumerate(gkf.split(X, y, groups)):
-        X_train, X_val = X.iloc[train_idx], X.iloc[val_idx]
-        y_train = [y[i] for i in train_idx]
-        y_val = [y[i] for i in val_idx]
-
-        clf.fit(X_train, y_train)
-        probs = clf.predict_proba(X_val)[:, 1]
-        preds = (probs >= 0.5).astype(int)
-
-        acc = accuracy_score(y_val, preds)
-        try:
-            auc = roc_auc_score(y_val, probs)
-        except ValueError:
-            auc = float("nan")
-        precision, recall, f1, _ = precision_recall_fscore_support(
-            y_val, preds, average="binary", zero_division=0
+        train_set = full_set.subset(train_idx.tolist()).construct()
+        train_set.set_weight(balanced_weights(y[train_idx]))
+        folds.append(
+            FoldData(
+                fold=fold + 1,
+                train_set=train_set,
+                valid_set=full_set.subset(val_idx.tolist()).construct(),
+                X_val=X.iloc[val_idx],
+                y_val=y[val_idx],
+            )
+        )
+    return full_set, folds
+
+
+def measure_latency(
+    booster: lgb.Booster, X_sample: np.ndarray, num_iteration: int | None = None, repeats: int = 200
+) -> Dict[str, float]:
+    """推論 API と同じ 1 行 predict のレイテンシとバッチ時の 1 行あたりコストを測る。"""
+    rows = np.asarray(X_sample, dtype=float)
+    booster.predict(rows[:1], num_iteration=num_iteration)  # ウォームアップ
+    timings = []
+    for i in range(repeats):
+        row = rows[i % len(rows)].reshape(1, -1)
+        start = time.perf_counter()
+        booster.predict(row, num_iteration=num_iteration)
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    booster.predict(rows, num_iteration=num_iteration)
+    batch = time.perf_counter() - start
+    return {
+        "num_trees": int(num_iteration or booster.num_trees()),
+        "single_row_p50_ms": float(np.percentile(timings, 50) * 1000),
+        "single_row_p95_ms": float(np.percentile(timings, 95) * 1000),
+        "batch_per_row_us": float(batch / len(rows) * 1e6),
+    }
+
+
+def _train_fold(
+    data: FoldData,
+    params: Dict[str, Any],
+    num_boost_round: int,
+    early_stopping_rounds: int = 0,
+) -> Tuple[lgb.Booster, Dict[str, Any]]:
+    start = time.perf_counter()
+    callbacks = []
+    valid_sets = None
+    if early_stopping_rounds > 0:
+        callbacks.append(lgb.early_stopping(early_stopping_rounds, verbose=False))
+        valid_sets = [data.valid_set]
+    booster = lgb.train(
+        {**params, "metric": "binary_logloss"},
+        data.train_set,
+        num_boost_round=num_boost_round,
+        valid_sets=valid_sets,
+        callbacks=callbacks,
+    )
+    best_iteration = booster.best_iteration or num_boost_round
+    probs = booster.predict(data.X_val, num_iteration=best_iteration)
+    result: Dict[str, Any] = {"fold": data.fold, **evaluate_predictions(data.y_val, probs)}
+    result["best_iteration"] = int(best_iteration)
+    result["wall_clock_sec"] = time.perf_counter() - start
+    return booster, result
+
+
+def run_folds(
+    folds: List[FoldData],
+    params: Dict[str, Any],
+    num_boost_round: int,
+    num_threads: int,
+    parallel_folds: int = 0,
+    early_stopping_rounds: int = 0,
+) -> Tuple[List[lgb.Booster], List[Dict[str, Any]], Dict[str, Any]]:
+    """fold を並列スレッドで学習する。各 fold には num_threads // 並列数 のスレッドを割り当てる。"""
+    parallel = max(1, min(parallel_folds or len(folds), len(folds)))
+    fold_params = {**params, "num_threads": max(1, num_threads // parallel)}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = [
+            executor.submit(_train_fold, data, fold_params, num_boost_round, early_stopping_rounds)
+            for data in folds
+        ]
+        outputs = [future.result() for future in futures]
+    timing = {
+        "cv_wall_clock_sec": time.perf_counter() - start,
+        "parallel_folds": parallel,
+        "threads_per_fold": fold_params["num_threads"],
+    }
+    return [booster for booster, _ in outputs], [result for _, result in outputs], timing
+
+
+def _average(results: List[Dict[str, Any]]) -> Dict[str, float]:
+    return {name: float(np.nanmean([r[name] for r in results])) for name in ("accuracy", "auc", "f1")}
+
+
+def sample_params(rng: np.random.Generator) -> Dict[str, Any]:
+    """探索空間からパラメータを 1 組サンプリングする。"""
+    space: Dict[str, List[Any]] = {
+        "num_leaves": [7, 15, 31, 63],
+        "learning_rate": [0.02, 0.05, 0.1, 0.2],
+        "max_depth": [-1, 3, 4, 6, 8],
+        "min_data_in_leaf": [5, 10, 20, 40],
+        "feature_fraction": [0.6, 0.8, 1.0],
+        "lambda_l2": [0.0, 0.1, 1.0],
+    }
+    sampled = {name: values[int(rng.integers(len(values)))] for name, values in space.items()}
+    # numpy スカラーを JSON に書けるよう Python 型へ
+    sampled = {name: value.item() if hasattr(value, "item") else value for name, value in sampled.items()}
+    return {**BASE_PARAMS, **sampled}
+
+
+def search_hyperparameters(
+    folds: List[FoldData], X_sample: np.ndarray, args: argparse.Namespace
+) -> Dict[str, Any]:
+    """Successive halving でパラメータを探索する。
+
+    各ラウンドで生存候補を GroupKFold + early stopping (binary_logloss) で評価し、
+    ``AUC - latency_weight * 1 行推論 p50 [ms]`` の上位 1/eta だけを次の予算（ラウンド数 x eta）へ進める。
+    """
+    rng = np.random.default_rng(args.random_state)
+    candidates = [sample_params(rng) for _ in range(args.search_candidates)]
+    budget = min(args.search_min_rounds, args.search_max_rounds)
+    rungs: List[Dict[str, Any]] = []
+
+    while True:
+        results = []
+        for params in candidates:
+            boosters, fold_results, _ = run_folds(
+                folds,
+                params,
+                budget,
+                args.num_threads,
+                args.parallel_folds,
+                early_stopping_rounds=args.early_stopping_rounds,
+            )
+            best_iteration = int(np.ceil(np.mean([r["best_iteration"] for r in fold_results])))
+            latency = measure_latency(boosters[0], X_sample, num_iteration=best_iteration)
+            average = _average(fold_results)
+            auc = average["auc"] if not np.isnan(average["auc"]) else 0.0
+            results.append(
+                {
+                    "params": params,
+                    "num_boost_round": best_iteration,
+                    "cv": average,
+                    "latency": latency,
+                    "objective": auc - args.latency_weight * latency["single_row_p50_ms"],
+                }
+            )
+        results.sort(key=lambda r: r["objective"], reverse=True)
+        rungs.append({"budget": budget, "candidates": len(candidates), "best_objective": results[0]["objective"]})
+        logging.info(
+            "Search rung: budget=%d candidates=%d best objective=%.4f (AUC=%.4f, p50=%.3fms, trees=%d)",
+            budget,
+            len(candidates),
+            results[0]["objective"],
+            results[0]["cv"]["auc"],
+            results[0]["latency"]["single_row_p50_ms"],
+            results[0]["num_boost_round"],
         )
 
-        accuracies.append(acc)
-        aucs.append(auc)
-        f1s.append(f1)
-        logging.info("Fold %d: accuracy=%.4f, AUC=%.4f, F1=%.4f", fold + 1, acc, auc, f1)
+        if len(results) == 1 or budget >= args.search_max_rounds:
+            break
+        candidates = [r["params"] for r in results[: max(1, len(results) // args.search_eta)]]
+        budget = min(budget * args.search_eta, args.search_max_rounds)
+
+    best = results[0]
+    return {
+        "params": best["params"],
+        "num_boost_round": best["num_boost_round"],
+        "objective": best["objective"],
+        "cv": best["cv"],
+        "latency": best["latency"],
+        "latency_weight": args.latency_weight,
+        "rungs": rungs,
+    }
 
-    logging.info("Average accuracy: %.4f", float(np.nanmean(accuracies)))
-    logging.info("Average AUC:      %.4f", float(np.nanmean(aucs)))
-    logging.info("Average F1:       %.4f", float(np.nanmean(f1s)))
 
-    clf.fit(X, y)
-    return clf
+def train_and_evaluate(
+    full_set: lgb.Dataset,
+    folds: List[FoldData],
+    y: np.ndarray,
+    params: Dict[str, Any] | None = None,
+    num_boost_round: int = NUM_BOOST_ROUND,
+    num_threads: int = 1,
+    parallel_folds: int = 0,
+) -> Tuple[lgb.Booster, Dict[str, Any]]:
+    """GroupKFold を並列に評価し、全データで再学習した Booster と CV 指標を返す。"""
+    params = params or BASE_PARAMS
+    _, folds_results, timing = run_folds(folds, params, num_boost_round, num_threads, parallel_folds)
+
+    for result in folds_results:
+        logging.info(
+            "Fold %d: accuracy=%.4f, AUC=%.4f, F1=%.4f (%.2fs)",
+            result["fold"],
+            result["accuracy"],
+            result["auc"],
+            result["f1"],
+            result["wall_clock_sec"],
+        )
+    average = _average(folds_results)
+    logging.info("Average accuracy: %.4f", average["accuracy"])
+    logging.info("Average AUC:      %.4f", average["auc"])
+    logging.info("Average F1:       %.4f", average["f1"])
+    logging.info(
+        "CV wall-clock: %.2fs (%d folds, parallel=%d, threads/fold=%d)",
+        timing["cv_wall_clock_sec"],
+        len(folds_results),
+        timing["parallel_folds"],
+        timing["threads_per_fold"],
+    )
+
+    full_set.set_weight(balanced_weights(np.asarray(y)))
+    full_start = time.perf_counter()
+    booster = lgb.train({**params, "num_threads": num_threads}, full_set, num_boost_round=num_boost_round)
+    full_wall_clock = time.perf_counter() - full_start
+    logging.info("Full refit wall-clock: %.2fs", full_wall_clock)
+
+    metrics = {
+        "cv_folds": len(folds_results),
+        "folds": folds_results,
+        "average": average,
+        **timing,
+        "full_fit_wall_clock_sec": full_wall_clock,
+        "num_boost_round": num_boost_round,
+    }
+    return booster, metrics
+
+
+def load_base_booster(path: Path) -> lgb.Booster:
+    """追加学習の起点モデルを Booster として読み込む（pickle の LGBMClassifier / Booster / テキスト形式）。"""
+    if path.suffix in {".txt", ".model"}:
+        return lgb.Booster(model_file=str(path))
+    model = joblib.load(path)
+    if isinstance(model, lgb.Booster):
+        return model
+    if hasattr(model, "booster_"):
+        return model.booster_
+    raise TypeError(f"Unsupported base model type: {type(model)!r}")
+
+
+def _holdout_metrics(y_true: np.ndarray, probs: np.ndarray) -> Dict[str, float]:
+    metrics = evaluate_predictions(y_true, probs)
+    metrics["logloss"] = float(log_loss(y_true, np.clip(probs, 1e-7, 1 - 1e-7), labels=[BOT_LABEL, HUMAN_LABEL]))
+    return metrics
+
+
+def warm_start_train(
+    X: pd.DataFrame, y: np.ndarray, groups: List[str], args: argparse.Namespace
+) -> Tuple[lgb.Booster, Dict[str, Any], bool]:
+    """ベースモデルから boosting を継続し、(更新モデル, 指標, 回帰なしか) を返す。
+
+    新しいログをセッション単位で学習用とホールドアウトに分け、ホールドアウトでベースモデルと比較する。
+    AUC が regression_tolerance を超えて悪化した場合（AUC が計算できなければ logloss が悪化した場合）は回帰とみなす。
+    """
+    base = load_base_booster(args.base_model)
+    base_trees = base.num_trees()
+
+    splitter = GroupShuffleSplit(n_splits=1, test_size=args.holdout_ratio, random_state=args.random_state)
+    train_idx, holdout_idx = next(splitter.split(X, y, groups))
+    X_train, y_train = X.iloc[train_idx], y[train_idx]
+    X_holdout, y_holdout = X.iloc[holdout_idx], y[holdout_idx]
+
+    train_set = lgb.Dataset(X_train, label=y_train, weight=balanced_weights(y_train), feature_name=list(X.columns))
+    start = time.perf_counter()
+    booster = lgb.train(
+        {**BASE_PARAMS, "num_threads": args.num_threads},
+        train_set,
+        num_boost_round=args.warm_start_rounds,
+        init_model=base,
+    )
+    wall_clock = time.perf_counter() - start
+
+    base_metrics = _holdout_metrics(y_holdout, base.predict(X_holdout))
+    updated_metrics = _holdout_metrics(y_holdout, booster.predict(X_holdout))
+    if np.isnan(base_metrics["auc"]) or np.isnan(updated_metrics["auc"]):
+        passed = updated_metrics["logloss"] <= base_metrics["logloss"] + args.regression_tolerance
+    else:
+        passed = updated_metrics["auc"] >= base_metrics["auc"] - args.regression_tolerance
+
+    logging.info(
+        "Warm start: %d -> %d trees in %.2fs (train rows=%d, holdout rows=%d)",
+        base_trees,
+        booster.num_trees(),
+        wall_clock,
+        len(train_idx),
+        len(holdout_idx),
+    )
+    logging.info(
+        "Holdout base:    AUC=%.4f logloss=%.4f", base_metrics["auc"], base_metrics["logloss"]
+    )
+    logging.info(
+        "Holdout updated: AUC=%.4f logloss=%.4f", updated_metrics["auc"], updated_metrics["logloss"]
+    )
+
+    metrics = {
+        "warm_start": {
+            "base_model": str(args.base_model),
+            "base_num_trees": base_trees,
+            "added_rounds": args.warm_start_rounds,
+            "since": args.since,
+            "train_rows": int(len(train_idx)),
+            "holdout_rows": int(len(holdout_idx)),
+            "wall_clock_sec": wall_clock,
+            "holdout": {"base": base_metrics, "updated": updated_metrics},
+            "regression_tolerance": args.regression_tolerance,
+            "passed": passed,
+        },
+        "params": BASE_PARAMS,
+    }
+    return booster, metrics, passed
 
 
 def save_artifacts(
-    model: lgb.LGBMClassifier,
+    model: lgb.Booster,
     feature_names: List[str],
     metrics: Dict[str, Any],
     args: argparse.Namespace,
@@ -249,6 +877,7 @@ def save_artifacts(
 
     metadata = {
         "model_format": "pickle",
+        "feature_schema_version": FEATURE_SCHEMA_VERSION,
         "feature_names": feature_names,
         "label_mapping": {"human": HUMAN_LABEL, "bot": BOT_LABEL},
     }
@@ -274,20 +903,77 @@ def main() -> None:
         args.output_dir = PROJECT_ROOT / args.output_dir
     if not args.data_dir.is_absolute():
         args.data_dir = PROJECT_ROOT / args.data_dir
+    if not args.cache_dir.is_absolute():
+        args.cache_dir = PROJECT_ROOT / args.cache_dir
+    if not args.base_model.is_absolute():
+        args.base_model = PROJECT_ROOT / args.base_model
 
     logging.basicConfig(
         level=getattr(logging, args.log_level.upper()),
         format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
     )
 
-    df, labels, session_ids = build_dataset(args.data_dir)
-    if df.empty:
-        raise RuntimeError("No data found to train on")
-    X_processed, feature_names = prepare_features(df)
-
-    model = train_and_evaluate(X_processed, labels, session_ids)
+    if args.warm_start:
+        base_metadata_path = args.base_model.parent / "lightgbm_metadata.json"
+        if base_metadata_path.exists():
+            base_features = json.loads(base_metadata_path.read_text(encoding="utf-8")).get("feature_names")
+            if base_features and base_features != FEATURE_NAMES:
+                raise RuntimeError("Base model feature_names do not match FEATURE_NAMES; retrain from scratch")
+        if args.since is None:
+            args.since = datetime.utcfromtimestamp(args.base_model.stat().st_mtime).strftime("%Y%m%d")
+        logging.info("Warm start from %s using logs since %s", args.base_model, args.since)
+
+    if args.feature_store:
+        X_processed, labels, session_ids = load_feature_store_dataset(args.data_dir, since=args.since)
+        if X_processed.empty:
+            raise RuntimeError("No feature store blocks found to train on")
+    else:
+        cache = None if args.no_cache else FeatureCache(args.cache_dir)
+        X_processed, labels, session_ids = build_dataset(
+            args.data_dir, workers=args.workers, cache=cache, since=args.since
+        )
+        if X_processed.empty:
+            raise RuntimeError("No data found to train on")
+
+    labels = np.asarray(labels)
+    feature_names = list(FEATURE_NAMES)
+
+    if args.warm_start:
+        model, metrics, passed = warm_start_train(X_processed, labels, session_ids, args)
+        if not passed:
+            logging.error("Holdout regression detected; the updated model was not saved")
+            raise SystemExit(1)
+        metrics["latency_profile"] = measure_latency(model, X_processed.to_numpy()[:512])
+        artifact_dir = save_artifacts(model, feature_names, metrics, args)
+        logging.info("Warm start finished. Model saved at %s", artifact_dir / args.model_name)
+        return
+
+    full_set, folds = build_folds(X_processed, labels, session_ids)
+    sample_rows = X_processed.to_numpy()[: min(len(X_processed), 512)]
+
+    params = dict(BASE_PARAMS)
+    num_boost_round = NUM_BOOST_ROUND
+    search_result = None
+    if args.search:
+        search_result = search_hyperparameters(folds, sample_rows, args)
+        params = search_result["params"]
+        num_boost_round = search_result["num_boost_round"]
+        logging.info("Selected params: %s (num_boost_round=%d)", params, num_boost_round)
+
+    model, metrics = train_and_evaluate(
+        full_set,
+        folds,
+        labels,
+        params=params,
+        num_boost_round=num_boost_round,
+        num_threads=args.num_threads,
+        parallel_folds=args.parallel_folds,
+    )
+    metrics["params"] = params
+    metrics["latency_profile"] = measure_latency(model, sample_rows)
+    if search_result is not None:
+        metrics["search"] = search_result
 
-    metrics = {"cv_folds": min(3, len(set(session_ids)))}
     artifact_dir = save_artifacts(model, feature_names, metrics, args)
     logging.info("Training finished. Model saved at %s", artifact_dir / args.model_name)
 
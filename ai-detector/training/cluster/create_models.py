@@ -4,8 +4,11 @@
 scikit-learn 1.7.1で確実に新しいモデルを作成
 """
 
+import argparse
 import json
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
@@ -13,7 +16,7 @@ import joblib
 import numpy as np
 import pandas as pd
 import sklearn
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 
@@ -36,6 +39,27 @@ PURCHASE_FEATURES = [
     "pc1",
     "pc2",
 ]
+CLUSTER_FEATURES = ["age", "gender", "prefecture"]
+N_CLUSTERS = 4
+CONTAMINATION = 0.15
+THRESHOLD_PERCENTILE = 20
+
+# CSV 読み込み時のコンパクトな型（数千万行でもメモリに載るように）
+CSV_DTYPES = {
+    "age": "uint8",
+    "gender": "uint8",
+    "prefecture": "uint8",
+    "product_category": "uint8",
+    "quantity": "uint16",
+    "price": "int32",
+    "total_amount": "int64",
+    "purchase_time": "uint8",
+    "limited_flag": "uint8",
+    "payment_method": "uint8",
+    "manufacturer": "uint16",
+    "pc1": "float32",
+    "pc2": "float32",
+}
 
 # ロギング設定
 logging.basicConfig(level=logging.INFO)
@@ -49,71 +73,110 @@ def verify_sklearn_version():
         logger.warning(f"期待されるバージョン: 1.7.1, 実際のバージョン: {version}")
     return version
 
-def load_data():
-    """データを読み込み"""
-    if not DATA_PATH.exists():
-        raise FileNotFoundError(f"データファイルが見つかりません: {DATA_PATH}")
-
-    df = pd.read_csv(DATA_PATH)
-    logger.info(f"データを読み込みました: {len(df)}件")
+def parse_args():
+    parser = argparse.ArgumentParser(description="クラスタ異常検知モデル (KMeans + IsolationForest) を作成する")
+    parser.add_argument("--data-path", type=Path, default=DATA_PATH, help="購入データ CSV")
+    parser.add_argument("--chunksize", type=int, default=1_000_000, help="CSV を読み込むチャンク行数")
+    parser.add_argument(
+        "--n-jobs",
+        type=int,
+        default=min(N_CLUSTERS, os.cpu_count() or 1),
+        help="クラスタごとの IsolationForest を並列学習するプロセス数",
+    )
+    parser.add_argument(
+        "--minibatch-threshold",
+        type=int,
+        default=1_000_000,
+        help="行数がこれを超えたら KMeans の代わりに MiniBatchKMeans を使う",
+    )
+    return parser.parse_args()
+
+def load_data(data_path=DATA_PATH, chunksize=1_000_000):
+    """データをチャンク単位・コンパクトな型で読み込み"""
+    if not data_path.exists():
+        raise FileNotFoundError(f"データファイルが見つかりません: {data_path}")
+
+    chunks = pd.read_csv(data_path, usecols=PURCHASE_FEATURES, dtype=CSV_DTYPES, chunksize=chunksize)
+    df = pd.concat(chunks, ignore_index=True)
+    logger.info(f"データを読み込みました: {len(df)}件 ({df.memory_usage(deep=True).sum() / 1e6:.1f} MB)")
     logger.info(f"データの列: {list(df.columns)}")
     return df
 
-def create_kmeans_model(df):
-    """KMeansモデルを作成"""
+def create_kmeans_model(df, minibatch_threshold=1_000_000):
+    """KMeansモデルを作成（大規模データでは MiniBatchKMeans）"""
     # クラスタリング用の特徴量（年齢、性別、都道府県）
-    cluster_features = df[['age', 'gender', 'prefecture']].values
+    cluster_features = df[CLUSTER_FEATURES].to_numpy(dtype=np.float64)
 
     # KMeansモデルを作成（4クラスタに戻す）
-    kmeans = KMeans(n_clusters=4, random_state=42, n_init=10)
+    if len(df) > minibatch_threshold:
+        kmeans = MiniBatchKMeans(n_clusters=N_CLUSTERS, random_state=42, n_init=3, batch_size=10_000)
+    else:
+        kmeans = KMeans(n_clusters=N_CLUSTERS, random_state=42, n_init=10)
     kmeans.fit(cluster_features)
 
-    logger.info(f"KMeansモデルを作成しました: {kmeans.n_clusters}クラスタ")
+    logger.info(f"{type(kmeans).__name__}モデルを作成しました: {kmeans.n_clusters}クラスタ")
     return kmeans
 
-def create_isolation_forest_models(df, kmeans):
-    """各クラスタ用のIsolationForestモデルを作成"""
-    # クラスタIDを予測
-    cluster_features = df[['age', 'gender', 'prefecture']].values
-    cluster_labels = kmeans.predict(cluster_features)
-    df['cluster_id'] = cluster_labels
+def fit_cluster_model(cluster_id, X, seen_categories):
+    """1 クラスタ分の StandardScaler + IsolationForest を学習（プロセスプールのワーカー）"""
+    # 標準化
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+
+    # IsolationForestモデルを作成
+    # contamination="auto" で学習して fit 内部のスコア計算を省き、
+    # score_samples の 1 回のパスから offset_（contamination=0.15 相当）と閾値を求める
+    isolation_forest = IsolationForest(
+        contamination="auto",
+        random_state=42,
+        n_estimators=200
+    )
+    isolation_forest.fit(X_scaled)
+    raw_scores = isolation_forest.score_samples(X_scaled)
+    isolation_forest.offset_ = np.percentile(raw_scores, 100.0 * CONTAMINATION)  # 異常寄りに傾けて境界を厳しめに
+    isolation_forest.set_params(contamination=CONTAMINATION)
+
+    # 閾値を計算（decision_functionの20%分位点でやや厳しめ）
+    threshold = np.percentile(raw_scores - isolation_forest.offset_, THRESHOLD_PERCENTILE)
+
+    return cluster_id, {
+        'scaler': scaler,
+        'isolation_forest': isolation_forest,
+        'threshold': threshold,
+        'seen_categories': seen_categories,
+    }
 
-    cluster_models = {}
+def create_isolation_forest_models(df, kmeans, n_jobs=1):
+    """各クラスタ用のIsolationForestモデルをプロセス並列で作成"""
+    # クラスタIDを予測
+    cluster_labels = kmeans.predict(df[CLUSTER_FEATURES].to_numpy(dtype=np.float64))
 
-    for cluster_id in range(4):  # 4クラスタに戻す
-        cluster_data = df[df['cluster_id'] == cluster_id]
+    tasks = []
+    for cluster_id in range(N_CLUSTERS):  # 4クラスタに戻す
+        mask = cluster_labels == cluster_id
+        n_rows = int(mask.sum())
 
-        if len(cluster_data) < 5:  # データが少なすぎる場合はスキップ
-            logger.warning(f"クラスタ {cluster_id} のデータが少なすぎます: {len(cluster_data)}件")
+        if n_rows < 5:  # データが少なすぎる場合はスキップ
+            logger.warning(f"クラスタ {cluster_id} のデータが少なすぎます: {n_rows}件")
             continue
 
         # 購入データを取得
-        X = cluster_data[PURCHASE_FEATURES].values
-
-        # 標準化
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
+        cluster_data = df.loc[mask, PURCHASE_FEATURES]
+        seen_categories = sorted(int(c) for c in cluster_data["product_category"].unique())
+        tasks.append((cluster_id, cluster_data.to_numpy(dtype=np.float64), seen_categories))
 
-        # IsolationForestモデルを作成
-        isolation_forest = IsolationForest(
-            contamination=0.15,  # 異常寄りに傾けて境界を厳しめに
-            random_state=42,
-            n_estimators=200
+    cluster_models = {}
+    if n_jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks))) as executor:
+            results = list(executor.map(fit_cluster_model, *zip(*tasks)))
+    else:
+        results = [fit_cluster_model(*task) for task in tasks]
+
+    for (cluster_id, model_data), (_, X, _) in zip(results, tasks):
+        cluster_models[cluster_id] = model_data
+        logger.info(
+            f"クラスタ {cluster_id} のモデルを作成しました: {len(X)}件, 閾値={model_data['threshold']:.6f}"
         )
-        isolation_forest.fit(X_scaled)
-
-        # 閾値を計算（decision_functionの20%分位点でやや厳しめ）
-        scores = isolation_forest.decision_function(X_scaled)
-        threshold = np.percentile(scores, 20)
-
-        cluster_models[cluster_id] = {
-            'scaler': scaler,
-            'isolation_forest': isolation_forest,
-            'threshold': threshold,
-            'seen_categories': sorted(cluster_data["product_category"].unique().tolist()),
-        }
-
-        logger.info(f"クラスタ {cluster_id} のモデルを作成しました: {len(cluster_data)}件, 閾値={threshold:.6f}")
 
     return cluster_models
 
@@ -121,6 +184,7 @@ def create_metadata(kmeans, cluster_models, sklearn_version):
     """メタデータを作成"""
     metadata = {
         "kmeans": {
+            "algorithm": type(kmeans).__name__,
             "n_clusters": kmeans.n_clusters,
             "n_features_in_": kmeans.n_features_in_,
             "random_state": kmeans.random_state
@@ -185,18 +249,19 @@ def verify_models():
 
 def main():
     """メイン処理"""
+    args = parse_args()
     try:
         # scikit-learnのバージョンを確認
         sklearn_version = verify_sklearn_version()
 
         # データを読み込み
-        df = load_data()
+        df = load_data(args.data_path, args.chunksize)
 
         # KMeansモデルを作成
-        kmeans = create_kmeans_model(df)
+        kmeans = create_kmeans_model(df, args.minibatch_threshold)
 
         # 各クラスタ用のIsolationForestモデルを作成
-        cluster_models = create_isolation_forest_models(df, kmeans)
+        cluster_models = create_isolation_forest_models(df, kmeans, args.n_jobs)
 
         # メタデータを作成
         metadata = create_metadata(kmeans, cluster_models, sklearn_version)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+商品説明文の埋め込みをバッチ生成し、ディスクにキャッシュするユーティリティ
+
+キャッシュキーは「モデル名 + 説明文」の SHA-256 で、1 件ずつ ``.npy`` として保存します。
+説明文やモデルが変わらない限り再エンコードは行われないため、
+大規模カタログの再実行では新規・変更分の説明文だけがエンコードされます。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Protocol, Sequence
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+EMBEDDING_CACHE_DIR = BASE_DIR / "embedding_cache"
+DEFAULT_BATCH_SIZE = 64
+
+
+class TextEncoder(Protocol):
+    """説明文のリストを (件数 x 次元) の行列に変換するエンコーダ"""
+
+    model_name: str
+
+    def encode(self, texts: Sequence[str], batch_size: int) -> np.ndarray:
+        ...
+
+
+class SentenceTransformerEncoder:
+    """SentenceTransformer を用いたエンコーダ（初回 encode 時にモデルを読み込む）"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+
+    def load(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def encode(self, texts: Sequence[str], batch_size: int) -> np.ndarray:
+        model = self.load()
+        return np.asarray(
+            model.encode(list(texts), batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False),
+            dtype=np.float32,
+        )
+
+
+class EmbeddingCache:
+    """内容アドレス方式の埋め込みキャッシュ（1 埋め込み = 1 ``.npy``）"""
+
+    def __init__(self, cache_dir: str | Path = EMBEDDING_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+
+    @staticmethod
+    def key(text: str, model_name: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        # 1 ディレクトリのファイル数が膨らまないよう先頭 2 文字で分割
+        return self.cache_dir / key[:2] / f"{key}.npy"
+
+    def get(self, key: str) -> np.ndarray | None:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            return np.load(path)
+        except (OSError, ValueError):
+            # 書き込み途中のファイルなどは再生成する
+            return None
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+        np.save(tmp_path, np.asarray(vector, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+
+@dataclass
+class EncodeStats:
+    """キャッシュヒット / ミス件数"""
+
+    hits: int = 0
+    misses: int = 0
+
+
+def encode_texts(
+    encoder: TextEncoder,
+    texts: Sequence[str],
+    *,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    cache: EmbeddingCache | None = None,
+) -> tuple[np.ndarray, EncodeStats]:
+    """説明文をバッチでエンコードする。キャッシュ済みの説明文はエンコードしない。
+
+    Returns:
+        (埋め込み行列 float32, キャッシュ統計)。行の順序は ``texts`` と同じ。
+    """
+    stats = EncodeStats()
+    vectors: list[np.ndarray | None] = [None] * len(texts)
+    pending: dict[str, list[int]] = {}
+
+    for index, text in enumerate(texts):
+        if cache is not None:
+            cached = cache.get(cache.key(text, encoder.model_name))
+            if cached is not None:
+                vectors[index] = cached
+                stats.hits += 1
+                continue
+        # 同一テキストは 1 回だけエンコードする
+        pending.setdefault(text, []).append(index)
+
+    missing = list(pending)
+    stats.misses = len(texts) - stats.hits
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        encoded = np.asarray(encoder.encode(batch, batch_size), dtype=np.float32)
+        for text, vector in zip(batch, encoded):
+            if cache is not None:
+                cache.put(cache.key(text, encoder.model_name), vector)
+            for index in pending[text]:
+                vectors[index] = vector
+
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32), stats
+    return np.vstack(vectors).astype(np.float32, copy=False), stats
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+商品カテゴリの射影テーブル（category_projection.json）を出力するスクリプト
+
+API はこのテーブルを起動時に読み込み、pc1/pc2 が未指定のリクエストを
+商品ID → 商品カテゴリの順に O(1) で補完します。
+
+射影の取得元:
+- 既定: クラスタ学習用 CSV（``--training-data``）のカテゴリ別中央値。
+  学習済み IsolationForest と同じ座標系になる。
+- ``--pca-csv``: PCA 結果 CSV の座標をそのまま使う。学習データの中央値と座標系が一致しない
+  （``--tolerance`` を超えてずれるカテゴリがある）場合は書き出さずにエラー終了する。
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent
+PCA_RESULTS_DIR = BASE_DIR / "pca_results"
+PROJECT_DIR = BASE_DIR.parents[1]
+DEFAULT_OUTPUT = PROJECT_DIR / "models" / "persona" / "category_projection.json"
+DEFAULT_TRAINING_DATA = PROJECT_DIR / "training" / "cluster" / "data" / "ecommerce_clustering_data.csv"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="商品カテゴリの射影テーブルを出力する")
+    parser.add_argument(
+        "--training-data",
+        type=Path,
+        default=DEFAULT_TRAINING_DATA,
+        help="クラスタ学習用 CSV（カテゴリ別中央値を使用。--pca-csv 指定時は座標系の照合に使う）",
+    )
+    parser.add_argument("--pca-csv", type=Path, help="PCA 結果 CSV（学習データと同じ座標系のもの）")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.05, help="--pca-csv と学習データ中央値の許容差（pc1/pc2 ごと）"
+    )
+    parser.add_argument("--products-csv", type=Path, help="商品ID別の射影 CSV（列: product_id, PC1, PC2）")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="出力先 JSON")
+    return parser.parse_args()
+
+
+def projection_from_pca(csv_path):
+    """PCA 結果 CSV からカテゴリ別の射影を作成"""
+    df = pd.read_csv(csv_path)
+    return {
+        str(int(row.Category_ID)): {"pc1": float(row.PC1), "pc2": float(row.PC2), "category": row.Category}
+        for row in df.itertuples(index=False)
+    }
+
+
+def scaling_mismatches(categories, reference, tolerance):
+    """reference（学習データ中央値）と tolerance を超えてずれる、または欠けているカテゴリを返す"""
+    mismatches = []
+    for category_id, expected in reference.items():
+        actual = categories.get(category_id)
+        if actual is None or any(abs(actual[axis] - expected[axis]) > tolerance for axis in ("pc1", "pc2")):
+            mismatches.append(category_id)
+    return mismatches
+
+
+def projection_from_training_data(csv_path):
+    """クラスタ学習用 CSV からカテゴリ別中央値の射影を作成"""
+    df = pd.read_csv(csv_path, usecols=["product_category", "pc1", "pc2"])
+    medians = df.groupby("product_category")[["pc1", "pc2"]].median()
+    return {
+        str(int(category_id)): {"pc1": float(row.pc1), "pc2": float(row.pc2)}
+        for category_id, row in medians.iterrows()
+    }
+
+
+def projection_from_products(csv_path):
+    """商品ID別の射影 CSV を読み込み"""
+    df = pd.read_csv(csv_path, usecols=["product_id", "PC1", "PC2"])
+    return {
+        str(int(row.product_id)): {"pc1": float(row.PC1), "pc2": float(row.PC2)}
+        for row in df.itertuples(index=False)
+    }
+
+
+def main():
+    """メイン実行関数"""
+    args = parse_args()
+
+    if not args.training_data.exists():
+        print(f"エラー: クラスタ学習用 CSV が見つかりません: {args.training_data}")
+        sys.exit(1)
+    reference = projection_from_training_data(args.training_data)
+
+    if args.pca_csv is None:
+        source = args.training_data
+        scaling = "training_median"
+        categories = reference
+    else:
+        source = args.pca_csv
+        scaling = "pca"
+        categories = projection_from_pca(source)
+        # 学習データと座標系が異なる射影で補完すると IsolationForest の入力分布がずれるため書き出さない
+        mismatches = scaling_mismatches(categories, reference, args.tolerance)
+        if mismatches:
+            print(
+                f"エラー: {source} の座標が学習データのカテゴリ別中央値と一致しません"
+                f"（許容差 {args.tolerance}、カテゴリ: {', '.join(mismatches)}）"
+            )
+            sys.exit(1)
+
+    table = {
+        "version": 1,
+        "created_at": datetime.now().isoformat(),
+        "source": Path(source).name,
+        "scaling": scaling,
+        "categories": categories,
+    }
+    if args.products_csv is not None:
+        table["products"] = projection_from_products(args.products_csv)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    with args.output.open("w", encoding="utf-8") as f:
+        json.dump(table, f, ensure_ascii=False, indent=2)
+
+    print(f"射影テーブルを保存しました: {args.output}")
+    print(f"  - カテゴリ: {len(categories)}件")
+    print(f"  - 商品ID: {len(table.get('products', {}))}件")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,12 +13,13 @@ from urllib.error import URLError
 from urllib.request import urlretrieve
 import warnings
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from matplotlib import font_manager as fm
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
 from sklearn.preprocessing import StandardScaler
+from sklearn.utils import gen_batches
+
+from vector_store import find_latest_vector_store, load_vector_store
 warnings.filterwarnings('ignore')
 
 # 日本語フォント候補
@@ -42,6 +43,10 @@ _FONT_DIR = BASE_DIR / "fonts"
 _FONT_FILENAME = "NotoSansCJKjp-Regular.otf"
 _FONT_URL = "https://github.com/googlefonts/noto-cjk/raw/main/Sans/OTF/Japanese/NotoSansCJKjp-Regular.otf"
 
+# この件数を超えたら IncrementalPCA でチャンク単位に学習する
+INCREMENTAL_PCA_THRESHOLD = 50_000
+PCA_BATCH_SIZE = 10_000
+
 
 def _ensure_local_font() -> Path | None:
     """リポジトリ内の fonts ディレクトリに日本語フォントを配置する。"""
@@ -63,6 +68,9 @@ def _ensure_local_font() -> Path | None:
 
 def _configure_japanese_font() -> None:
     """利用可能な日本語フォントを探索して設定する。"""
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager as fm
+
     for font_name in JP_FONT_CANDIDATES:
         try:
             fm.findfont(font_name, fallback_to_default=False)
@@ -101,19 +109,53 @@ def _configure_japanese_font() -> None:
     )
 
 
-_configure_japanese_font()
+_font_configured = False
+
+
+def _load_pyplot():
+    """matplotlib を遅延読み込みし、初回のみ日本語フォントを設定する。
+
+    import 時にはフォント探索・ダウンロードを行わないため、ヘッドレス実行では
+    matplotlib 自体が読み込まれない。
+    """
+    global _font_configured
+    import matplotlib.pyplot as plt
+
+    if not _font_configured:
+        _configure_japanese_font()
+        _font_configured = True
+    return plt
+
+
+def find_latest_vector_files(vector_data_dir=VECTOR_DATA_DIR):
+    """最新の (ベクトルファイル, メタデータファイル) を返す。.npy ストアを優先し、旧形式の JSON にも対応"""
+    vector_data_dir = Path(vector_data_dir)
+    latest_store = find_latest_vector_store(vector_data_dir)
+    if latest_store is not None:
+        timestamp = latest_store.stem[len("product_vectors_"):]
+        return latest_store, vector_data_dir / f"product_metadata_{timestamp}.json"
+
+    vector_files = sorted(vector_data_dir.glob('product_vectors_*.json'))
+    metadata_files = sorted(vector_data_dir.glob('product_metadata_*.json'))
+    if not vector_files or not metadata_files:
+        return None
+    return vector_files[-1], metadata_files[-1]
 
 class PCADimensionReducer:
     """PCAによる次元削減クラス"""
     
-    def __init__(self, n_components=2):
+    def __init__(self, n_components=2, batch_size=PCA_BATCH_SIZE, incremental_threshold=INCREMENTAL_PCA_THRESHOLD):
         """
         初期化
         
         Args:
             n_components (int): 削減後の次元数（デフォルト: 2）
+            batch_size (int): IncrementalPCA のチャンク行数
+            incremental_threshold (int): この件数を超えたら IncrementalPCA を使用
         """
         self.n_components = n_components
+        self.batch_size = batch_size
+        self.incremental_threshold = incremental_threshold
         self.pca = PCA(n_components=n_components)
         self.scaler = StandardScaler()
         self.vectors = None
@@ -126,7 +168,17 @@ class PCADimensionReducer:
         """ベクトルデータとメタデータを読み込み"""
         print("ベクトルデータを読み込み中...")
         
-        # ベクトルデータを読み込み
+        if Path(vectors_file).suffix == ".npy":
+            # バイナリストアは memmap のまま保持する（コピーしない）
+            store = load_vector_store(vectors_file, metadata_file)
+            self.metadata = store.metadata
+            self.vectors = store.vectors
+            self.labels = store.ids
+            self.categories = [self.metadata[str(category_id)]['category'] for category_id in store.ids]
+            print(f"データ読み込み完了: {len(self.vectors)}サンプル, {self.vectors.shape[1]}次元")
+            return
+        
+        # 旧形式（JSON）のベクトルデータを読み込み
         with open(vectors_file, 'r', encoding='utf-8') as f:
             vectors_data = json.load(f)
         
@@ -157,11 +209,14 @@ class PCADimensionReducer:
         """PCAを適用して次元削減"""
         print(f"PCAによる次元削減を実行中... ({self.vectors.shape[1]}次元 → {self.n_components}次元)")
         
-        # データを標準化
-        vectors_scaled = self.scaler.fit_transform(self.vectors)
-        
-        # PCAを適用
-        self.pca_result = self.pca.fit_transform(vectors_scaled)
+        if len(self.vectors) > self.incremental_threshold:
+            self.pca_result = self._apply_incremental_pca()
+        else:
+            # データを標準化
+            vectors_scaled = self.scaler.fit_transform(self.vectors)
+            
+            # PCAを適用
+            self.pca_result = self.pca.fit_transform(vectors_scaled)
         
         print("PCA適用完了")
         print(f"説明分散比: {self.pca.explained_variance_ratio_}")
@@ -169,6 +224,24 @@ class PCADimensionReducer:
         
         return self.pca_result
     
+    def _apply_incremental_pca(self):
+        """ベクトル（memmap 可）をチャンク単位で標準化・学習・変換する"""
+        n_samples = len(self.vectors)
+        batches = list(gen_batches(n_samples, self.batch_size, min_batch_size=self.n_components))
+        print(f"IncrementalPCA を使用します: {n_samples}サンプル, {len(batches)}チャンク")
+        
+        for batch in batches:
+            self.scaler.partial_fit(self.vectors[batch])
+        
+        self.pca = IncrementalPCA(n_components=self.n_components, batch_size=self.batch_size)
+        for batch in batches:
+            self.pca.partial_fit(self.scaler.transform(self.vectors[batch]))
+        
+        result = np.empty((n_samples, self.n_components), dtype=np.float32)
+        for batch in batches:
+            result[batch] = self.pca.transform(self.scaler.transform(self.vectors[batch]))
+        return result
+    
     def create_matplotlib_visualization(self, output_dir=PCA_RESULTS_DIR):
         """Matplotlib散布図を作成"""
         if self.pca_result is None:
@@ -178,6 +251,7 @@ class PCADimensionReducer:
         output_dir.mkdir(parents=True, exist_ok=True)
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        plt = _load_pyplot()
         
         # 散布図を作成
         plt.figure(figsize=(12, 8))
@@ -245,16 +319,13 @@ def main():
         return
     
     # 最新のファイルを検索
-    vector_files = sorted(vector_data_dir.glob('product_vectors_*.json'))
-    metadata_files = sorted(vector_data_dir.glob('product_metadata_*.json'))
-    
-    if not vector_files or not metadata_files:
+    latest_files = find_latest_vector_files(vector_data_dir)
+    if latest_files is None:
         print("エラー: ベクトルデータファイルが見つかりません。")
         return
     
     # 最新のファイルを選択
-    latest_vector_file = vector_files[-1]
-    latest_metadata_file = metadata_files[-1]
+    latest_vector_file, latest_metadata_file = latest_files
     
     print(f"使用するファイル:")
     print(f"  - ベクトルデータ: {latest_vector_file.name}")
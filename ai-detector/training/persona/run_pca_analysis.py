@@ -6,10 +6,22 @@ PCA次元削減分析の実行スクリプト
 結果を可視化します。
 """
 
-from pca_dimension_reduction import PCADimensionReducer, VECTOR_DATA_DIR
+import argparse
+
+from pca_dimension_reduction import PCADimensionReducer, VECTOR_DATA_DIR, find_latest_vector_files
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ベクトルデータに PCA 次元削減を実行する")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="可視化を行わず計算と CSV 出力のみ実行する（matplotlib 不要・フォントのダウンロードなし）",
+    )
+    return parser.parse_args()
 
 def main():
     """メイン実行関数"""
+    args = parse_args()
     print("PCA次元削減分析を開始します...")
     
     # 最新のベクトルデータファイルを検索
@@ -18,17 +30,14 @@ def main():
         print(f"エラー: {vector_data_dir}ディレクトリが見つかりません。")
         return
     
-    # 最新のファイルを検索
-    vector_files = sorted(vector_data_dir.glob('product_vectors_*.json'))
-    metadata_files = sorted(vector_data_dir.glob('product_metadata_*.json'))
-    
-    if not vector_files or not metadata_files:
+    # 最新のファイルを検索（.npy ストアを優先）
+    latest_files = find_latest_vector_files(vector_data_dir)
+    if latest_files is None:
         print("エラー: ベクトルデータファイルが見つかりません。")
         return
     
     # 最新のファイルを選択
-    latest_vector_file = vector_files[-1]
-    latest_metadata_file = metadata_files[-1]
+    latest_vector_file, latest_metadata_file = latest_files
     
     print("使用するファイル:")
     print(f"  - ベクトルデータ: {latest_vector_file.name}")
@@ -48,8 +57,12 @@ def main():
         pca_result = pca_reducer.apply_pca()
         
         # 可視化を実行
-        print("4. 可視化を実行中...")
-        matplotlib_file = pca_reducer.create_matplotlib_visualization()
+        matplotlib_file = None
+        if args.headless:
+            print("4. ヘッドレスモードのため可視化をスキップします")
+        else:
+            print("4. 可視化を実行中...")
+            matplotlib_file = pca_reducer.create_matplotlib_visualization()
         
         # 結果を保存
         print("5. 結果を保存中...")
@@ -57,7 +70,8 @@ def main():
         
         print("\n=== 実行完了 ===")
         print("生成されたファイル:")
-        print(f"  - Matplotlib散布図: {matplotlib_file}")
+        if matplotlib_file is not None:
+            print(f"  - Matplotlib散布図: {matplotlib_file}")
         print(f"  - PCA結果CSV: {csv_file}")
         
     except Exception as e:
@@ -6,18 +6,36 @@
 結果を確認するためのシンプルなインターフェースを提供します。
 """
 
+import argparse
 import sys
 import os
 import numpy as np
+from embedding_cache import DEFAULT_BATCH_SIZE, EMBEDDING_CACHE_DIR
 from vectorize_product_descriptions import ProductDescriptionVectorizer
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="商品説明文をベクトル化する")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="エンコード時のバッチサイズ")
+    parser.add_argument("--cache-dir", default=str(EMBEDDING_CACHE_DIR), help="埋め込みキャッシュの保存先")
+    parser.add_argument("--no-cache", action="store_true", help="埋め込みキャッシュを使わない")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="可視化を行わずベクトル化・分析・保存のみ実行する（matplotlib/seaborn/plotly 不要）",
+    )
+    return parser.parse_args()
+
 def main():
     """メイン実行関数"""
+    args = parse_args()
     print("商品説明文ベクトル化を開始します...")
     
     try:
         # ベクトライザーを初期化
-        vectorizer = ProductDescriptionVectorizer()
+        vectorizer = ProductDescriptionVectorizer(
+            batch_size=args.batch_size,
+            cache_dir=None if args.no_cache else args.cache_dir,
+        )
         
         # モデルを読み込み
         print("1. モデルを読み込み中...")
@@ -40,16 +58,21 @@ def main():
         vectors_file, metadata_file, similarity_file = vectorizer.save_vectors()
         
         # 可視化を実行
-        print("6. 可視化を実行中...")
-        heatmap_file, interactive_file = vectorizer.visualize_similarity()
+        heatmap_file = interactive_file = None
+        if args.headless:
+            print("6. ヘッドレスモードのため可視化をスキップします")
+        else:
+            print("6. 可視化を実行中...")
+            heatmap_file, interactive_file = vectorizer.visualize_similarity()
         
         print("\n=== 実行完了 ===")
         print("生成されたファイル:")
         print(f"  - ベクトルデータ: {vectors_file}")
         print(f"  - メタデータ: {metadata_file}")
         print(f"  - 類似度行列: {similarity_file}")
-        print(f"  - ヒートマップ: {heatmap_file}")
-        print(f"  - インタラクティブ可視化: {interactive_file}")
+        if heatmap_file is not None:
+            print(f"  - ヒートマップ: {heatmap_file}")
+            print(f"  - インタラクティブ可視化: {interactive_file}")
         
         print("\n分析結果:")
         print(f"  - ベクトル次元数: {analysis_results['vector_dimension']}")
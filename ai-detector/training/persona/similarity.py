@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+ブロック単位のコサイン類似度 top-k 検索
+
+n×n の類似度行列を作らず、(クエリブロック x ベースブロック) の行列積と
+``np.argpartition`` で各行の上位 k 件だけを保持します。メモリ使用量は
+``query_block x (base_block + k)`` に抑えられるため、ベクトルストアの memmap
+をそのまま渡しても全件をメモリに載せません。
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 2048
+
+
+def inverse_norms(vectors: np.ndarray, block_size: int = DEFAULT_BLOCK_SIZE) -> np.ndarray:
+    """各行の 1/ノルムをブロック単位で計算（ゼロベクトルは 0）"""
+    inv = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+        norms = np.linalg.norm(block, axis=1)
+        inv[start:start + block_size] = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return inv
+
+
+def top_k_cosine(
+    vectors: np.ndarray,
+    k: int = 10,
+    *,
+    queries: np.ndarray | None = None,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> tuple[np.ndarray, np.ndarray]:
+    """各クエリに対してコサイン類似度の上位 k 件を返す
+
+    Args:
+        vectors: ベース行列 (n x d)。memmap 可。
+        k: 取得件数
+        queries: クエリ行列 (m x d)。省略時は ``vectors`` 自身を対象とし、自分自身は除外する。
+        block_size: クエリ・ベースそれぞれのブロック行数
+
+    Returns:
+        (インデックス int64 (m x k), 類似度 float32 (m x k))。類似度の降順。
+    """
+    self_query = queries is None
+    if self_query:
+        queries = vectors
+    n_base = len(vectors)
+    k = min(k, n_base - 1 if self_query else n_base)
+    if k <= 0:
+        empty = np.empty((len(queries), 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    base_inv = inverse_norms(vectors, block_size)
+    query_inv = base_inv if self_query else inverse_norms(queries, block_size)
+
+    top_indices = np.empty((len(queries), k), dtype=np.int64)
+    top_scores = np.empty((len(queries), k), dtype=np.float32)
+
+    for q_start in range(0, len(queries), block_size):
+        q_end = min(q_start + block_size, len(queries))
+        q_block = np.asarray(queries[q_start:q_end], dtype=np.float32) * query_inv[q_start:q_end, None]
+        best_scores = np.full((q_end - q_start, k), -np.inf, dtype=np.float32)
+        best_indices = np.full((q_end - q_start, k), -1, dtype=np.int64)
+
+        for b_start in range(0, n_base, block_size):
+            b_end = min(b_start + block_size, n_base)
+            b_block = np.asarray(vectors[b_start:b_end], dtype=np.float32) * base_inv[b_start:b_end, None]
+            scores = q_block @ b_block.T
+
+            if self_query:
+                # 自分自身（対角成分）を除外
+                overlap = np.arange(max(q_start, b_start), min(q_end, b_end))
+                scores[overlap - q_start, overlap - b_start] = -np.inf
+
+            # 既存の上位 k 件とブロックの類似度を結合し、上位 k 件だけを残す
+            merged_scores = np.concatenate([best_scores, scores], axis=1)
+            merged_indices = np.concatenate(
+                [best_indices, np.broadcast_to(np.arange(b_start, b_end), scores.shape)], axis=1
+            )
+            keep = np.argpartition(merged_scores, -k, axis=1)[:, -k:]
+            best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+            best_indices = np.take_along_axis(merged_indices, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        top_scores[q_start:q_end] = np.take_along_axis(best_scores, order, axis=1)
+        top_indices[q_start:q_end] = np.take_along_axis(best_indices, order, axis=1)
+
+    return top_indices, top_scores
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+商品ベクトルのバイナリストア
+
+1 回の保存で以下の 3 ファイルを出力します（``<ts>`` は YYYYMMDD_HHMMSS）。
+
+- ``product_vectors_<ts>.npy``: float32 の (件数 x 次元) 行列
+- ``product_ids_<ts>.npy``: 行に対応する商品（カテゴリ）ID の int64 配列
+- ``product_metadata_<ts>.json``: モデル名・次元数などのストア情報と ID ごとのメタデータ
+
+行列は ``np.load(mmap_mode="r")`` で読み込むため、PCA や類似度計算に
+コピーなしで渡せます。
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Sequence
+
+import numpy as np
+
+VECTOR_DTYPE = np.float32
+ID_DTYPE = np.int64
+
+
+@dataclass
+class VectorStore:
+    """読み込んだベクトルストア"""
+
+    vectors: np.ndarray
+    ids: np.ndarray
+    metadata: Dict[str, Dict[str, Any]]
+    info: Dict[str, Any]
+    vectors_path: Path
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def store_paths(output_dir: Path, timestamp: str) -> tuple[Path, Path, Path]:
+    """(ベクトル, ID, メタデータ) のパスを返す"""
+    return (
+        output_dir / f"product_vectors_{timestamp}.npy",
+        output_dir / f"product_ids_{timestamp}.npy",
+        output_dir / f"product_metadata_{timestamp}.json",
+    )
+
+
+def save_vector_store(
+    output_dir: str | Path,
+    timestamp: str,
+    *,
+    ids: Sequence[int],
+    vectors: np.ndarray,
+    metadata: Dict[Any, Dict[str, Any]],
+    model_name: str | None = None,
+) -> tuple[Path, Path, Path]:
+    """ベクトル行列・ID・メタデータを保存する"""
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    matrix = np.ascontiguousarray(vectors, dtype=VECTOR_DTYPE)
+    id_array = np.asarray(ids, dtype=ID_DTYPE)
+    if matrix.ndim != 2 or len(matrix) != len(id_array):
+        raise ValueError(f"ベクトル行列と ID の件数が一致しません: {matrix.shape} / {id_array.shape}")
+
+    vectors_file, ids_file, metadata_file = store_paths(output_path, timestamp)
+    np.save(vectors_file, matrix)
+    np.save(ids_file, id_array)
+
+    sidecar = {
+        "format": "npy",
+        "model_name": model_name,
+        "count": int(matrix.shape[0]),
+        "dimension": int(matrix.shape[1]),
+        "dtype": np.dtype(VECTOR_DTYPE).name,
+        "vectors_file": vectors_file.name,
+        "ids_file": ids_file.name,
+        "items": {str(key): value for key, value in metadata.items()},
+    }
+    with metadata_file.open("w", encoding="utf-8") as f:
+        json.dump(sidecar, f, ensure_ascii=False, indent=2)
+
+    return vectors_file, ids_file, metadata_file
+
+
+def load_vector_store(vectors_file: str | Path, metadata_file: str | Path | None = None) -> VectorStore:
+    """ベクトルストアを読み込む（行列は memmap）"""
+    vectors_path = Path(vectors_file)
+    timestamp = vectors_path.stem[len("product_vectors_"):]
+    _, ids_file, default_metadata = store_paths(vectors_path.parent, timestamp)
+    metadata_path = Path(metadata_file) if metadata_file is not None else default_metadata
+
+    with metadata_path.open("r", encoding="utf-8") as f:
+        sidecar = json.load(f)
+
+    vectors = np.load(vectors_path, mmap_mode="r")
+    ids = np.load(ids_file)
+    if len(vectors) != len(ids):
+        raise ValueError(f"ベクトル行列と ID の件数が一致しません: {vectors_path}")
+
+    info = {key: value for key, value in sidecar.items() if key != "items"}
+    return VectorStore(
+        vectors=vectors,
+        ids=ids,
+        metadata=sidecar.get("items", {}),
+        info=info,
+        vectors_path=vectors_path,
+    )
+
+
+def find_latest_vector_store(vector_data_dir: str | Path) -> Path | None:
+    """最新の ``product_vectors_*.npy`` を返す"""
+    candidates = sorted(Path(vector_data_dir).glob("product_vectors_*.npy"))
+    return candidates[-1] if candidates else None
@@ -6,45 +6,66 @@
 機械学習や検索システムで利用できる形式に変換します。
 """
 
-import json
 from datetime import datetime
 from pathlib import Path
 import warnings
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-import seaborn as sns
-from plotly.subplots import make_subplots
-from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
+
+from similarity import top_k_cosine
+from embedding_cache import (
+    DEFAULT_BATCH_SIZE,
+    EMBEDDING_CACHE_DIR,
+    EmbeddingCache,
+    SentenceTransformerEncoder,
+    TextEncoder,
+    encode_texts,
+)
+from vector_store import save_vector_store
 warnings.filterwarnings('ignore')
 
 BASE_DIR = Path(__file__).resolve().parent
 VECTOR_DATA_DIR = BASE_DIR / "vector_data"
+# この件数以下なら密な類似度行列を作成し、超える場合は近傍 top-k のみを扱う
+DENSE_SIMILARITY_LIMIT = 2000
+NEAREST_NEIGHBORS_K = 10
 
 class ProductDescriptionVectorizer:
     """商品説明文のベクトル化クラス"""
     
-    def __init__(self, model_name='sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'):
+    def __init__(
+        self,
+        model_name='sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2',
+        encoder: TextEncoder | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        cache_dir: str | Path | None = EMBEDDING_CACHE_DIR,
+    ):
         """
         初期化
         
         Args:
             model_name (str): 使用するSentenceTransformerモデル名
+            encoder: 差し替え用のエンコーダ（省略時は load_model() で SentenceTransformer を使用）
+            batch_size (int): エンコード時のバッチサイズ
+            cache_dir: 埋め込みキャッシュの保存先（None でキャッシュ無効）
         """
-        self.model_name = model_name
-        self.model = None
+        self.model_name = encoder.model_name if encoder is not None else model_name
+        self.model = encoder
+        self.batch_size = batch_size
+        self.cache = EmbeddingCache(cache_dir) if cache_dir is not None else None
         self.product_descriptions = {}
         self.vectors = {}
         self.metadata = {}
         
     def load_model(self):
-        """SentenceTransformerモデルを読み込み"""
+        """SentenceTransformerモデルを読み込み（エンコーダ指定時は何もしない）"""
+        if self.model is not None:
+            return
         print(f"モデルを読み込み中: {self.model_name}")
-        self.model = SentenceTransformer(self.model_name)
+        self.model = SentenceTransformerEncoder(self.model_name)
+        self.model.load()
         print("モデル読み込み完了")
         
     def load_product_descriptions(self):
@@ -110,20 +131,24 @@ class ProductDescriptionVectorizer:
             
         print("商品説明文をベクトル化中...")
         
-        for category_id, data in self.product_descriptions.items():
-            description = data["description"]
-            vector = self.model.encode(description)
+        category_ids = list(self.product_descriptions)
+        descriptions = [self.product_descriptions[cid]["description"] for cid in category_ids]
+        vectors, stats = encode_texts(
+            self.model, descriptions, batch_size=self.batch_size, cache=self.cache
+        )
+        
+        for category_id, description, vector in zip(category_ids, descriptions, vectors):
             self.vectors[category_id] = vector
             
             # メタデータを保存
             self.metadata[category_id] = {
-                "category": data["category"],
+                "category": self.product_descriptions[category_id]["category"],
                 "description": description,
                 "vector_dimension": int(len(vector)),  # int型に変換
                 "vector_norm": float(np.linalg.norm(vector))  # float型に変換
             }
             
-        print(f"ベクトル化完了: {len(self.vectors)}カテゴリ")
+        print(f"ベクトル化完了: {len(self.vectors)}カテゴリ (キャッシュ: ヒット {stats.hits}件 / エンコード {stats.misses}件)")
         
     def calculate_similarity_matrix(self):
         """カテゴリ間の類似度行列を計算"""
@@ -132,9 +157,7 @@ class ProductDescriptionVectorizer:
             
         print("類似度行列を計算中...")
         
-        # ベクトルを配列に変換
-        vectors_array = np.array(list(self.vectors.values()))
-        category_ids = list(self.vectors.keys())
+        category_ids, vectors_array = self.vector_matrix()
         
         # コサイン類似度を計算
         similarity_matrix = cosine_similarity(vectors_array)
@@ -148,34 +171,54 @@ class ProductDescriptionVectorizer:
         
         return similarity_df, category_ids
         
+    def nearest_neighbors(self, k=NEAREST_NEIGHBORS_K):
+        """各カテゴリのコサイン類似度上位 k 件を返す（類似度行列は作らない）"""
+        if not self.vectors:
+            raise ValueError("ベクトルが生成されていません。vectorize_descriptions()を先に実行してください。")
+            
+        category_ids, vectors_array = self.vector_matrix()
+        indices, scores = top_k_cosine(vectors_array, k)
+        ids = np.asarray(category_ids)
+        return pd.DataFrame({
+            "category_id": np.repeat(ids, indices.shape[1]),
+            "rank": np.tile(np.arange(1, indices.shape[1] + 1), len(ids)),
+            "neighbor_id": ids[indices.ravel()],
+            "similarity": scores.ravel(),
+        })
+        
+    def vector_matrix(self):
+        """(カテゴリIDリスト, float32 のベクトル行列) を返す"""
+        category_ids = list(self.vectors.keys())
+        if not category_ids:
+            return category_ids, np.empty((0, 0), dtype=np.float32)
+        return category_ids, np.vstack([self.vectors[cid] for cid in category_ids]).astype(np.float32, copy=False)
+        
     def save_vectors(self, output_dir: str | Path = VECTOR_DATA_DIR):
-        """ベクトルデータを保存"""
+        """ベクトルデータをバイナリストア（.npy + ID + メタデータ）で保存"""
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
             
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        # ベクトルデータを保存
-        vectors_data = {}
-        for category_id, vector in self.vectors.items():
-            vectors_data[category_id] = {
-                "vector": vector.astype(float).tolist(),  # float32をfloatに変換
-                "metadata": self.metadata[category_id]
-            }
-            
-        vectors_file = output_path / f"product_vectors_{timestamp}.json"
-        with vectors_file.open('w', encoding='utf-8') as f:
-            json.dump(vectors_data, f, ensure_ascii=False, indent=2)
-            
-        # メタデータを保存
-        metadata_file = output_path / f"product_metadata_{timestamp}.json"
-        with metadata_file.open('w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+        # ベクトルデータ・ID・メタデータを保存
+        category_ids, vectors_array = self.vector_matrix()
+        vectors_file, _, metadata_file = save_vector_store(
+            output_path,
+            timestamp,
+            ids=category_ids,
+            vectors=vectors_array,
+            metadata=self.metadata,
+            model_name=self.model_name,
+        )
             
-        # 類似度行列を保存
-        similarity_df, category_ids = self.calculate_similarity_matrix()
-        similarity_file = output_path / f"similarity_matrix_{timestamp}.csv"
-        similarity_df.to_csv(similarity_file, encoding='utf-8')
+        # 類似度を保存（大規模カタログでは近傍 top-k のみ）
+        if len(self.vectors) <= DENSE_SIMILARITY_LIMIT:
+            similarity_df, category_ids = self.calculate_similarity_matrix()
+            similarity_file = output_path / f"similarity_matrix_{timestamp}.csv"
+            similarity_df.to_csv(similarity_file, encoding='utf-8')
+        else:
+            similarity_file = output_path / f"similarity_topk_{timestamp}.csv"
+            self.nearest_neighbors().to_csv(similarity_file, index=False, encoding='utf-8')
         
         print(f"データ保存完了:")
         print(f"  - ベクトルデータ: {vectors_file}")
@@ -186,6 +229,11 @@ class ProductDescriptionVectorizer:
         
     def visualize_similarity(self, output_dir: str | Path = VECTOR_DATA_DIR):
         """類似度の可視化"""
+        # 可視化ライブラリは描画時にだけ読み込む（ヘッドレス実行では不要）
+        import matplotlib.pyplot as plt
+        import plotly.express as px
+        import seaborn as sns
+        
         similarity_df, category_ids = self.calculate_similarity_matrix()
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
@@ -251,26 +299,28 @@ class ProductDescriptionVectorizer:
         print(f"ベクトルノルム - 平均: {np.mean(norms):.4f}, 標準偏差: {np.std(norms):.4f}")
         
         # 類似度統計
-        similarity_df, _ = self.calculate_similarity_matrix()
-        # 対角成分（自己類似度）を除く
-        mask = np.ones_like(similarity_df, dtype=bool)
-        np.fill_diagonal(mask, False)
-        similarities = similarity_df.values[mask]
+        if len(self.vectors) <= DENSE_SIMILARITY_LIMIT:
+            similarity_df, _ = self.calculate_similarity_matrix()
+            # 対角成分（自己類似度）を除く
+            mask = np.ones_like(similarity_df, dtype=bool)
+            np.fill_diagonal(mask, False)
+            similarities = similarity_df.values[mask]
+        else:
+            # 大規模カタログでは全ペアを作らず、近傍 top-k の類似度で統計を取る
+            similarities = self.nearest_neighbors()["similarity"].to_numpy()
+            print(f"（近傍 top-{NEAREST_NEIGHBORS_K} の類似度で集計）")
         
         print(f"カテゴリ間類似度 - 平均: {np.mean(similarities):.4f}, 標準偏差: {np.std(similarities):.4f}")
         print(f"最大類似度: {np.max(similarities):.4f}, 最小類似度: {np.min(similarities):.4f}")
         
-        # 最も類似度の高いペアを特定
-        max_sim_idx = np.unravel_index(np.argmax(similarities), similarities.shape)
-        category_ids = list(self.vectors.keys())
+        # 最も類似度の高いペアを特定（各カテゴリの最近傍から選ぶ）
+        category_ids, vectors_array = self.vector_matrix()
+        nearest_indices, nearest_scores = top_k_cosine(vectors_array, 1)
+        best = int(np.argmax(nearest_scores[:, 0]))
         
         print(f"最も類似度の高いカテゴリペア:")
-        if max_sim_idx[0] < len(category_ids) and max_sim_idx[1] < len(category_ids):
-            print(f"  - {self.metadata[category_ids[max_sim_idx[0]]]['category']} と {self.metadata[category_ids[max_sim_idx[1]]]['category']}")
-            print(f"  - 類似度: {np.max(similarities):.4f}")
-        else:
-            print(f"  - インデックスエラー: {max_sim_idx}")
-            print(f"  - 類似度: {np.max(similarities):.4f}")
+        print(f"  - {self.metadata[category_ids[best]]['category']} と {self.metadata[category_ids[nearest_indices[best, 0]]]['category']}")
+        print(f"  - 類似度: {nearest_scores[best, 0]:.4f}")
         
         return {
             "vector_dimension": vector_dim,